@@ -2,12 +2,20 @@
 
 """
 import os
+import queue
 
 from core.game_components.track import Track
 from core.game_components.environment import Environment
 from core.settings import *
 from core.ui.engine import Engine
 import keyboard
+import pygame
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from core.training import spectator
+from core.training.neural_net import FFNN
+from core.training.memory import MemoryProfiler, formatMemory
 
 from random import randint
 
@@ -16,16 +24,27 @@ def prepareTrackSurface(engine: Engine, environment: Environment) -> Engine.Surf
     This function is called once per run, and it prepares the track's surface 
     so that recalculation of each component is not necessary every frame
 
+    """ 
+    track_surface = buildTrackSurface(engine, environment)
+    track_surface.convert_alpha()
+    return track_surface
+
+
+def buildTrackSurface(engine: Engine, environment: Environment) -> Engine.Surface:
+    """ 
+    Rasterizes and textures the track without touching the display,
+    so it is safe to call from a background thread. The result still
+    has to be converted to the display format on the main thread
+
     """ 
     track = environment.track
 
-    # retrieves the coordinates for all points on the inside and outside edges of the track
-    inner_edges = track.getInnerEdges()
-    outer_edges = track.getOuterEdges()
+    # retrieves the coordinates of the inside and outside edges of the track, simplified to the render level of detail
+    inner_edges, outer_edges = track.lod(RENDER_LOD)
 
-    # create empty surfaces that will contain the inside/outside edges
-    outer_surface = engine.Surface(SCREEN_SIZE, flag="srcalpha")
-    inner_surface = engine.Surface(SCREEN_SIZE, flag="srcalpha")
+    # create empty surfaces at the render resolution that will contain the inside/outside edges
+    outer_surface = engine.Surface(engine.resolution, flag="srcalpha")
+    inner_surface = engine.Surface(engine.resolution, flag="srcalpha")
 
     # draw the edges to the corresponding surfaces
     engine.renderPolygon((255, 255, 255), outer_edges, outer_surface)
@@ -34,9 +53,8 @@ def prepareTrackSurface(engine: Engine, environment: Environment) -> Engine.Surf
 
 
     if engine.getBackgroundType() == 'image':
-        # load the texture that will be applied to the track
-        texture = engine.load_image(TRACK_TEXTURE)
-        texture = engine.tile_surface(texture)
+        # copy the cached tiled texture that will be applied to the track
+        texture = engine.tiledImage(TRACK_TEXTURE).copy()
     else:
         texture = engine.Surface(outer_surface.get_size(), flag='srcalpha')
         texture.fill(engine.colors['pastelDarkGreen'])
@@ -56,6 +74,51 @@ def prepareTrackSurface(engine: Engine, environment: Environment) -> Engine.Surf
 
 
 
+class TrackPrefetcher:
+    """
+    Builds the next track, its environment and its surface on a
+    background thread while the current race runs, so that switching
+    tracks only costs the display format conversion
+
+    """
+    def __init__(self, engine: Engine, track_type: str = TRACK_TYPE) -> None:
+        self.engine = engine
+        self.track_type = track_type
+        if engine.getBackgroundType() == 'image':
+            engine.tiledImage(TRACK_TEXTURE, pin=True) # convert the texture here and keep it, the worker thread can't convert
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.prefetch()
+
+    def prefetch(self) -> None:
+        """ Starts building the next track in the background """
+        self.future = self.executor.submit(self._build)
+
+    def next(self) -> tuple:
+        """ 
+        Returns the prefetched (environment, track surface), waiting for it if
+        it isn't finished yet, and starts building the one after it
+
+        """
+        environment, track_surface = self.future.result()
+        track_surface.convert_alpha()
+        self.prefetch()
+        return environment, track_surface
+
+    def close(self) -> None:
+        """ 
+        Stops the background thread, dropping any track not yet started and
+        waiting for one being built, so pygame can be quit safely afterwards
+
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _build(self) -> tuple:
+        environment = Environment(Track(type=self.track_type))
+        return environment, buildTrackSurface(self.engine, environment)
+
+
+
 def PvAI():
     track = Track(type=TRACK_TYPE)
     grid_colors = ('pastelLightGreen', 'pastelYellow', 'pastelDarkGreen')
@@ -66,11 +129,15 @@ def PvAI():
                     backgroundPath = BACKGROUND, 
                     gridColors = grid_colors, 
                     title = "NEUROEVOLUTION RACING",
-                    imageFolder = os.path.join(os.getcwd(), "assets"))
+                    imageFolder = os.path.join(os.getcwd(), "assets"),
+                    assetCache = ASSET_CACHE,
+                    renderScale = RENDER_SCALE,
+                    smoothUpscale = SMOOTH_UPSCALE)
 
 
     environment = Environment(track)
     track_surface = prepareTrackSurface(engine, environment)
+    prefetcher = TrackPrefetcher(engine)
 
     # pts = []
     # for i in range(3000):
@@ -78,15 +145,189 @@ def PvAI():
     #     pts.append(pt)
 
     while not keyboard.is_pressed('esc'):
+        if keyboard.is_pressed('n'): # next track
+            environment, track_surface = prefetcher.next()
         for step in range(1, SMOOTHNESS + 1):
             if engine.shouldRun():
                 engine.clearScreen()
                 engine.renderScene(_renderEnvironment, environment, track_surface)
                 engine.updateScreen()
 
+    prefetcher.close()
     engine.exit()
 
 
+
+def spectateEvolution(generations: int, population_size: int) -> FFNN:
+    """ 
+    Runs evolution at full speed in a worker process and renders the
+    snapshots it publishes at a capped frame rate. Closing the window
+    stops rendering, evolution carries on until it is finished.
+    Returns the champion
+
+    """
+    snapshots = mp.Queue(maxsize=SPECTATOR_QUEUE_SIZE)
+    results = mp.Queue()
+    worker = mp.Process(target=spectator.evolve, args=(generations, population_size, spectator.SnapshotPublisher(snapshots), results), daemon=True)
+    worker.start()
+
+    engine = Engine(SCREEN_SIZE, 
+                    numGrids = (27, 27), 
+                    backgroundType = 'image', 
+                    backgroundPath = BACKGROUND, 
+                    gridColors = ('pastelLightGreen', 'pastelYellow', 'pastelDarkGreen'), 
+                    targetFPS = SPECTATOR_FPS,
+                    title = "NEUROEVOLUTION RACING - SPECTATOR",
+                    imageFolder = os.path.join(os.getcwd(), "assets"),
+                    assetCache = ASSET_CACHE,
+                    renderScale = RENDER_SCALE,
+                    smoothUpscale = SMOOTH_UPSCALE)
+
+    memory = MemoryProfiler(engine=engine) if MEMORY_PROFILING else None # the renderer's side, evolution profiles itself
+
+    snapshot, track_seed, track_surface = None, None, None
+    rendered, skipped = 0, 0
+    while worker.is_alive() and engine.shouldRun(): # shouldRun holds the loop to the frame rate cap
+        newest, stale = spectator.latest(snapshots)
+        skipped += stale
+        if newest is None:
+            continue
+        if memory is not None and snapshot is not None and newest["generation"] != snapshot["generation"]:
+            print("Spectator memory after generation " + str(snapshot["generation"]) + "\n" + formatMemory(memory.sample(snapshot["generation"])))
+        snapshot = newest
+
+        if snapshot["trackSeed"] != track_seed:
+            track_seed = snapshot["trackSeed"]
+            track_surface = prepareTrackSurface(engine, Environment(Track(type=TRACK_TYPE, seed=track_seed)))
+
+        engine.clearScreen()
+        engine.renderScene(_renderSnapshot, snapshot, track_surface)
+        engine.updateScreen()
+        rendered += 1
+    engine.exit()
+    if memory is not None:
+        memory.close()
+
+    # poll so a worker that died without putting a result can't block the driver forever
+    result = None
+    while result is None:
+        try:
+            result = results.get(timeout=0.5)
+        except queue.Empty:
+            if not worker.is_alive():
+                try:
+                    result = results.get(timeout=1) # a result put just before exiting may still be in flight
+                except queue.Empty:
+                    raise RuntimeError("Evolution worker exited with code " + str(worker.exitcode) + " without a result")
+    worker.join()
+    champion, dropped, error = result
+    if error is not None:
+        raise RuntimeError("Evolution worker failed:\n" + error)
+    print("Spectator: rendered " + str(rendered) + " snapshots, skipped " + str(skipped) + " stale, simulation dropped " + str(dropped))
+    return FFNN.fromDict(champion)
+
+
+def exportRace(recording: dict, folder: str, track_seed: int, track_type: str = TRACK_TYPE, format: str = "png", workers: int = None, names: list = None) -> dict:
+    """
+    Renders every frame of a recorded race (see simulation.record) offscreen
+    with SDL's dummy video driver, splitting the frames across a process
+    pool, and writes them to folder as numbered PNGs or raw RGB24 frames.
+    Returns the frame count, size, format and an ffmpeg command that
+    encodes the frames
+
+    """
+    os.makedirs(folder, exist_ok=True)
+    frames = len(recording["positions"])
+    workers = min(workers or os.cpu_count(), frames)
+    chunks = [(int(chunk[0]), int(chunk[-1]) + 1) for chunk in np.array_split(np.arange(frames), workers * 4) if chunk.size]
+
+    with mp.get_context("spawn").Pool(workers, initializer=_initExporter, initargs=(recording, folder, track_seed, track_type, format, names)) as pool:
+        written = sum(pool.imap_unordered(_exportFrames, chunks))
+        # SDL turns SIGTERM into a quit event, so let the workers exit on their
+        # own instead of leaving Pool.__exit__ to terminate them
+        pool.close()
+        pool.join()
+
+    pattern = os.path.join(folder, "frame_%06d." + format)
+    if format == "png":
+        source = "-framerate " + str(EXPORT_FPS) + " -i " + pattern
+    else:
+        source = "-f image2 -c:v rawvideo -pix_fmt rgb24 -s " + str(SCREEN_SIZE[0]) + "x" + str(SCREEN_SIZE[1]) + " -framerate " + str(EXPORT_FPS) + " -i " + pattern
+    return {
+        "frames": written,
+        "size": SCREEN_SIZE,
+        "format": format,
+        "ffmpeg": "ffmpeg " + source + " -pix_fmt yuv420p " + os.path.join(folder, "race.mp4"),
+    }
+
+
+_exporter = None # (engine, track surface, recording, folder, format, names) of each export worker
+
+
+def _initExporter(recording: dict, folder: str, track_seed: int, track_type: str, format: str, names: list) -> None:
+    """ Pool initializer, opens an offscreen engine and rasterizes the track once per worker """
+    global _exporter
+    if format not in ("png", "rgb"):
+        raise ValueError("unknown frame format " + repr(format))
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    engine = Engine(SCREEN_SIZE,
+                    numGrids = (27, 27),
+                    backgroundType = 'image',
+                    backgroundPath = BACKGROUND,
+                    gridColors = ('pastelLightGreen', 'pastelYellow', 'pastelDarkGreen'),
+                    imageFolder = os.path.join(os.getcwd(), "assets"),
+                    assetCache = ASSET_CACHE)
+    track_surface = prepareTrackSurface(engine, Environment(Track(type=track_type, seed=track_seed)))
+    _exporter = (engine, track_surface, recording, folder, format, names)
+
+
+def _exportFrames(frames: tuple) -> int:
+    """ Renders and writes frames start to stop, returns how many were written """
+    engine, track_surface, recording, folder, format, names = _exporter
+    start, stop = frames
+    for tick in range(start, stop):
+        engine.clearScreen()
+        engine.renderScene(_renderRecordedFrame, recording, tick, track_surface, names)
+        path = os.path.join(folder, "frame_%06d." % tick + format)
+        if format == "png":
+            pygame.image.save(engine.screen, path)
+        else:
+            with open(path, "wb") as f:
+                f.write(pygame.image.tobytes(engine.screen, "RGB"))
+    return stop - start
+
+
+def _renderRecordedFrame(engine: Engine, recording: dict, tick: int, track_surface: Engine.Surface, names: list = None) -> None:
+    """ 
+    Renders the track and every car of a recorded race at one tick, the first car highlighted
+
+    """
+    engine.renderSurface(track_surface)
+    for i, (pos, alive) in enumerate(zip(recording["positions"][tick], recording["alive"][tick])):
+        color = engine.colors["pastelPink"] if i == 0 else engine.colors["pastelBlue"]
+        if not alive:
+            color = engine.colors["brown"]
+        engine.renderCircle((pos[0] - 5, pos[1] - 5), 5, color)
+        if names is not None:
+            engine.printToScreen(names[i], (pos[0], pos[1] - 15), 12, engine.colors["black"])
+    engine.printToScreen("Tick " + str(tick), (SCREEN_SIZE[0] // 2, 20), 20, engine.colors["black"])
+
+
+def _renderSnapshot(engine: Engine, snapshot: dict, track_surface: Engine.Surface) -> None:
+    """ 
+    Renders the track with the champion (first) and leading cars of a snapshot
+
+    """
+    engine.renderSurface(track_surface)
+    for i, (pos, alive) in enumerate(zip(snapshot["positions"], snapshot["alive"])):
+        color = engine.colors["pastelPink"] if i == 0 else engine.colors["pastelBlue"]
+        if not alive:
+            color = engine.colors["brown"]
+        engine.renderCircle((pos[0] - 5, pos[1] - 5), 5, color)
+    engine.printToScreen("Generation " + str(snapshot["generation"]) + "  tick " + str(snapshot["tick"]), (SCREEN_SIZE[0] // 2, 20), 20, engine.colors["black"])
+
+
     
 def _renderEnvironment(engine: Engine, environment: Environment, track_surface: Engine.Surface) -> None:
     """ 
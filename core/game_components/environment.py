@@ -6,9 +6,14 @@ from core.settings import *
 import numpy as np
 
 class Environment:
-    def __init__(self, track: Track) -> None:
+    def __init__(self, track: Track, physics_lod: float = PHYSICS_LOD) -> None:
         self.track = track
+        self.physics_lod = physics_lod # pixels the ray and collision segments may deviate from the full edges
+        self.dtype = track.dtype
         self.starting_point = self.prepareTrack()
+        self.starting_heading = self.prepareHeading()
+        self.segment_starts, self.segment_vectors = self.prepareSegments()
+        self.curvature_angles, self.curvature_values = self.prepareCurvature()
 
 
     def prepareTrack(self) -> None:
@@ -25,11 +30,55 @@ class Environment:
         inner_start_point = inner_edges[0]
         outer_start_point = outer_edges[0]
 
-        starting_point = ((inner_start_point[0] + outer_start_point[0]) / 2, (inner_start_point[1] + outer_start_point[1]) / 2)
+        starting_point = (float(inner_start_point[0] + outer_start_point[0]) / 2, float(inner_start_point[1] + outer_start_point[1]) / 2)
 
         self.track.setFinalEuclidean(np.array([inner_edges, outer_edges]))
         return starting_point
 
+    def prepareHeading(self) -> float:
+        """
+        Direction a car has to face at the starting point to drive
+        along the track (the direction of increasing theta)
+
+        """
+        edges = self.track.getTrackEdges()
+        midpoint = (edges[0][1] + edges[1][1]) / 2
+        return float(np.arctan2(midpoint[1] - self.starting_point[1], midpoint[0] - self.starting_point[0]))
+
+    def prepareSegments(self) -> tuple:
+        """
+        Splits both edges of the scaled track, at the physics level of
+        detail, into line segments so that sensors can be cast against them
+
+        """
+        starts, vectors = [], []
+        for edge in self.track.lod(self.physics_lod):
+            starts.append(edge)
+            vectors.append(np.roll(edge, -1, axis=0) - edge)
+        return np.concatenate(starts), np.concatenate(vectors)
+
+    def prepareCurvature(self, window: int = 2) -> tuple:
+        """
+        Precomputes the scaled track's centre line curvature, keeping the
+        largest value within window points either side of each point so
+        that cars about to enter a bend already see it, indexed by polar
+        angle around the track's origin
+
+        """
+        centre, curvature = self.track.curvature()
+        curvature = np.max([np.roll(curvature, shift) for shift in range(-window, window + 1)], axis=0)
+        angles = self.angle(centre)
+        order = np.argsort(angles)
+        return angles[order], curvature[order]
+
+    def curvatureAt(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Centre line curvature of the track at the polar angle of each
+        (N, 2) screen position, in 1 / pixels
+
+        """
+        return np.interp(self.angle(positions), self.curvature_angles, self.curvature_values, period=2 * np.pi)
+
     def trackContains(self, pt: tuple) -> bool:
         """ 
         Determines whether a given point resides inside the track
@@ -39,6 +88,86 @@ class Environment:
         #pt = (pt[0] / TRACK_SCALE - TRACK_ORIGIN[0], pt[1] / TRACK_SCALE - TRACK_ORIGIN[1])
         pt = ((pt[0] - TRACK_ORIGIN[0]) / TRACK_SCALE, (pt[1] - TRACK_ORIGIN[1]) / TRACK_SCALE)
         #pt = (pt[0] / TRACK_SCALE, pt[1] / TRACK_SCALE)
-        return self.track.contains(pt)
+        return pt in self.track
 
+    def trackContainsMany(self, pts: np.ndarray) -> np.ndarray:
+        """
+        Determines which of an (N, 2) array of screen points reside inside the track
 
+        """
+        pts = (np.asarray(pts, dtype=self.dtype).reshape(-1, 2) - np.array(TRACK_ORIGIN, dtype=self.dtype)) / self.dtype.type(TRACK_SCALE)
+        return self.track.contains_many(pts)
+
+    def castRays(self, positions: np.ndarray, headings: np.ndarray, num_rays: int, fov: float = RAY_FOV, max_length: float = RAY_LENGTH, out: np.ndarray = None) -> np.ndarray:
+        """
+        Casts num_rays sensor rays, spread evenly across fov, from every
+        position and returns the distance to the nearest track edge along
+        each ray, normalized to [0, 1] by max_length
+
+        positions: (N, 2) car positions
+        headings: (N,) car headings in radians
+        out: optional (N, num_rays) array the result is written into
+        returns: (N, num_rays) ray lengths in the track's dtype
+
+        """
+        positions = np.asarray(positions, dtype=self.dtype).reshape(-1, 2)
+        angles = np.asarray(headings, dtype=self.dtype).reshape(-1, 1) + np.linspace(-fov / 2, fov / 2, num_rays, dtype=self.dtype)
+        dx, dy = np.cos(angles)[..., None], np.sin(angles)[..., None]   # (N, R, 1)
+        ex, ey = self.segment_vectors[:, 0], self.segment_vectors[:, 1]  # (S,)
+        ax = self.segment_starts[:, 0] - positions[:, 0, None]           # (N, S)
+        ay = self.segment_starts[:, 1] - positions[:, 1, None]
+
+        # solve p + t*d = a + u*e for the distance t along the ray and position u along the segment
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denom = dx * ey - dy * ex
+            t = (ax * ey - ay * ex)[:, None, :] / denom
+            u = (ax[:, None, :] * dy - ay[:, None, :] * dx) / denom
+            hits = np.where((t >= 0) & (u >= 0) & (u <= 1), t, max_length)
+
+        out = np.minimum(hits.min(axis=2), max_length, out=out)
+        out /= max_length
+        return out
+
+    def timeOfImpact(self, before: np.ndarray, after: np.ndarray) -> np.ndarray:
+        """
+        Swept collision of every car's motion this tick against both track
+        edges, so cars moving far enough in one tick to jump over a wall
+        are still caught
+
+        before: (N, 2) positions at the start of the tick
+        after: (N, 2) positions at the end of the tick
+        returns: (N,) fraction of the motion travelled before first touching
+                 an edge, inf for cars that don't touch one
+
+        """
+        before = np.asarray(before, dtype=self.dtype).reshape(-1, 2)
+        motion = np.asarray(after, dtype=self.dtype).reshape(-1, 2) - before
+        dx, dy = motion[:, 0, None], motion[:, 1, None]                  # (N, 1)
+        ex, ey = self.segment_vectors[:, 0], self.segment_vectors[:, 1]  # (S,)
+        ax = self.segment_starts[:, 0] - before[:, 0, None]              # (N, S)
+        ay = self.segment_starts[:, 1] - before[:, 1, None]
+
+        # solve p + t*d = a + u*e for the fraction t of the motion and position u along the segment
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denom = dx * ey - dy * ex
+            t = (ax * ey - ay * ex) / denom
+            u = (ax * dy - ay * dx) / denom
+            hits = np.where((t >= 0) & (t <= 1) & (u >= 0) & (u <= 1), t, np.inf)
+        return hits.min(axis=1) if hits.shape[1] else np.full(len(before), np.inf)
+
+    def angle(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Polar angle of screen positions around the track's origin
+
+        """
+        positions = np.asarray(positions, dtype=float)
+        return np.arctan2(positions[..., 1] - TRACK_ORIGIN[1], positions[..., 0] - TRACK_ORIGIN[0])
+
+    def progress(self, before: np.ndarray, after: np.ndarray) -> np.ndarray:
+        """
+        Radians travelled around the track between two positions,
+        negative when driving the wrong way
+
+        """
+        delta = self.angle(after) - self.angle(before)
+        return (delta + np.pi) % (2 * np.pi) - np.pi
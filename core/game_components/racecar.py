@@ -5,7 +5,8 @@ Race car with neural network decision making.
 from __future__ import annotations
 import numpy as np
 
-from core.neural_net import FFNN
+from core.training.neural_net import FFNN
+from core.settings import CAR_MAX_TURNING_RATE, CAR_MAX_ACCELERATION, CAR_MAX_SPEED, DTYPE
 
 class Racecar:
 	"""Haven't tested any of this yet."""
@@ -16,20 +17,29 @@ class Racecar:
 			initial_pos: np.ndarray = None,
 			initial_vel: np.ndarray = None,
 			initial_accel: np.ndarray = None,
-			max_turning_rate: float = np.radians(135),
-			max_acceleration: float = 5,
+			initial_heading: float = 0.,
+			max_turning_rate: float = CAR_MAX_TURNING_RATE,
+			max_acceleration: float = CAR_MAX_ACCELERATION,
+			max_speed: float = CAR_MAX_SPEED,
+			network: FFNN = None,
+			dtype: str = DTYPE,
 			) -> None:
 		self.id = id  # this should be base 36 number for uniqueness and to minimize digits
-		self.network = FFNN(architecture, outputActivation = "linear")  # can decide steering, acceleration
+		self.dtype = np.dtype(dtype)  # float type of the car's state
+		self.network = network if network is not None else FFNN(architecture, outputActivation = "linear", dtype = dtype)  # can decide steering, acceleration
 		self.initial_p = initial_pos if initial_pos is not None else np.array([0., 0.])  # position
 		self.initial_v = initial_vel if initial_vel is not None else np.array([0., 0.])  # velocity
 		self.initial_a = initial_accel if initial_accel is not None else np.array([0., 0.])  # acceleration
-		self.p = self.initial_p.copy()
-		self.v = self.initial_v.copy()
-		self.a = self.initial_a.copy()
+		self.initial_heading = initial_heading  # direction the car faces, in radians
+		self.p = np.array(self.initial_p, dtype=self.dtype)
+		self.v = np.array(self.initial_v, dtype=self.dtype)
+		self.a = np.array(self.initial_a, dtype=self.dtype)
+		self.heading = self.dtype.type(self.initial_heading)
 		self.max_turning_rate = max_turning_rate
 		self.max_acceleration = max_acceleration
+		self.max_speed = max_speed
 		self.steps = 0  # number of steps made
+		self.progress = 0.  # radians travelled around the track
 		self.alive = True
 		self.resets = 0  # num times this racecar has been reset
 
@@ -37,6 +47,9 @@ class Racecar:
 		"""Updates cars state."""
 		self.p += self.v
 		self.v += self.a
+		speed = np.hypot(*self.v)
+		if speed > self.max_speed:
+			self.v *= self.max_speed / speed
 		self.steps += 1
 
 	def autostep(self, rayLengths: np.ndarray) -> None:
@@ -48,39 +61,42 @@ class Racecar:
 
 	def turn(self, d_theta: float) -> None:
 		"""Rotates direction ccw by theta degrees in radians, def need to test this."""
-		d_theta = (d_theta / abs(d_theta)) * min(abs(d_theta), self.max_turning_rate)
+		d_theta = np.clip(d_theta, -self.max_turning_rate, self.max_turning_rate)
 		cos_d_theta = np.cos(d_theta)
 		sin_d_theta = np.sin(d_theta)
-		self.v = np.array([[cos_d_theta, -sin_d_theta], [sin_d_theta, cos_d_theta]]) @ self.v
+		self.heading += d_theta
+		self.v = np.array([[cos_d_theta, -sin_d_theta], [sin_d_theta, cos_d_theta]], dtype=self.dtype) @ self.v
 
 	def get_optimal_controls(self, rayLengths: np.ndarray) -> np.ndarray:
 		"""Gets turn angle from neural network."""
 		return self.network.feedForward(rayLengths)  # steering angle, acceleartion
 
 	def accelerate(self, a) -> None:
-		"""Sets acceleration."""
-		self.a = min(a, self.max_acceleration)
+		"""Sets acceleration along the car's heading."""
+		a = np.clip(a, -self.max_acceleration, self.max_acceleration)
+		self.a = a * np.array([np.cos(self.heading), np.sin(self.heading)], dtype=self.dtype)
 
 	def is_alive(self) -> bool:
 		"""Returns whether racecar is alive or not."""
 		return self.alive
 
 	def kill(self) -> None:
-		"""Kills racecar and sets pos and vel to 0."""
+		"""Kills racecar and sets vel to 0, position is kept so the crash site is known."""
 		self.alive = False
-		self.p = np.array([0., 0.])
-		self.v = np.array([0., 0.])
+		self.v = np.zeros(2, dtype=self.dtype)
 
 	def get_network_params(self) -> dict:
 		"""Gets important params from network."""
-		return self.network.getParams()
+		return self.network.get_params()
 
 	def reset(self) -> None:
 		"""Resets state of this racecar to initial values."""
-		self.p = self.initial_p.copy()
-		self.v = self.initial_v.copy()
-		self.a = self.initial_a.copy()
+		self.p = np.array(self.initial_p, dtype=self.dtype)
+		self.v = np.array(self.initial_v, dtype=self.dtype)
+		self.a = np.array(self.initial_a, dtype=self.dtype)
+		self.heading = self.dtype.type(self.initial_heading)
 		self.steps = 0  # number of steps made
+		self.progress = 0.
 		self.alive = True
 		self.resets += 1
 
@@ -90,10 +106,11 @@ class Racecar:
 			"pos": self.p,
 			"vel": self.v,
 			"accel": self.a,
+			"heading": self.heading,
+			"progress": self.progress,
 			"alive": self.alive,
 		}
 
 	def __eq__(self, other: Racecar) -> bool:
 		"""Checks if this racecar and other racecar are equal via id."""
 		return self.id == other.id
-
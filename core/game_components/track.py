@@ -5,8 +5,12 @@ from matplotlib import pyplot as plt
 import numpy as np
 from core.game_components.track_generation.perlin import *
 from core.game_components.track_generation.transformations import *
+from core.game_components.track_generation.simplification import douglas_peucker, max_deviation
 import random
-from scipy.interpolate import interp1d
+import math
+from core.settings import TRACK_LUT_RESOLUTION, DTYPE
+
+PERLIN_SMOOTHING = 30 # smoothed perlin edges have point_density * PERLIN_SMOOTHING points
 
 class Track:
     def __init__(self,
@@ -14,20 +18,28 @@ class Track:
             shape: tuple = (40, 10),
             point_density: int = 5,
             theta_offset: float = 50,
-            perturbation: callable = lambda i: (i%10) * (10 * np.sin(i)**2)
+            perturbation: callable = lambda i: (i%10) * (10 * np.sin(i)**2),
+            seed: int = None,
+            generate: bool = True,
+            lut_resolution: int = TRACK_LUT_RESOLUTION,
+            dtype: str = DTYPE
             ) -> None:
         self.type = type
+        self.seed = seed
+        self.rng = random.Random(seed) # seeded tracks are reproducible
         self.shape = shape
         self.point_density = point_density
         self.points_per_edge = shape[1] * point_density
-        self.radius_offset = 125 + random.randint(-30, 30)
+        self.radius_offset = 125 + self.rng.randint(-30, 30)
         self.theta_offset = theta_offset
-        if self.type == "perlin":
-            self.basic_euclidean_edges, self.polar_edges, self.euclidean_edges = self.perlin_track()
-        else:
-            self.basic_euclidean_edges, self.polar_edges, self.euclidean_edges = self.default_track(perturbation)
-
-        self.lerp = interp1d(self.polar_edges[0].T[1], self.polar_edges[0].T[0])
+        self.perturbation = perturbation
+        self.lut_resolution = lut_resolution
+        self.dtype = np.dtype(dtype) # geometry is generated in float64 and stored in this type
+        if generate:
+            if self.type == "perlin":
+                self.setEdges(*self.perlin_track())
+            else:
+                self.setEdges(*self.default_track(perturbation))
 
        # self.plot()
 
@@ -52,72 +64,224 @@ class Track:
         """
         return self.euclidean_edges[1]
 
-    def setFinalEuclidean(self, new_edges: np.array) -> None:
+    def setEdges(self, basic_euclidean_edges: np.array, polar_edges: np.array, euclidean_edges: np.array) -> None:
         """
-        Replaces the track's euclidean edges with an updated version
+        Stores the generated edges and prepares containment queries
 
         """
+        self.basic_euclidean_edges = basic_euclidean_edges.astype(self.dtype)
+        self.polar_edges = polar_edges.astype(self.dtype)
+        self.euclidean_edges = euclidean_edges.astype(self.dtype)
+        self.lods = {}
+        self.radius_lut = self.build_radius_lut(self.lut_resolution).astype(self.dtype)
 
-        self.euclidean_edges = new_edges
+    def build_radius_lut(self, resolution: int) -> np.array:
+        """
+        Samples the inner edge's radius at resolution evenly spaced angles
+        over [0, 2pi), plus a copy of the first sample at the end so that
+        blending between neighbouring entries wraps around
 
-    def default_track(self, perturbation: callable) -> tuple:
-        # construct initial euclidean edges
-        point_density = self.point_density
-        radius_offset = self.radius_offset
-        theta_offset = self.theta_offset
-        left_basic_edge = np.array([(perturbation(i / point_density), i / point_density) for i in range(self.points_per_edge)])
-        right_basic_edge = np.array([(self.shape[0] + perturbation(i / point_density), i / point_density) for i in range(self.points_per_edge)])
-        
-        left_basic_edge[-1][0] = left_basic_edge[0][0]
-        right_basic_edge[-1][0] = right_basic_edge[0][0]
+        """
+        thetas = np.arange(resolution) * (2 * np.pi / resolution)
+        radii = self.exact_inner_radius(thetas)
+        return np.append(radii, radii[0])
 
-        basic_euclidean_edges = np.array([left_basic_edge, right_basic_edge])
+    def exact_inner_radius(self, thetas: np.array) -> np.array:
+        """
+        Linear interpolation of the inner edge's (theta, r) samples,
+        wrapping around at 2pi
 
-        polar_edges, radii, thetas = to_polar(basic_euclidean_edges, radius_offset, theta_offset)
-       
-        euclidean_edges = to_euclidean(polar_edges, radii, thetas)
+        """
+        inner = self.polar_edges[0]
+        return np.interp(thetas, inner[:, 1], inner[:, 0], period=2 * np.pi)
 
-        return (basic_euclidean_edges, polar_edges, euclidean_edges)
+    def inner_radius(self, thetas: np.array) -> np.array:
+        """
+        Radius of the inner edge at angles in [0, 2pi) read from the lookup table
 
+        """
+        position = np.asarray(thetas) * (self.lut_resolution / (2 * np.pi))
+        index = np.minimum(position.astype(int), self.lut_resolution - 1)
+        blend = position - index
+        return self.radius_lut[index] * (1 - blend) + self.radius_lut[index + 1] * blend
 
+    def contains_many(self, pts: np.array) -> np.array:
+        """
+        Vectorized containment test of an (N, 2) array of points
 
-    def perlin_track(self, octaves: int = 5, amplitude: int = 80, smoothing_factor: int = 30) -> tuple:
-        amplitude = amplitude + random.randint(-5, 5)
-        density = self.point_density 
-        radius_offset = self.radius_offset
-        theta_offset = 0
-        width = self.shape[0]  
+        """
+        pts = np.asarray(pts, dtype=self.dtype)
+        r = np.hypot(pts[:, 0], pts[:, 1])
+        theta = np.arctan2(pts[:, 1], pts[:, 0]) % (2 * np.pi)
+        left_r = self.inner_radius(theta)
+        return (r >= left_r) & (r <= left_r + self.shape[0])
+
+    def lut_accuracy(self, samples: int = 100000) -> dict:
+        """
+        Compares the lookup table against exact interpolation of the inner
+        edge at evenly spaced angles, errors are in track units
+
+        """
+        thetas = np.linspace(0, 2 * np.pi, samples, endpoint=False)
+        error = np.abs(self.inner_radius(thetas) - self.exact_inner_radius(thetas))
+        return {
+            "resolution": self.lut_resolution,
+            "max_error": float(error.max()),
+            "mean_error": float(error.mean()),
+            "max_error_share_of_width": float(error.max() / self.shape[0]),
+        }
+
+    def lod(self, tolerance: float) -> tuple:
+        """
+        Level of detail of the euclidean edges, each simplified on its own
+        with Douglas-Peucker so no dropped point lies further than tolerance
+        from it, in the edges' units. Levels are cached until the edges change
+
+        returns: simplified (inner, outer) edges, tolerance 0 returns the full edges
+
+        """
+        if tolerance <= 0:
+            return tuple(self.euclidean_edges)
+        if tolerance not in self.lods:
+            self.lods[tolerance] = tuple(edge[douglas_peucker(edge, tolerance)] for edge in self.euclidean_edges)
+        return self.lods[tolerance]
+
+    def lod_report(self, tolerances: tuple = (0.1, 0.25, 0.5, 1, 2, 4)) -> list:
+        """
+        Vertex counts and largest deviation from the full edges of each
+        level of detail, deviations are in the edges' units
+
+        """
+        full = sum(len(edge) for edge in self.euclidean_edges)
+        report = []
+        for tolerance in tolerances:
+            kept = [douglas_peucker(edge, tolerance) for edge in self.euclidean_edges]
+            vertices = sum(len(indices) for indices in kept)
+            report.append({
+                "tolerance": tolerance,
+                "vertices": vertices,
+                "share_of_full": vertices / full,
+                "max_deviation": max(max_deviation(edge, indices) for edge, indices in zip(self.euclidean_edges, kept)),
+            })
+        return report
+
+    def curvature(self) -> tuple:
+        """
+        Curvature of the centre line between the two euclidean edges at
+        each of its points, the turning angle there divided by the mean
+        length of the two neighbouring segments, in the edges' units
+
+        returns: (M, 2) centre line points and (M,) curvature at each
 
-        if random.random() < 0:# 0.5:
-            left = get_perlin_line2(density, density * self.shape[1], amplitude=amplitude)
+        """
+        centre = self.euclidean_edges.astype(float).mean(axis=0)
+        if np.allclose(centre[0], centre[-1]):
+            centre = centre[:-1] # closed loops repeat their first point
+        incoming = centre - np.roll(centre, 1, axis=0)
+        outgoing = np.roll(centre, -1, axis=0) - centre
+        turn = np.arctan2(incoming[:, 0] * outgoing[:, 1] - incoming[:, 1] * outgoing[:, 0], (incoming * outgoing).sum(axis=1))
+        length = (np.hypot(*incoming.T) + np.hypot(*outgoing.T)) / 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            curvature = np.where(length > 0, np.abs(turn) / length, 0.)
+        return centre, curvature
+
+    @classmethod
+    def generateMany(cls, count: int, type: str = "default", seed: int = None, **kwargs) -> list:
+        """
+        Generates count tracks, smoothing and transforming all of them
+        together in a single set of array operations
+
+        Each track gets its own seed drawn from seed, so the same seed
+        always produces the same tracks
+
+        """
+        rng = random.Random(seed)
+        tracks = [cls(type=type, seed=rng.randint(1, 10**9), generate=False, **kwargs) for _ in range(count)]
+        if not tracks:
+            return tracks
+        track = tracks[0]
+
+        if type == "perlin":
+            lines = smooth_batch(np.array([t.perlin_line() for t in tracks]), track.shape[1], track.point_density * PERLIN_SMOOTHING)
+            theta_offsets = 0
         else:
-            octaves = octaves + random.randint(0, 1)
-            left = get_perlin_line(density, density * self.shape[1], octaves=octaves, amplitude=amplitude)
-        left = smooth(left, self.shape[1], density * smoothing_factor)
-        #left = np.array(list(map(lambda pt: (pt[0] + (random.random() - 0.5), pt[1] + random.random() - 0.5), left)))
-        right = np.array(list(map(lambda pt: (pt[0] + width, pt[1]), left)))
+            lines = np.array([t.default_line(t.perturbation) for t in tracks])
+            theta_offsets = [t.theta_offset for t in tracks]
+
+        radius_offsets = [t.radius_offset for t in tracks]
+        edges = Track.build_edges(lines, track.shape[0], radius_offsets, theta_offsets)
+        for t, basic, polar, euclidean in zip(tracks, *edges):
+            t.setEdges(basic, polar, euclidean)
+        return tracks
 
-        left[-1][0] = left[0][0]
-        right[-1][0] = right[0][0]
+    @staticmethod
+    def build_edges(left_edges: np.array, width: float, radius_offsets, theta_offsets) -> tuple:
+        """
+        Turns a (K, M, 2) stack of basic left edges into the basic euclidean,
+        polar and final euclidean edges of K tracks, each (K, 2, M, 2)
 
-        basic_euclidean_edges = np.array([left, right])
+        """
+        right_edges = left_edges + np.array([width, 0])
+        basic_euclidean_edges = np.stack([left_edges, right_edges], axis=1)
+        basic_euclidean_edges[..., -1, 0] = basic_euclidean_edges[..., 0, 0] # close the loop
 
-        polar_edges, radii, thetas = to_polar(basic_euclidean_edges, radius_offset, theta_offset)
-        euclidean_edges = to_euclidean(polar_edges, radii, thetas)
+        polar_edges = to_polar_batch(basic_euclidean_edges, radius_offsets, theta_offsets)
+        euclidean_edges = to_euclidean_batch(polar_edges)
 
         return (basic_euclidean_edges, polar_edges, euclidean_edges)
 
+    def setFinalEuclidean(self, new_edges: np.array) -> None:
+        """
+        Replaces the track's euclidean edges with an updated version
+
+        """
+
+        self.euclidean_edges = np.asarray(new_edges, dtype=self.dtype)
+        self.lods = {}
+
+    def default_line(self, perturbation: callable) -> np.array:
+        """
+        Left edge of the default track before it is bent into a loop
+
+        """
+        point_density = self.point_density
+        return np.array([(perturbation(i / point_density), i / point_density) for i in range(self.points_per_edge)])
+
+    def default_track(self, perturbation: callable) -> tuple:
+        # construct initial euclidean edges
+        left_basic_edge = self.default_line(perturbation)
+        edges = Track.build_edges(left_basic_edge[None], self.shape[0], self.radius_offset, self.theta_offset)
+        return tuple(edge[0] for edge in edges)
+
+    def perlin_line(self, octaves: int = 5, amplitude: int = 80) -> np.array:
+        """
+        Unsmoothed perlin noise left edge, draws from this track's random generator
+
+        """
+        amplitude = amplitude + self.rng.randint(-5, 5)
+        density = self.point_density 
+
+        noise_seed = self.rng.randint(1, 10**5)
+        if self.rng.random() < 0:# 0.5:
+            return get_perlin_line2(density, density * self.shape[1], amplitude=amplitude, seed=noise_seed)
+        octaves = octaves + self.rng.randint(0, 1)
+        return get_perlin_line(density, density * self.shape[1], octaves=octaves, amplitude=amplitude, seed=noise_seed)
+
+    def perlin_track(self, octaves: int = 5, amplitude: int = 80, smoothing_factor: int = PERLIN_SMOOTHING) -> tuple:
+        left = self.perlin_line(octaves, amplitude)
+        left = smooth_batch(left[None], self.shape[1], self.point_density * smoothing_factor)
+        #left = np.array(list(map(lambda pt: (pt[0] + (random.random() - 0.5), pt[1] + random.random() - 0.5), left)))
+
+        edges = Track.build_edges(left, self.shape[0], self.radius_offset, 0)
+        return tuple(edge[0] for edge in edges)
+
     def __contains__(self, pt: tuple) -> bool:
-        r, theta = revert_to_polar(pt)
-        try:
-            left_r = self.lerp(theta)
-            right_r = left_r + self.shape[0]
-            if (r >= left_r and r <= right_r):
-                return True
-            else:
-                return False
-        except ValueError as e:
-            return False
+        r = math.hypot(pt[0], pt[1])
+        position = (math.atan2(pt[1], pt[0]) % (2 * math.pi)) * (self.lut_resolution / (2 * math.pi))
+        index = min(int(position), self.lut_resolution - 1)
+        blend = position - index
+        left_r = self.radius_lut[index] * (1 - blend) + self.radius_lut[index + 1] * blend
+        return left_r <= r <= left_r + self.shape[0]
 
 
 
@@ -160,9 +324,7 @@ class Track:
 
         plt.figure()
         thetas = np.linspace(0, np.pi * 2, 100)
-        rs = np.zeros(100,)
-        for i in range(thetas.shape[0]):
-            rs[i] = self.lerp(thetas[i])
+        rs = self.inner_radius(thetas % (2 * np.pi))
         plt.plot(rs, thetas, c="green")
 
         plt.grid(ls="--", alpha=0.25)
@@ -175,5 +337,6 @@ class Track:
        
 if __name__ == "__main__":      
     track = Track(type="perlin")
+    print(track.lut_accuracy())
     track.plot() 
            
\ No newline at end of file
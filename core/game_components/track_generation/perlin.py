@@ -2,15 +2,17 @@ from perlin_noise import PerlinNoise
 import numpy as np
 from scipy.interpolate import interp1d
 
-def get_perlin_line(density: int, num_points: int, octaves: int = 4, amplitude: int = 75) -> np.array:
+def get_perlin_line(density: int, num_points: int, octaves: int = 4, amplitude: int = 75, seed: int = None) -> np.array:
     """
     Returns perlin noise based on given level of stochasticity
 
     Octaves: Number of layered noise functions being used to create the
     perlin noise. More octaves means more stochasticty and more jaggedness
 
+    Seed: Optional noise seed, the same seed always produces the same line
+
     """
-    noise = PerlinNoise(octaves = octaves)
+    noise = PerlinNoise(octaves = octaves, seed = seed)
     pts = np.zeros((num_points, 2))
 
     for i in range(num_points):
@@ -23,15 +25,15 @@ def get_perlin_line(density: int, num_points: int, octaves: int = 4, amplitude:
 
     return pts
 
-def get_perlin_line2(density: int, num_points: int, amplitude: int = 75) -> np.array:
+def get_perlin_line2(density: int, num_points: int, amplitude: int = 75, seed: int = None) -> np.array:
     """
     This one's unpredictable but has done some cool stuff
 
     """
-    noise1 = PerlinNoise(octaves=4)
-    noise2 = PerlinNoise(octaves=8)
-    noise3 = PerlinNoise(octaves=12)
-    noise4 = PerlinNoise(octaves=16)
+    noise1 = PerlinNoise(octaves=4, seed=seed)
+    noise2 = PerlinNoise(octaves=8, seed=seed)
+    noise3 = PerlinNoise(octaves=12, seed=seed)
+    noise4 = PerlinNoise(octaves=16, seed=seed)
     pts = np.zeros((num_points, 2))
 
     for i in range(num_points):
@@ -51,8 +53,15 @@ def smooth(pts: np.array, height: int, density: int) -> np.array:
     1-D cubic interpolation
 
     """
-    pts = pts.T 
-    cubic_interpolation = interp1d(pts[1], pts[0], kind='cubic', fill_value="extrapolate")
+    return smooth_batch(np.asarray(pts)[None], height, density)[0]
+
+def smooth_batch(lines: np.array, height: int, density: int) -> np.array:
+    """
+    1-D cubic interpolation of a (K, M, 2) stack of lines sampled
+    at the same y values, done in a single interpolation
+
+    """
+    cubic_interpolation = interp1d(lines[0, :, 1], lines[..., 0], kind='cubic', axis=1, fill_value="extrapolate")
     new_y = np.linspace(0, height, density)
     new_x = cubic_interpolation(new_y)
-    return np.array([new_x, new_y]).T
\ No newline at end of file
+    return np.stack([new_x, np.broadcast_to(new_y, new_x.shape)], axis=-1)
\ No newline at end of file
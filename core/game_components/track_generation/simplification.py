@@ -0,0 +1,50 @@
+import numpy as np
+
+def segment_distances(points: np.array, starts: np.array, ends: np.array) -> np.array:
+    """
+    Requires (N, 2) points and the (N, 2) start and end of a segment for
+    each of them.
+    Returns the (N,) distance from each point to its segment
+
+    """
+    segment = ends - starts
+    length_squared = (segment ** 2).sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(length_squared > 0, ((points - starts) * segment).sum(axis=-1) / length_squared, 0)
+    closest = starts + np.clip(t, 0, 1)[:, None] * segment
+    return np.hypot(*(points - closest).T)
+
+def douglas_peucker(polyline: np.array, tolerance: float) -> np.array:
+    """
+    Requires an (M, 2) polyline and the largest distance, in the
+    polyline's units, any dropped point may lie from the simplified line.
+    Returns the sorted indices of the points kept, which always include
+    both ends so closed loops stay closed
+
+    """
+    polyline = np.asarray(polyline, dtype=float)
+    keep = np.zeros(len(polyline), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(polyline) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        inside = polyline[first + 1:last]
+        distances = segment_distances(inside, np.broadcast_to(polyline[first], inside.shape), np.broadcast_to(polyline[last], inside.shape))
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.extend(((first, split), (split, last)))
+    return np.flatnonzero(keep)
+
+def max_deviation(polyline: np.array, kept: np.array) -> float:
+    """
+    Requires an (M, 2) polyline and the indices kept by douglas_peucker.
+    Returns the largest distance from any original point to the simplified line
+
+    """
+    polyline = np.asarray(polyline, dtype=float)
+    segment = np.clip(np.searchsorted(kept, np.arange(len(polyline)), side="right") - 1, 0, len(kept) - 2)
+    return float(segment_distances(polyline, polyline[kept[segment]], polyline[kept[segment + 1]]).max())
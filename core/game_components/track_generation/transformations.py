@@ -1,5 +1,34 @@
 import numpy as np
 
+def to_polar_batch(euclidean_edges: np.array, radius_offset, theta_offset) -> np.array:
+    """
+    Batched to_polar. Requires a (K, 2, M, 2) stack of K tracks' left and
+    right euclidean edges, and radius and theta offsets that are either
+    scalars or one value per track.
+    Returns the (K, 2, M, 2) polar edges, each point being (r, theta)
+
+    """
+    euclidean_edges = np.asarray(euclidean_edges, dtype=float)
+    x, y = euclidean_edges[..., 0], euclidean_edges[..., 1]
+
+    r = x + np.reshape(radius_offset, (-1, 1, 1))
+
+    y_min = y.min(axis=-1, keepdims=True)
+    y_max = y.max(axis=-1, keepdims=True)
+    theta = (y - y_min) / (y_max - y_min) * 2 * np.pi + np.reshape(theta_offset, (-1, 1, 1))
+
+    return np.stack([r, theta], axis=-1)
+
+def to_euclidean_batch(polar_edges: np.array) -> np.array:
+    """
+    Batched to_euclidean. Requires polar edges of any leading shape,
+    e.g. (K, 2, M, 2), whose points are (r, theta).
+    Returns euclidean edges of the same shape
+
+    """
+    r, theta = polar_edges[..., 0], polar_edges[..., 1]
+    return np.stack([r * np.cos(theta), r * np.sin(theta)], axis=-1)
+
 def to_polar(euclidean_edges: np.array, radius_offset: float, theta_offset: float) -> tuple:
     """
     Requires an array containing left and right euclidean edges as well
@@ -7,45 +36,17 @@ def to_polar(euclidean_edges: np.array, radius_offset: float, theta_offset: floa
     Returns the polar edges along with the radii of the two lines and their theta values
 
     """
-
-    left_basic_edge = euclidean_edges[0]
-    right_basic_edge = euclidean_edges[1]
-    left_basic_x, left_basic_y = left_basic_edge[:,0], left_basic_edge[:,1]
-    right_basic_x, right_basic_y = right_basic_edge[:,0], right_basic_edge[:,1]
-    
-    left_r = left_basic_x + radius_offset
-    right_r = right_basic_x + radius_offset
-    
-    left_basic_y_min, left_basic_y_max = left_basic_y.min(), left_basic_y.max()
-    right_basic_y_min, right_basic_y_max = right_basic_y.min(), right_basic_y.max()
-    
-    left_theta = (left_basic_y - left_basic_y_min) / (left_basic_y_max - left_basic_y_min) * 2 * np.pi + theta_offset
-    right_theta = (right_basic_y - right_basic_y_min) / (right_basic_y_max - right_basic_y_min) * 2 * np.pi + theta_offset
-    
-    polar_edges = np.array([np.stack([left_r, left_theta], axis=1), np.stack([right_r, right_theta], axis=1)])
-
-    radii = [left_r, right_r]
-    thetas = [left_theta, right_theta]
-    return polar_edges, radii, thetas
+    polar_edges = to_polar_batch(np.asarray(euclidean_edges)[None], radius_offset, theta_offset)[0]
+    return polar_edges, polar_edges[..., 0], polar_edges[..., 1]
 
 def to_euclidean(polar_edges: np.array, radii: list, thetas: list) -> np.array:
     """
     Requries an array of left and right polar edges as well as 
-    radius and theta offsets.
-    Returns the euclidean edges as well as the radii of the two lines and their 
-    theta values.
+    the radii of the two lines and their theta values.
+    Returns the euclidean edges.
 
     """
-    left_r = radii[0]
-    right_r = radii[1]
-    left_theta = thetas[0]
-    right_theta = thetas[0]
-
-    left_x, left_y = left_r * np.cos(left_theta), left_r * np.sin(left_theta)
-    right_x, right_y = right_r * np.cos(right_theta), right_r * np.sin(right_theta)
-
-    euclidean_edges = np.array([np.stack([left_x, left_y], axis=1), np.stack([right_x, right_y], axis=1)])
-    return euclidean_edges
+    return to_euclidean_batch(np.stack([np.asarray(radii), np.asarray(thetas)], axis=-1))
 
 def revert_to_polar(pt: tuple) -> np.array:
     """ 
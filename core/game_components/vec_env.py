@@ -0,0 +1,163 @@
+"""
+
+"""
+import numpy as np
+
+from core.game_components.track import Track
+from core.game_components.environment import Environment
+from core.game_components.integrator import AdaptiveIntegrator
+from core.training.termination import FleetState, applyPolicies
+from core.settings import *
+
+
+class VecRacingEnv:
+    """
+    Batched reset/step interface over N cars racing on an Environment,
+    following the same physics as Racecar. Nothing here touches pygame
+
+    Observations are the cars' normalized ray lengths, actions are
+    (steering, throttle) pairs and rewards are the radians of track
+    covered during the step. Observation, action, state and scratch buffers
+    are allocated by reset and reused by every step, so the returned arrays
+    are overwritten by the next call. Step still allocates the (N, R, S)
+    ray/segment intersection temporaries inside castRays, the collision
+    checks, and the observations of the living cars once some have died
+
+    Every tick matches Racecar and evaluate to rounding, not bit for bit:
+    the turn is an elementwise rotation here and a 2x2 matmul in Racecar,
+    so positions differ by around 1e-9 pixels. A network can amplify that
+    into a different decision, so the progress of whole races agrees to
+    rounding for most cars but can differ completely for a few
+
+    """
+    def __init__(self,
+            environment: Environment = None,
+            num_rays: int = 8,
+            max_steps: int = MAX_STEPS,
+            policies: list = None,
+            max_turning_rate: float = CAR_MAX_TURNING_RATE,
+            max_acceleration: float = CAR_MAX_ACCELERATION,
+            max_speed: float = CAR_MAX_SPEED,
+            seed: int = None,
+            swept: bool = SWEPT_COLLISION,
+            integrator: AdaptiveIntegrator = None
+            ) -> None:
+        self.environment = environment if environment is not None else Environment(Track(type=TRACK_TYPE, seed=seed))
+        self.num_rays = num_rays
+        self.max_steps = max_steps
+        self.policies = policies if policies is not None else []
+        self.max_turning_rate = max_turning_rate
+        self.max_acceleration = max_acceleration
+        self.max_speed = max_speed
+        self.swept = swept # stop cars at the first wall their motion crosses, like evaluate
+        if integrator is None and ADAPTIVE_SUBSTEPS:
+            integrator = AdaptiveIntegrator(self.environment)
+        self.integrator = integrator # moves the cars in substeps when set
+        self.dtype = self.environment.dtype # car state, observations and actions use the track's dtype
+        self.n = 0
+        self.terminations = {}
+
+    def reset(self, n: int) -> np.ndarray:
+        """
+        Places n cars on the starting line, allocating buffers if n changed
+
+        returns: (n, num_rays) observations
+
+        """
+        if n != self.n:
+            self.n = n
+            self.positions = np.empty((n, 2), dtype=self.dtype)
+            self.velocities = np.empty((n, 2), dtype=self.dtype)
+            self.headings = np.empty(n, dtype=self.dtype)
+            self.steps = np.empty(n, dtype=int)
+            self.obs = np.empty((n, self.num_rays), dtype=self.dtype)
+            self.actions = np.empty((n, 2), dtype=self.dtype)
+            self.reward = np.empty(n)
+            self.done = np.empty(n, dtype=bool)
+            self._before = np.empty((n, 2), dtype=self.dtype)
+            self._scratch = np.empty((3, n), dtype=self.dtype)
+            self._dead = np.empty(n, dtype=bool)
+
+        self.positions[:] = self.environment.starting_point
+        self.velocities[:] = 0
+        self.headings[:] = self.environment.starting_heading
+        self.steps[:] = 0
+        self.state = FleetState(n)
+        self.terminations = {"crash": 0}
+        self.environment.castRays(self.positions, self.headings, self.num_rays, out=self.obs)
+        return self.obs
+
+    def step(self, actions: np.ndarray) -> tuple:
+        """
+        Applies one (steering, throttle) action per car, dead cars ignore theirs
+
+        returns: observations (n, num_rays), rewards (n,), done (n,) and an info
+                 dict with each car's total progress, steps and alive mask
+
+        """
+        alive = self.state.alive
+        dead = np.logical_not(alive, out=self._dead)
+        np.copyto(self.actions, actions)
+        steering, throttle = self.actions[:, 0], self.actions[:, 1]
+        np.clip(steering, -self.max_turning_rate, self.max_turning_rate, out=steering)
+        np.clip(throttle, -self.max_acceleration, self.max_acceleration, out=throttle)
+        steering[dead] = 0
+        throttle[dead] = 0
+        np.copyto(self._before, self.positions)
+
+        if self.integrator is not None:
+            self.integrator.step(self.positions, self.velocities, self.headings, steering, throttle, self.max_speed)
+        else:
+            # turn: rotate the velocity and heading
+            cos, sin, tmp = self._scratch
+            vx, vy = self.velocities[:, 0], self.velocities[:, 1]
+            self.headings += steering
+            np.cos(steering, out=cos)
+            np.sin(steering, out=sin)
+            np.multiply(sin, vx, out=tmp)
+            vx *= cos
+            vx -= np.multiply(sin, vy, out=sin)
+            vy *= cos
+            vy += tmp
+
+            # step: move, then accelerate along the new heading and cap the speed
+            self.positions += self.velocities
+            vx += np.multiply(throttle, np.cos(self.headings, out=cos), out=cos)
+            vy += np.multiply(throttle, np.sin(self.headings, out=sin), out=sin)
+            speed = np.hypot(vx, vy, out=tmp)
+            np.maximum(speed, self.max_speed, out=speed)
+            np.divide(self.max_speed, speed, out=speed)
+            self.velocities *= speed[:, None]
+        self.steps += alive
+
+        crashed = alive & ~self.environment.trackContainsMany(self.positions)
+        if self.swept:
+            impact = self.environment.timeOfImpact(self._before, self.positions)
+            hit = alive & (impact <= 1)
+            self.positions[hit] = self._before[hit] + impact[hit, None] * (self.positions[hit] - self._before[hit])
+            crashed |= hit
+        np.copyto(self.reward, self.environment.progress(self._before, self.positions))
+        self.reward[dead] = 0
+        self.state.update(self.reward, np.hypot(self.velocities[:, 0], self.velocities[:, 1]))
+
+        self.terminations["crash"] += int(crashed.sum())
+        self.state.alive &= ~crashed
+        kill = crashed | applyPolicies(self.policies, self.state, self.terminations)
+        self.state.alive &= ~kill
+        self.velocities[kill] = 0
+
+        still = self.state.alive
+        if still.all():
+            self.environment.castRays(self.positions, self.headings, self.num_rays, out=self.obs)
+        elif still.any():
+            self.obs[still] = self.environment.castRays(self.positions[still], self.headings[still], self.num_rays)
+
+        np.greater_equal(self.steps, self.max_steps, out=self.done)
+        self.done |= np.logical_not(self.state.alive, out=self._dead)
+        info = {
+            "progress": self.state.progress,
+            "steps": self.steps,
+            "alive": self.state.alive,
+            "terminations": self.terminations,
+        }
+        return self.obs, self.reward, self.done, info
@@ -10,8 +10,13 @@ import os
 os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "hide"  # hide Pygame greeting message
 
 
+# NUMERICS
+DTYPE = 'float64'  # float type of networks, car state, track geometry and sensors, 'float32' halves memory traffic
+
 # SCREEN
 SCREEN_SIZE = (800, 600)
+RENDER_SCALE = 1.0  # fraction of SCREEN_SIZE the scene is drawn at before being scaled up to the window, lower trades sharpness for fill rate
+SMOOTH_UPSCALE = False  # bilinear instead of nearest neighbour scaling from the render resolution to the window
 
 # FPS AND DISPLAY
 TARGET_FPS = 60
@@ -21,8 +26,94 @@ SMOOTHNESS = 3  # controls how fast and smooth animations run
 TRACK_TYPE = "perlin"
 TRACK_ORIGIN = (SCREEN_SIZE[0] // 2, SCREEN_SIZE[1] // 2)
 TRACK_SCALE = 1.5
+TRACK_LUT_RESOLUTION = 4096  # entries in each track's inner radius lookup table
+PHYSICS_LOD = 0  # pixels ray casting and swept collision edges may deviate from the full track, 0 uses every point
+RENDER_LOD = 0.5  # pixels drawn track edges may deviate from the full track
+
+# SIMULATION
+MAX_STEPS = 1000  # ticks before an evaluation is cut off
+RAY_LENGTH = 200  # how far a car's sensors can see
+RAY_FOV = 3.14159  # spread of a car's sensors, in radians
+SWEPT_COLLISION = True  # crash cars whose motion crosses a track edge, not just cars that end a tick off the track
+
+# SUBSTEPS
+ADAPTIVE_SUBSTEPS = False  # split fast, turning cars' ticks into several physics substeps
+MAX_SUBSTEPS = 8
+SUBSTEP_TOLERANCE = 2.0  # pixels a car may drift from its continuous path per tick
+
+# CAR
+CAR_MAX_TURNING_RATE = 2.35619  # radians per tick (135 degrees)
+CAR_MAX_ACCELERATION = 5
+CAR_MAX_SPEED = 10
+
+# EARLY TERMINATION
+STALL_TICKS = 60  # ticks a car may go without beating its best progress
+MIN_SPEED = 0.5
+SPEED_GRACE_TICKS = 20  # ticks before MIN_SPEED is enforced
+REVERSE_TOLERANCE = 0.2  # radians a car may fall back from its best progress
+
+# EVOLUTION
+POPULATION_SIZE = 50
+ELITE_RATIO = 0.1
+MUTATION_RATE = 0.1  # chance of each weight being perturbed
+MUTATION_SCALE = 0.5
+TRACK_INTERVAL = 5  # generations raced on the same track before a new one is generated
+FITNESS_CACHE_SIZE = 10000  # fitness values remembered for networks raced on the current track
+
+# SPECIATION
+SPECIATION = False  # group networks into species and share fitness within each
+COMPATIBILITY_THRESHOLD = 0.5  # root mean square parameter difference within which a network joins a species
+TARGET_SPECIES = 8  # the threshold is nudged every generation towards this many species
+MAX_SPECIES = 32  # once this many exist, networks no species accepts join the nearest instead of founding more
+THRESHOLD_STEP = 0.1  # relative change of the threshold per generation
+DISTANCE_BLOCK_SIZE = 1024  # networks compared per block of the distance matrix, bounds its memory
+
+# SPECTATOR
+SPECTATOR_TOP_K = 5  # leading cars shown alongside the champion
+SPECTATOR_FPS = 30  # cap on snapshots published and frames rendered
+SPECTATOR_QUEUE_SIZE = 2  # snapshots waiting for the renderer, newer ones are dropped when full
+
+# TELEMETRY
+TELEMETRY_FOLDER = 'telemetry'
+TELEMETRY_QUEUE_SIZE = 1000  # records waiting for the writer, newer ones are dropped when full
+TELEMETRY_BATCH_SIZE = 64  # records written per flush
+TELEMETRY_FLUSH_INTERVAL = 1.0  # seconds a partial batch may wait before being written
+
+# MEMORY PROFILING
+MEMORY_PROFILING = False  # snapshot tracemalloc after every generation, slows allocation down
+MEMORY_TOP_SITES = 5  # allocation sites with the most growth reported per generation
+MEMORY_WINDOW = 10  # generations growth is measured across
+MEMORY_GROWTH_THRESHOLD = 50 * 2**20  # bytes of growth across MEMORY_WINDOW generations that trigger a warning
+
+# VIDEO EXPORT
+EXPORT_FOLDER = 'exports'
+EXPORT_FPS = 30  # frame rate of the encoded clip, one frame per tick
+
+# ISLAND MODEL
+MIGRATION_INTERVAL = 5  # generations between migrations
+MIGRANTS = 2  # networks each island sends per migration
+
+# SWEEP
+SWEEP_FOLDER = 'sweeps'
+SWEEP_GENERATIONS = 20  # generations evolved per configuration
+SWEEP_SAMPLES = 20  # configurations drawn by a random search
+# lists are choices, (low, high) pairs are uniform ranges and (low, high, "log") log-uniform ones for random search,
+# grid search only takes lists, car settings go to every Racecar and the rest to Evolution
+SWEEP_SPACE = {
+    "mutationRate": [0.05, 0.1, 0.2],
+    "populationSize": [50, 100],
+    "architecture": [(8, 6, 2), (8, 12, 2)],
+    "max_turning_rate": [1.5, CAR_MAX_TURNING_RATE],
+}
+
+# TOURNAMENT
+CHAMPION_FOLDER = 'champions'
+TOURNAMENT_FOLDER = 'tournaments'
+HEAT_SIZE = 4
+ELO_K = 32
 
 # ASSET PATHS
 TRACK_TEXTURE = 'earth2.png'
 FROG_CAR = 'frog-car-big.png'
 BACKGROUND = 'new_flowers-big.png'
+ASSET_CACHE = '.asset_cache'  # decoded images are kept here between launches, None disables
@@ -0,0 +1,303 @@
+"""
+Genetic algorithm evolving populations of racing networks.
+"""
+
+import time
+import random
+from functools import partial
+
+import numpy as np
+
+from core.game_components.track import Track
+from core.game_components.environment import Environment
+from core.training.neural_net import FFNN
+from core.training.simulation import evaluate, makeCars
+from core.training.termination import defaultPolicies
+from core.training.shared_population import SharedEvaluator, mergeStats
+from core.training.fitness_cache import FitnessCache
+from core.training.genetics import GeneticOperators
+from core.training.memory import MemoryProfiler
+from core.training.speciation import Speciation
+from core.settings import (
+	TRACK_TYPE, MAX_STEPS, POPULATION_SIZE, ELITE_RATIO, MUTATION_RATE, MUTATION_SCALE,
+	TRACK_INTERVAL, FITNESS_CACHE_SIZE, DTYPE, MEMORY_PROFILING, SPECIATION
+)
+
+
+class Evolution:
+	"""
+	Evolves a population of FFNNs, racing them on a freshly generated track
+	every trackInterval generations. The population is a single parameter
+	matrix bred in place by GeneticOperators.
+
+	Public Methods
+	--------------
+	runGeneration() -> dict:
+		Evaluates the current population, breeds the next one and returns generation stats.
+	run(generations, callback) -> FFNN:
+		Runs several generations and returns the best network seen.
+	networks() -> list:
+		FFNN views of the current population.
+	emigrants(n) -> np.ndarray:
+		Parameter vectors of the n best networks of the last generation.
+	immigrate(params) -> None:
+		Replaces the newest children with networks built from parameter vectors.
+	close() -> None:
+		Stops evaluation workers, if any.
+	"""
+	def __init__(
+			self,
+			populationSize: int = POPULATION_SIZE,
+			architecture: tuple = (8, 6, 2),
+			eliteRatio: float = ELITE_RATIO,
+			mutationRate: float = MUTATION_RATE,
+			mutationScale: float = MUTATION_SCALE,
+			trackType: str = TRACK_TYPE,
+			maxSteps: int = MAX_STEPS,
+			policies: list = None,
+			seed: int = None,
+			workers: int = 1,
+			trackInterval: int = TRACK_INTERVAL,
+			cacheSize: int = FITNESS_CACHE_SIZE,
+			observer: callable = None,
+			selection: str = "truncation",
+			crossover: str = None,
+			mutation: str = "gaussian",
+			dtype: str = DTYPE,
+			profileMemory: bool = MEMORY_PROFILING,
+			speciation: bool = SPECIATION,
+			car: dict = None
+			) -> None:
+		"""
+		Initializes a random population.
+
+		Parameters
+		----------
+		populationSize: int, default=POPULATION_SIZE
+			Number of networks per generation
+		architecture: tuple, default=(8, 6, 2)
+			Layer sizes of every network
+		eliteRatio: float, default=ELITE_RATIO
+			Share of each generation carried over unchanged
+		mutationRate: float, default=MUTATION_RATE
+			Chance of each parameter being perturbed
+		mutationScale: float, default=MUTATION_SCALE
+			Standard deviation of perturbations
+		trackType: str, default=TRACK_TYPE
+			Type of track generated each generation
+		maxSteps: int, default=MAX_STEPS
+			Tick limit of each evaluation
+		policies: list, optional
+			Early termination policies, defaults to termination.defaultPolicies()
+		seed: int, optional
+			Seeds track generation and breeding
+		workers: int, default=1
+			Evaluation processes, more than 1 evaluates through a SharedEvaluator
+		trackInterval: int, default=TRACK_INTERVAL
+			Generations raced on the same track
+		cacheSize: int, default=FITNESS_CACHE_SIZE
+			Fitness values remembered so unchanged networks aren't raced twice on a track, 0 disables
+		observer: callable, optional
+			Called with the generation, track seed, FleetState and cars after every
+			tick, only when evaluating in this process (workers=1)
+		selection: str, default="truncation"
+			Parent selection, "truncation" (better half), "tournament" or "rank"
+		crossover: str, optional
+			None (children mutate a single parent), "uniform", "arithmetic" or "layer"
+		mutation: str, default="gaussian"
+			"gaussian" perturbs parameters, "reset" redraws them
+		dtype: str, default=DTYPE
+			Float type of the parameters
+		profileMemory: bool, default=MEMORY_PROFILING
+			Adds a MemoryProfiler sample to the stats of every generation, which
+			only traces this process, not evaluation workers
+		speciation: bool, default=SPECIATION
+			Groups networks into species and selects parents on fitness shared within each,
+			the elites are the best network of every species by raw fitness, best first
+		car: dict, optional
+			Racecar settings such as max_turning_rate, see simulation.makeCars
+		"""
+		self.populationSize = populationSize
+		self.architecture = architecture
+		self.eliteCount = max(1, int(round(populationSize * eliteRatio)))
+		self.mutationRate = mutationRate
+		self.mutationScale = mutationScale
+		self.trackType = trackType
+		self.maxSteps = maxSteps
+		self.policies = policies if policies is not None else defaultPolicies()
+		self.rng = random.Random(seed)
+		self.generation = 0
+		self.selection = selection
+		self.crossover = crossover
+		self.mutation = mutation
+		self.champion = None
+		self.championFitness = -np.inf
+		self.evaluator = SharedEvaluator(workers, populationSize, architecture, dtype) if workers > 1 else None
+		# with workers the population is bred straight into the shared blocks they read
+		self.genetics = GeneticOperators(populationSize, architecture, dtype, seed, None if self.evaluator is None else self.evaluator.population.params)
+		self.trackInterval = trackInterval
+		self.trackSeed = None
+		self.cache = FitnessCache(cacheSize) if cacheSize > 0 else None
+		self.observer = observer
+		self.memory = MemoryProfiler(workers=workers) if profileMemory else None
+		self.speciation = Speciation(seed=seed) if speciation else None
+		self.car = car
+		self.simSettings = repr((trackType, maxSteps, [(policy.name, sorted(vars(policy).items())) for policy in self.policies], sorted((car or {}).items())))
+
+	def runGeneration(self) -> dict:
+		"""
+		Evaluates the current population, breeds the next one and returns generation stats.
+
+		Returns
+		-------
+		dict: fitness summary and percentiles, parameter diversity, evaluation time
+		and throughput, early termination savings, alive curve, cache hits and,
+		when enabled, species stats and a memory sample
+		"""
+		start = time.perf_counter()
+		if self.generation % self.trackInterval == 0:
+			self.trackSeed = self.rng.randint(1, 10**9)
+
+		population = self.genetics.population
+		fitness = np.zeros(self.populationSize)
+		keys, pending = [None] * self.populationSize, []
+		for i, params in enumerate(population):
+			if self.cache is not None:
+				keys[i] = FitnessCache.key(params, self.trackSeed, self.simSettings)
+				cached = self.cache.get(keys[i])
+				if cached is not None:
+					fitness[i] = cached
+					continue
+			pending.append(i)
+
+		if not pending:
+			evaluation = mergeStats([], self.maxSteps)
+		elif self.evaluator is not None:
+			rows = None if len(pending) == self.populationSize else np.array(pending)
+			fitness[pending], evaluation = self.evaluator.evaluate(self.genetics.current, rows, self.trackType, self.trackSeed, self.maxSteps, self.policies, self.car)
+		else:
+			networks = self.networks()
+			networks = [networks[i] for i in pending]
+			environment = Environment(Track(type=self.trackType, seed=self.trackSeed))
+			observer = partial(self.observer, self.generation, self.trackSeed) if self.observer is not None else None
+			fitness[pending], evaluation = evaluate(environment, makeCars(environment, networks, self.car), self.maxSteps, self.policies, observer)
+
+		if self.cache is not None:
+			for i in pending:
+				self.cache.put(keys[i], float(fitness[i]))
+		elapsed = time.perf_counter() - start
+
+		best = int(np.argmax(fitness))
+		if fitness[best] > self.championFitness:
+			self.champion = FFNN.fromFlat(population[best], self.architecture, outputActivation="linear")
+			self.championFitness = fitness[best]
+
+		p10, p50, p90 = np.percentile(fitness, (10, 50, 90))
+		stats = {
+			"generation": self.generation,
+			"best": float(fitness[best]),
+			"mean": float(fitness.mean()),
+			"p10": float(p10),
+			"median": float(p50),
+			"p90": float(p90),
+			"diversity": float(population.std(axis=0).mean()),
+			"evalTime": elapsed,
+			"ticksPerSecond": evaluation["carTicks"] / elapsed if elapsed > 0 else 0.0,
+			"substepsPerTick": evaluation["substeps"] / evaluation["carTicks"] if evaluation["carTicks"] else 0.0,
+			"evaluated": len(pending),
+			"cacheHits": self.populationSize - len(pending),
+			"cacheHitRate": (self.populationSize - len(pending)) / self.populationSize,
+			**evaluation,
+		}
+		breeding, elites = fitness, None
+		if self.speciation is not None:
+			self.speciation.speciate(population)
+			stats["species"] = self.speciation.stats(fitness)
+			breeding = self.speciation.share(fitness)  # only apportions offspring, elites stay the raw best
+			elites = self.speciation.elites(fitness, self.eliteCount)
+		self.genetics.breed(breeding, self.eliteCount, self.selection, self.crossover, self.mutation, self.mutationRate, self.mutationScale, elites)
+		if self.memory is not None:
+			stats["memory"] = self.memory.sample(self.generation)
+		self.generation += 1
+		return stats
+
+	def run(self, generations: int, callback: callable = None) -> FFNN:
+		"""
+		Runs several generations.
+
+		Parameters
+		----------
+		generations: int
+			Number of generations to run
+		callback: callable, optional
+			Called with the stats of every generation
+
+		Returns
+		-------
+		FFNN: best network seen
+		"""
+		for _ in range(generations):
+			stats = self.runGeneration()
+			if callback is not None:
+				callback(stats)
+		return self.champion
+
+	def close(self) -> None:
+		"""Stops evaluation workers, if any, and memory tracing."""
+		if self.evaluator is not None:
+			self.genetics.detach()  # keeps the population usable once the shared blocks are freed
+			self.evaluator.close()
+			self.evaluator = None
+		if self.memory is not None:
+			self.memory.close()
+			self.memory = None
+
+	def networks(self) -> list:
+		"""
+		FFNN views of the current population, valid until the next generation
+		is bred over them.
+
+		Returns
+		-------
+		list: one FFNN per population row
+		"""
+		return [FFNN.fromFlat(params, self.architecture, outputActivation="linear", copy=False) for params in self.genetics.population]
+
+	def emigrants(self, n: int) -> np.ndarray:
+		"""
+		Parameter vectors of the n best networks of the last generation,
+		which breeding keeps at the front of the population, the best of
+		different species first when speciating.
+
+		Parameters
+		----------
+		n: int
+			Number of networks
+
+		Returns
+		-------
+		np.ndarray: (n, paramCount) parameter vectors
+		"""
+		return self.genetics.population[:n].copy()
+
+	def immigrate(self, params: np.ndarray) -> None:
+		"""
+		Replaces the newest children with networks built from parameter vectors.
+
+		Parameters
+		----------
+		params: np.ndarray
+			(n, paramCount) parameter vectors
+		"""
+		if len(params):
+			self.genetics.population[-len(params):] = params
+
+
+def formatStats(stats: dict) -> str:
+	"""One line summary of generation stats."""
+	island = f"island {stats['island']:>3}  " if "island" in stats else ""
+	return island + (
+		f"gen {stats['generation']:>4}  best {stats['best']:7.3f}  mean {stats['mean']:7.3f}  "
+		f"{stats['evalTime']:6.2f}s  ticks {stats['ticks']:>5} (saved {stats['ticksSaved']}, "
+		f"car ticks saved {stats['carTicksSaved']})  cache {stats['cacheHitRate']:4.0%}"
+	) + (f"  species {stats['species']['count']}" if "species" in stats else "")
@@ -0,0 +1,91 @@
+"""
+Memoized fitness for networks that have already raced on a track.
+
+The simulation is deterministic and cars don't interact, so a network's fitness
+only depends on its parameters, the track seed and the simulation settings.
+Elites carried over unchanged hit the cache instead of being raced again.
+Extinction makes cars depend on each other, so don't combine it with the cache.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from core.settings import FITNESS_CACHE_SIZE
+
+
+class FitnessCache:
+	"""
+	Bounded least recently used map from (parameters, track, settings) to fitness.
+
+	Public Methods
+	--------------
+	key(params, trackSeed, settings) -> bytes:
+		Cache key of a network raced on a track.
+	get(key) -> float:
+		Cached fitness, or None.
+	put(key, fitness) -> None:
+		Stores fitness, evicting the least recently used entry when full.
+	hitRate() -> float:
+		Share of lookups answered from the cache.
+	"""
+	def __init__(self, capacity: int = FITNESS_CACHE_SIZE) -> None:
+		"""
+		Initializes.
+
+		Parameters
+		----------
+		capacity: int, default=FITNESS_CACHE_SIZE
+			Maximum number of stored fitness values
+		"""
+		self.capacity = capacity
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def key(params: np.ndarray, trackSeed: int, settings: str) -> bytes:
+		"""
+		Cache key of a network raced on a track.
+
+		Parameters
+		----------
+		params: np.ndarray
+			Flat parameter vector of the network
+		trackSeed: int
+			Seed the track was generated from
+		settings: str
+			Anything else the result depends on, e.g. track type and tick limit
+
+		Returns
+		-------
+		bytes: digest of the inputs
+		"""
+		digest = hashlib.blake2b(np.ascontiguousarray(params).tobytes(), digest_size=16)
+		digest.update(f"{trackSeed}|{settings}".encode())
+		return digest.digest()
+
+	def get(self, key: bytes) -> float:
+		"""Cached fitness, or None. Counts towards the hit rate."""
+		if key in self.entries:
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return self.entries[key]
+		self.misses += 1
+		return None
+
+	def put(self, key: bytes, fitness: float) -> None:
+		"""Stores fitness, evicting the least recently used entry when full."""
+		self.entries[key] = fitness
+		self.entries.move_to_end(key)
+		while len(self.entries) > self.capacity:
+			self.entries.popitem(last=False)
+
+	def hitRate(self) -> float:
+		"""Share of lookups answered from the cache."""
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups else 0.
+
+	def __len__(self) -> int:
+		return len(self.entries)
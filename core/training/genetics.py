@@ -0,0 +1,205 @@
+"""
+Vectorized genetic operators over a population parameter matrix.
+
+The population lives in one of two preallocated (populationSize, paramCount)
+buffers. Selection returns index arrays, crossover and mutation write the next
+generation straight into the other buffer with whole-matrix operations and RNG
+draws into preallocated scratch arrays, and swap() flips the two buffers.
+"""
+
+import numpy as np
+
+from core.training.neural_net import FFNN
+from core.settings import DTYPE
+
+
+class GeneticOperators:
+	"""
+	Double buffered population matrix with selection, crossover and mutation.
+
+	Attributes
+	----------
+	population: np.ndarray
+		(populationSize, paramCount) current generation, one flat network per row
+	offspring: np.ndarray
+		(populationSize, paramCount) buffer the next generation is written into
+
+	Public Methods
+	--------------
+	breed(fitness, eliteCount, selection, crossover, mutation, elites) -> None:
+		Writes the next generation into offspring and swaps buffers.
+	"""
+	selections = ("tournament", "truncation", "rank")
+	crossovers = (None, "uniform", "arithmetic", "layer")
+	mutations = ("gaussian", "reset")
+
+	def __init__(self, populationSize: int, architecture: tuple, dtype: str = DTYPE, seed: int = None, buffers: np.ndarray = None) -> None:
+		"""
+		Initializes both buffers and fills the population with random networks.
+
+		Parameters
+		----------
+		populationSize: int
+			Number of networks
+		architecture: tuple
+			Layer sizes of every network
+		dtype: str, default=DTYPE
+			Float type of the parameters
+		seed: int, optional
+			Seeds every random draw
+		buffers: np.ndarray, optional
+			(2, populationSize, paramCount) array of dtype to breed in instead of
+			private buffers, e.g. SharedPopulation.params so workers read it in place
+		"""
+		self.populationSize = populationSize
+		self.architecture = tuple(architecture)
+		self.dtype = np.dtype(dtype)
+		self.rng = np.random.default_rng(seed)
+		shape = (populationSize, FFNN.paramCount(architecture))
+
+		if buffers is None:
+			buffers = np.empty((2, *shape), dtype=self.dtype)
+		elif buffers.shape != (2, *shape) or buffers.dtype != self.dtype:
+			raise ValueError(f"buffers must be a {(2, *shape)} {self.dtype} array, got {buffers.shape} {buffers.dtype}")
+		self.buffers = [buffers[0], buffers[1]]
+		self.current = 0
+		self._other = np.empty(shape, dtype=self.dtype)  # second parents
+		self._draws = np.empty(shape, dtype=self.dtype)  # uniform and normal draws
+		self._mask = np.empty(shape, dtype=bool)
+		self._alpha = np.empty((populationSize, 1), dtype=self.dtype)
+
+		# layer of every parameter, for layer-wise crossover
+		sizes = [(i + 1) * j for i, j in zip(architecture[:-1], architecture[1:])]
+		self.layerOf = np.repeat(np.arange(len(sizes)), sizes)
+		self._layerDraws = np.empty((populationSize, len(sizes)), dtype=self.dtype)
+		self._layerChoice = np.empty((populationSize, len(sizes)), dtype=bool)
+
+		self.rng.standard_normal(out=self.population, dtype=self.dtype)
+
+	@property
+	def population(self) -> np.ndarray:
+		return self.buffers[self.current]
+
+	@property
+	def offspring(self) -> np.ndarray:
+		return self.buffers[1 - self.current]
+
+	def swap(self) -> None:
+		"""Makes offspring the current population."""
+		self.current = 1 - self.current
+
+	def detach(self) -> None:
+		"""Moves both buffers into private memory, e.g. before shared blocks they live in are freed."""
+		self.buffers = [buffer.copy() for buffer in self.buffers]
+
+	def breed(self, fitness: np.ndarray, eliteCount: int, selection: str = "truncation", crossover: str = None, mutation: str = "gaussian", mutationRate: float = 0.1, mutationScale: float = 0.5, elites: np.ndarray = None) -> None:
+		"""
+		Writes the next generation into offspring and swaps buffers. The elites
+		are copied unchanged, best first, into the first eliteCount rows.
+
+		Parameters
+		----------
+		fitness: np.ndarray
+			(populationSize,) fitness of the current population
+		eliteCount: int
+			Rows carried over unchanged
+		selection: str, default="truncation"
+			"tournament", "truncation" or "rank"
+		crossover: str, optional
+			None (children are copies of one parent), "uniform", "arithmetic" or "layer"
+		mutation: str, default="gaussian"
+			"gaussian" perturbs parameters, "reset" redraws them
+		mutationRate: float, default=0.1
+			Chance of each parameter being mutated
+		mutationScale: float, default=0.5
+			Standard deviation of gaussian perturbations
+		elites: np.ndarray, optional
+			eliteCount rows to carry over in that order, defaults to the best by fitness,
+			e.g. when fitness is shared and only meant to apportion offspring
+		"""
+		if elites is None:
+			elites = np.argsort(-fitness, kind="stable")[:eliteCount]
+		np.take(self.population, elites, axis=0, out=self.offspring[:eliteCount])
+
+		n = self.populationSize - eliteCount
+		if n > 0:
+			select = getattr(self, selection)
+			rows = slice(eliteCount, self.populationSize)
+			if crossover is None:
+				np.take(self.population, select(fitness, n), axis=0, out=self.offspring[rows])
+			else:
+				getattr(self, crossover)(select(fitness, n), select(fitness, n), rows)
+			getattr(self, mutation)(rows, mutationRate, mutationScale)
+		self.swap()
+
+	# selection, returns indices of n parents
+
+	def tournament(self, fitness: np.ndarray, n: int, size: int = 3) -> np.ndarray:
+		"""Best of size randomly drawn networks, n times."""
+		contestants = self.rng.integers(0, self.populationSize, (n, size))
+		return contestants[np.arange(n), np.argmax(fitness[contestants], axis=1)]
+
+	def truncation(self, fitness: np.ndarray, n: int, ratio: float = 0.5) -> np.ndarray:
+		"""Uniform draws from the best ratio of the population."""
+		cutoff = max(1, int(self.populationSize * ratio))
+		return np.argsort(-fitness, kind="stable")[self.rng.integers(0, cutoff, n)]
+
+	def rank(self, fitness: np.ndarray, n: int) -> np.ndarray:
+		"""Draws weighted by rank, the worst network has weight 1 and the best populationSize."""
+		ranks = np.empty(self.populationSize)
+		ranks[np.argsort(fitness, kind="stable")] = np.arange(1, self.populationSize + 1)
+		return self.rng.choice(self.populationSize, n, p=ranks / ranks.sum())
+
+	# crossover, writes children of parents a and b into offspring rows
+
+	def uniform(self, a: np.ndarray, b: np.ndarray, rows: slice) -> None:
+		"""Every parameter comes from either parent with equal chance."""
+		children, other, mask = self._children(a, b, rows)
+		draws = self._draws[rows]
+		self.rng.random(out=draws, dtype=self.dtype)
+		np.less(draws, 0.5, out=mask)
+		np.copyto(children, other, where=mask)
+
+	def arithmetic(self, a: np.ndarray, b: np.ndarray, rows: slice) -> None:
+		"""Random blend alpha * a + (1 - alpha) * b, one alpha per child."""
+		children, other, _ = self._children(a, b, rows)
+		alpha = self._alpha[rows]
+		self.rng.random(out=alpha, dtype=self.dtype)
+		children -= other
+		children *= alpha
+		children += other
+
+	def layer(self, a: np.ndarray, b: np.ndarray, rows: slice) -> None:
+		"""Every layer's weights and biases come from either parent with equal chance."""
+		children, other, mask = self._children(a, b, rows)
+		draws, choice = self._layerDraws[rows], self._layerChoice[rows]
+		self.rng.random(out=draws, dtype=self.dtype)
+		np.less(draws, 0.5, out=choice)
+		np.take(choice, self.layerOf, axis=1, out=mask)
+		np.copyto(children, other, where=mask)
+
+	def _children(self, a: np.ndarray, b: np.ndarray, rows: slice) -> tuple:
+		"""Copies parents a into offspring rows and parents b into scratch."""
+		children, other = self.offspring[rows], self._other[rows]
+		np.take(self.population, a, axis=0, out=children)
+		np.take(self.population, b, axis=0, out=other)
+		return children, other, self._mask[rows]
+
+	# mutation, in place on offspring rows
+
+	def gaussian(self, rows: slice, rate: float, scale: float) -> None:
+		"""Adds N(0, scale) noise to each parameter with probability rate."""
+		children, draws, mask = self.offspring[rows], self._draws[rows], self._mask[rows]
+		self.rng.random(out=draws, dtype=self.dtype)
+		np.less(draws, rate, out=mask)
+		self.rng.standard_normal(out=draws, dtype=self.dtype)
+		draws *= scale
+		np.add(children, draws, out=children, where=mask)
+
+	def reset(self, rows: slice, rate: float, scale: float = None) -> None:
+		"""Redraws each parameter from N(0, 1), like a new network, with probability rate."""
+		children, draws, mask = self.offspring[rows], self._draws[rows], self._mask[rows]
+		self.rng.random(out=draws, dtype=self.dtype)
+		np.less(draws, rate, out=mask)
+		self.rng.standard_normal(out=draws, dtype=self.dtype)
+		np.copyto(children, draws, where=mask)
@@ -0,0 +1,74 @@
+"""
+Accuracy and cost of simplified track geometry.
+
+For each level of detail, reports the vertices left in the track edges, how
+far the simplified edges stray from the full ones, how much the cars' ray
+lengths change and how long ray casting takes.
+"""
+
+import time
+
+import numpy as np
+
+from core.game_components.track import Track
+from core.game_components.environment import Environment
+from core.settings import RAY_LENGTH
+
+
+def compareLods(tolerances: tuple = (0.1, 0.25, 0.5, 1, 2, 4), seed: int = 0, trackType: str = "perlin", cars: int = 200, numRays: int = 8) -> list:
+	"""
+	Measures every level of detail of a track against the full edges.
+
+	Parameters
+	----------
+	tolerances: tuple, default=(0.1, 0.25, 0.5, 1, 2, 4)
+		Douglas-Peucker tolerances in pixels
+	seed: int, default=0
+		Track seed, also places the probe cars
+	trackType: str, default="perlin"
+		Type of track
+	cars: int, default=200
+		Probe cars at random points on the track with random headings
+	numRays: int, default=8
+		Rays cast by each probe car
+
+	Returns
+	-------
+	list: for each tolerance, vertices kept, largest deviation in pixels,
+	      mean, 99th percentile and largest ray length change in pixels and ray casting time
+	"""
+	full = Environment(Track(type=trackType, seed=seed))
+	rng = np.random.default_rng(seed)
+	inner, outer = full.track.getInnerEdges(), full.track.getOuterEdges()
+	pick = rng.integers(0, len(inner), cars)
+	blend = rng.random((cars, 1))
+	positions = inner[pick] * blend + outer[pick] * (1 - blend)
+	headings = rng.uniform(-np.pi, np.pi, cars)
+
+	def cast(environment: Environment) -> tuple:
+		start = time.perf_counter()
+		for _ in range(20):
+			rays = environment.castRays(positions, headings, numRays)
+		return rays * RAY_LENGTH, (time.perf_counter() - start) / 20
+
+	reference, fullTime = cast(full)
+	rows = [{"tolerance": 0, "vertices": len(inner) + len(outer), "max_deviation": 0.0, "mean_ray_error": 0.0, "p99_ray_error": 0.0, "max_ray_error": 0.0, "ray_ms": fullTime * 1000}]
+	for level in full.track.lod_report(tolerances):
+		environment = Environment(Track(type=trackType, seed=seed), physics_lod=level["tolerance"])
+		rays, elapsed = cast(environment)
+		error = np.abs(rays - reference)
+		rows.append({
+			"tolerance": level["tolerance"],
+			"vertices": level["vertices"],
+			"max_deviation": level["max_deviation"],
+			"mean_ray_error": float(error.mean()),
+			"p99_ray_error": float(np.percentile(error, 99)),
+			"max_ray_error": float(error.max()),
+			"ray_ms": elapsed * 1000,
+		})
+	return rows
+
+
+if __name__ == "__main__":
+	for row in compareLods():
+		print("  ".join(f"{key} {value:.4g}" for key, value in row.items()))
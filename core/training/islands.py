@@ -0,0 +1,160 @@
+"""
+Island model evolution.
+
+Every island is a worker process evolving its own sub-population on its own
+track samples. Every migrationInterval generations the best networks of each
+island travel to a neighbouring island as bare parameter vectors over pipes.
+"""
+
+import os
+import random
+import multiprocessing as mp
+
+import numpy as np
+
+from core.training.neural_net import FFNN
+from core.training.evolution import Evolution
+from core.settings import MIGRATION_INTERVAL, MIGRANTS
+
+
+def _island(index: int, seed: int, migrants: int, kwargs: dict, conn) -> None:
+	"""
+	Worker loop of one island. Messages are (command, payload) tuples:
+
+	("run", generations): evolves, replies with the stats and emigrants
+	("migrate", params): takes in immigrants
+	("stop", None): replies with (champion fitness, champion params) and exits
+	"""
+	np.random.seed(None if seed is None else seed + index)  # forked workers share the parent's state
+	evolution = Evolution(seed=None if seed is None else seed + index, **kwargs)
+	migrants = min(migrants, evolution.eliteCount)
+	while True:
+		command, payload = conn.recv()
+		if command == "run":
+			stats = [dict(evolution.runGeneration(), island=index) for _ in range(payload)]
+			conn.send((stats, evolution.emigrants(migrants)))
+		elif command == "migrate":
+			evolution.immigrate(payload)
+		elif command == "stop":
+			conn.send((evolution.championFitness, evolution.champion.getFlatParams()))
+			break
+	conn.close()
+
+
+class IslandModel:
+	"""
+	Runs Evolution on several worker processes with periodic migration.
+
+	Public Methods
+	--------------
+	run(generations, callback) -> FFNN:
+		Evolves every island and returns the best network found on any of them.
+	"""
+	def __init__(
+			self,
+			islands: int = None,
+			migrationInterval: int = MIGRATION_INTERVAL,
+			migrants: int = MIGRANTS,
+			topology: str = "ring",
+			seed: int = None,
+			**kwargs
+			) -> None:
+		"""
+		Initializes.
+
+		Parameters
+		----------
+		islands: int, optional
+			Number of islands, defaults to and is capped at the number of cores
+		migrationInterval: int, default=MIGRATION_INTERVAL
+			Generations between migrations
+		migrants: int, default=MIGRANTS
+			Networks each island sends per migration, capped at its elite count
+		topology: str, default="ring"
+			"ring" sends migrants to the next island, "random" to a random other island
+		seed: int, optional
+			Seeds island tracks, mutations and the random topology
+		**kwargs
+			Passed on to every island's Evolution, except workers since islands
+			are daemon processes, which can't start evaluation workers of their own
+		"""
+		if topology not in ("ring", "random"):
+			raise ValueError(f"Unknown topology: {topology}")
+		if kwargs.get("workers", 1) > 1:
+			raise ValueError("Islands evaluate in their own process, parallelize with more islands instead of workers")
+		self.islands = min(islands or os.cpu_count(), os.cpu_count())
+		self.migrationInterval = migrationInterval
+		self.topology = topology
+		self.seed = seed
+		self.migrants = migrants
+		self.kwargs = kwargs
+		self.rng = random.Random(seed)
+
+	def run(self, generations: int, callback: callable = None) -> FFNN:
+		"""
+		Evolves every island.
+
+		Parameters
+		----------
+		generations: int
+			Generations run on each island, at least 1
+		callback: callable, optional
+			Called with the stats of every generation of every island, stats carry an "island" key
+
+		Returns
+		-------
+		FFNN: best network found on any island
+		"""
+		if generations < 1:
+			raise ValueError(f"Islands need at least 1 generation to have a champion, got {generations}")
+		pipes, workers = [], []
+		for i in range(self.islands):
+			parent, child = mp.Pipe()
+			worker = mp.Process(target=_island, args=(i, self.seed, self.migrants, self.kwargs, child), daemon=True)
+			worker.start()
+			pipes.append(parent)
+			workers.append(worker)
+
+		try:
+			remaining = generations
+			while remaining > 0:
+				epoch = min(self.migrationInterval, remaining)
+				remaining -= epoch
+				for conn in pipes:
+					conn.send(("run", epoch))
+
+				emigrants = []
+				for conn in pipes:
+					stats, params = conn.recv()
+					emigrants.append(params)
+					for generation in stats:
+						if callback is not None:
+							callback(generation)
+
+				if remaining > 0 and self.islands > 1:
+					for source, destination in enumerate(self.destinations()):
+						pipes[destination].send(("migrate", emigrants[source]))
+
+			for conn in pipes:
+				conn.send(("stop", None))
+			fitness, params = max((conn.recv() for conn in pipes), key=lambda champion: champion[0])
+		finally:
+			for worker in workers:
+				worker.join(timeout=5)
+				if worker.is_alive():
+					worker.terminate()
+
+		architecture = self.kwargs.get("architecture", (8, 6, 2))
+		return FFNN.fromFlat(params, architecture, outputActivation="linear")
+
+	def destinations(self) -> list:
+		"""
+		Returns
+		-------
+		list: island each island sends its migrants to this migration
+		"""
+		n = self.islands
+		if self.topology == "ring":
+			return [(i + 1) % n for i in range(n)]
+		offsets = [self.rng.randint(1, n - 1) for _ in range(n)]  # never send to yourself
+		return [(i + offset) % n for i, offset in enumerate(offsets)]
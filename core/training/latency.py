@@ -0,0 +1,67 @@
+"""
+Per call latency of a single network's forward pass.
+
+Times FFNN.feedForward against the fused pass from FFNN.compile() on one
+input at a time, the way a game drives an opponent car every tick.
+"""
+
+import time
+
+import numpy as np
+
+from core.training.neural_net import FFNN
+
+
+def benchmarkForward(layerSizes: tuple = (8, 6, 2), activation: str = "sigmoid", outputActivation: str = "linear", calls: int = 100000, dtype: str = "float64") -> dict:
+	"""
+	Times both forward passes of a random network.
+
+	Parameters
+	----------
+	layerSizes: tuple, default=(8, 6, 2)
+		Layer architecture
+	activation: str, default="sigmoid"
+		Hidden layer activation
+	outputActivation: str, default="linear"
+		Output layer activation
+	calls: int, default=100000
+		Calls timed per pass
+	dtype: str, default="float64"
+		Float type of the network and input
+
+	Returns
+	-------
+	dict: median per call microseconds of each pass over 5 repeats, speedup,
+	      and the largest output difference between them
+	"""
+	network = FFNN(layerSizes, activation, outputActivation, dtype=dtype)
+	x = np.random.random_sample(layerSizes[0]).astype(dtype)
+	reference = network.feedForward(x)
+	fused = network.compile()
+	fused(x)  # compiles the kernel
+
+	def time_(forward: callable) -> float:
+		runs = []
+		for _ in range(5):
+			start = time.perf_counter()
+			for _ in range(calls):
+				forward(x)
+			runs.append((time.perf_counter() - start) / calls * 1e6)
+		return float(np.median(runs))
+
+	original = time_(lambda a: FFNN.feedForward(network, a))
+	compiled = time_(fused)
+	return {
+		"feedForward (us)": original,
+		"compiled (us)": compiled,
+		"speedup": original / compiled,
+		"max difference": float(np.abs(fused(x) - reference).max()),
+	}
+
+
+if __name__ == "__main__":
+	np.random.seed(0)
+	for layerSizes in ((8, 6, 2), (16, 32, 32, 2)):
+		print(layerSizes)
+		for key, value in benchmarkForward(layerSizes).items():
+			print(f"{key:>20}: {value:.4g}")
@@ -0,0 +1,162 @@
+"""
+Opt-in memory instrumentation for long training runs.
+
+A MemoryProfiler takes a tracemalloc snapshot at every generation boundary and
+reports the allocation sites that grew the most since the previous one, the
+process's resident set size and, when given an Engine, the size of its caches.
+It warns when traced memory grew by more than a threshold over the last few
+generations. tracemalloc slows allocation down, so it is off unless
+MEMORY_PROFILING is set or a profiler is created explicitly. Only the process
+the profiler runs in is traced, so allocations made by evaluation workers
+don't show up and samples say how many workers went untraced.
+"""
+
+import os
+import warnings
+import tracemalloc
+from collections import deque
+
+from core.settings import MEMORY_TOP_SITES, MEMORY_WINDOW, MEMORY_GROWTH_THRESHOLD
+
+
+class MemoryProfiler:
+	"""
+	tracemalloc snapshots compared across generations.
+
+	Public Methods
+	--------------
+	sample(generation) -> dict:
+		Snapshots memory and returns growth since the previous sample.
+	close() -> None:
+		Stops tracing if this profiler started it.
+	"""
+	def __init__(
+			self,
+			top: int = MEMORY_TOP_SITES,
+			window: int = MEMORY_WINDOW,
+			threshold: int = MEMORY_GROWTH_THRESHOLD,
+			engine=None,
+			frames: int = 1,
+			workers: int = 1
+			) -> None:
+		"""
+		Starts tracing and takes the baseline snapshot.
+
+		Parameters
+		----------
+		top: int, default=MEMORY_TOP_SITES
+			Growth sites reported per sample
+		window: int, default=MEMORY_WINDOW
+			Samples growth is measured across for warnings
+		threshold: int, default=MEMORY_GROWTH_THRESHOLD
+			Bytes of traced growth across window samples that trigger a warning
+		engine: Engine, optional
+			Engine whose surface, font and image caches are reported
+		frames: int, default=1
+			Stack frames kept per allocation, more gives longer tracebacks but costs more
+		workers: int, default=1
+			Processes evaluating outside this one, noted in samples as untraced
+		"""
+		self.top = top
+		self.workers = workers
+		self.threshold = threshold
+		self.engine = engine
+		self.started = not tracemalloc.is_tracing()
+		if self.started:
+			tracemalloc.start(frames)
+		self.filters = [
+			tracemalloc.Filter(False, tracemalloc.__file__),
+			tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+			tracemalloc.Filter(False, "<unknown>"),
+		]
+		self.previous = self._snapshot()
+		self.history = deque([self._traced()], maxlen=window + 1)
+
+	def sample(self, generation: int = None) -> dict:
+		"""
+		Snapshots memory and compares it with the previous sample.
+
+		Parameters
+		----------
+		generation: int, optional
+			Generation the sample is taken after, only used in warnings
+
+		Returns
+		-------
+		dict: traced and peak bytes, RSS bytes (None where unavailable),
+		      growth over the window, top growth sites, engine cache sizes
+		      and, with workers, how many processes weren't traced
+		"""
+		snapshot = self._snapshot()
+		growth = snapshot.compare_to(self.previous, "lineno")
+		self.previous = snapshot
+		traced, peak = tracemalloc.get_traced_memory()
+		self.history.append(traced)
+
+		report = {
+			"traced": traced,
+			"peak": peak,
+			"rss": residentSetSize(),
+			"windowGrowth": self.history[-1] - self.history[0],
+			"sites": [
+				{"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "growth": stat.size_diff, "count": stat.count_diff}
+				for stat in growth[:self.top] if stat.size_diff > 0
+			],
+		}
+		if self.engine is not None:
+			report["caches"] = engineCaches(self.engine)
+		if self.workers > 1:
+			report["untracedWorkers"] = self.workers
+
+		if len(self.history) == self.history.maxlen and report["windowGrowth"] > self.threshold:
+			site = report["sites"][0]["site"] if report["sites"] else "unknown"
+			warnings.warn(
+				f"traced memory grew {report['windowGrowth'] / 2**20:.1f} MiB over the last {self.history.maxlen - 1} generations"
+				+ (f" (generation {generation})" if generation is not None else "") + f", largest growth at {site}",
+				ResourceWarning, stacklevel=2
+			)
+		return report
+
+	def close(self) -> None:
+		"""Stops tracing if this profiler started it."""
+		if self.started and tracemalloc.is_tracing():
+			tracemalloc.stop()
+		self.started = False
+
+	def _snapshot(self) -> tracemalloc.Snapshot:
+		return tracemalloc.take_snapshot().filter_traces(self.filters)
+
+	@staticmethod
+	def _traced() -> int:
+		return tracemalloc.get_traced_memory()[0]
+
+
+def residentSetSize() -> int:
+	"""Current resident set size of this process in bytes, None where it can't be read."""
+	try:
+		import psutil
+		return psutil.Process().memory_info().rss
+	except ImportError:
+		pass
+	try:
+		with open("/proc/self/statm") as statm:
+			return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, AttributeError):
+		return None
+
+
+def engineCaches(engine) -> dict:
+	"""Entries, estimated bytes, hits, misses and evictions of the Engine's surface, font and image caches."""
+	return engine.cacheStats()
+
+
+def formatMemory(report: dict) -> str:
+	"""Multi line summary of a memory sample."""
+	mib = lambda n: f"{n / 2**20:8.2f} MiB" if n is not None else "     n/a"
+	lines = [f"traced {mib(report['traced'])}  peak {mib(report['peak'])}  rss {mib(report['rss'])}  window growth {mib(report['windowGrowth'])}"]
+	lines += [f"  +{site['growth'] / 1024:9.1f} KiB  {site['count']:+7d} blocks  {site['site']}" for site in report["sites"]]
+	if report.get("untracedWorkers"):
+		lines.append(f"  main process only, {report['untracedWorkers']} evaluation workers aren't traced")
+	for name, cache in report.get("caches", {}).items():
+		lines.append(f"  {name}: {cache['entries']} entries, {mib(cache['bytes'])}, {cache['hitRate']:.0%} hits, {cache['evictions']} evicted")
+	return "\n".join(lines)
@@ -2,8 +2,12 @@
 Contains basic feed forward neural network class.
 """
 
+from __future__ import annotations
 from numba import jit
 import numpy as np
+import json
+
+from core.settings import DTYPE
 
 
 class FFNN:
@@ -14,8 +18,18 @@ class FFNN:
 	--------------
 	feedForward(a) -> np.ndarray:
 		Feeds inputs through neural net to obtain output.
+	toDict() -> dict:
+		JSON serializable description of the network.
+	save(path: str) -> None:
+		Writes network to a .json file.
+	getFlatParams() -> np.ndarray:
+		Every weight and bias in a single vector.
+	setFlatParams(params) -> None:
+		Loads weights and biases from a single vector.
+	compile() -> FusedForward:
+		Fused single input forward pass, also replacing feedForward.
 	"""
-	def __init__(self, layerSizes: list, activation: str = "sigmoid", outputActivation: str = "softmax", weights: list = None, biases: list = None) -> None:
+	def __init__(self, layerSizes: list, activation: str = "sigmoid", outputActivation: str = "softmax", weights: list = None, biases: list = None, dtype: str = DTYPE) -> None:
 		"""
 		Initializes.
 
@@ -31,6 +45,8 @@ class FFNN:
 			List of arrays of weights for each layer, randomized if not passed in
 		biases: list, optional
 			List of arrays of biases for each layer, randomized if not passed in
+		dtype: str, default=DTYPE
+			Float type of weights and biases
 		"""
 		activations = {
 			"sigmoid": FFNN.sigmoid,
@@ -40,10 +56,15 @@ class FFNN:
 		}
 		self.layerSizes = layerSizes
 		weightShapes = [(i, j) for i, j in zip(layerSizes[1:], layerSizes[:-1])]
+		self.dtype = np.dtype(dtype)
 		self.weights = [np.random.randn(*s) for s in weightShapes] if weights is None else weights
 		self.biases = [np.random.standard_normal(s) for s in layerSizes[1:]] if biases is None else biases
+		self.weights = [np.asarray(w, dtype=self.dtype) for w in self.weights]
+		self.biases = [np.asarray(b, dtype=self.dtype) for b in self.biases]
 		self.activation = activations[activation]
 		self.outputActivation = activations[outputActivation]
+		self.activationName = activation
+		self.outputActivationName = outputActivation
 
 	def feedForward(self, a: np.ndarray) -> np.ndarray:
 		"""
@@ -62,6 +83,21 @@ class FFNN:
 			a = self.activation(a @ w.T + b)
 		return self.outputActivation(a @ self.weights[-1].T + self.biases[-1])
 
+	def compile(self) -> FusedForward:
+		"""
+		Builds a fused, numba compiled forward pass over a snapshot of the
+		current weights and makes feedForward use it for single inputs.
+		Compile again after changing the weights.
+
+		Returns
+		-------
+		FusedForward: the compiled forward pass
+		"""
+		self.__dict__.pop("feedForward", None)
+		fused = FusedForward(self)
+		self.feedForward = fused
+		return fused
+
 	def get_params(self) -> dict:
 		return {
 			"weights": self.weights,
@@ -71,6 +107,144 @@ class FFNN:
 			"output activation": self.outputActivation.__name__,
 		}
 
+	@staticmethod
+	def paramCount(layerSizes: list) -> int:
+		"""Number of weights and biases in a network with the given architecture."""
+		return sum((i + 1) * j for i, j in zip(layerSizes[:-1], layerSizes[1:]))
+
+	def getFlatParams(self) -> np.ndarray:
+		"""
+		Every weight and bias in a single vector, ordered w0, b0, w1, b1...
+
+		Returns
+		-------
+		np.ndarray: (paramCount,) parameter vector
+		"""
+		return np.concatenate([a.ravel() for w, b in zip(self.weights, self.biases) for a in (w, b)])
+
+	def setFlatParams(self, params: np.ndarray) -> None:
+		"""
+		Loads weights and biases from a vector made by getFlatParams.
+
+		Parameters
+		----------
+		params: np.ndarray
+			(paramCount,) parameter vector
+		"""
+		offset = 0
+		for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+			self.weights[i] = np.array(params[offset:offset + w.size], dtype=self.dtype).reshape(w.shape)
+			offset += w.size
+			self.biases[i] = np.array(params[offset:offset + b.size], dtype=self.dtype)
+			offset += b.size
+
+	@classmethod
+	def fromFlat(cls, params: np.ndarray, layerSizes: list, activation: str = "sigmoid", outputActivation: str = "softmax", dtype: str = None, copy: bool = True) -> FFNN:
+		"""
+		Builds a network from a parameter vector made by getFlatParams.
+
+		Parameters
+		----------
+		params: np.ndarray
+			(paramCount,) parameter vector
+		layerSizes: list
+			Layer architecture
+		activation: str, default="sigmoid"
+			String denoting activation function to use
+		outputActivation: str, default="softmax"
+			String denoting output layer activation function to use
+		dtype: str, optional
+			Float type of the network, defaults to the type of params
+		copy: bool, default=True
+			Copies the parameters, otherwise weights and biases are views into
+			params whenever dtype matches, so later writes to params show up in the network
+
+		Returns
+		-------
+		FFNN: network with the given parameters
+		"""
+		params = np.asarray(params)
+		if copy:
+			params = np.array(params, dtype=dtype or params.dtype)
+		weights, biases, i = [], [], 0
+		for inputs, outputs in zip(layerSizes[:-1], layerSizes[1:]):
+			weights.append(params[i:i + inputs * outputs].reshape(outputs, inputs))
+			i += inputs * outputs
+			biases.append(params[i:i + outputs])
+			i += outputs
+		if i != params.size:
+			raise ValueError(f"expected {i} parameters, got {params.size}")
+		return cls(layerSizes, activation=activation, outputActivation=outputActivation, weights=weights, biases=biases, dtype=dtype or params.dtype)
+
+	def toDict(self) -> dict:
+		"""
+		JSON serializable description of the network.
+
+		Returns
+		-------
+		dict: architecture, activation names, weights and biases as nested lists
+		"""
+		return {
+			"architecture": list(self.layerSizes),
+			"activation": self.activationName,
+			"outputActivation": self.outputActivationName,
+			"weights": [w.tolist() for w in self.weights],
+			"biases": [b.tolist() for b in self.biases],
+			"dtype": self.dtype.name,
+		}
+
+	@classmethod
+	def fromDict(cls, data: dict) -> FFNN:
+		"""
+		Rebuilds a network from the output of toDict.
+
+		Parameters
+		----------
+		data: dict
+			Network description
+
+		Returns
+		-------
+		FFNN: network with the described weights and biases
+		"""
+		return cls(
+			data["architecture"],
+			activation=data["activation"],
+			outputActivation=data["outputActivation"],
+			weights=[np.array(w) for w in data["weights"]],
+			biases=[np.array(b) for b in data["biases"]],
+			dtype=data.get("dtype", DTYPE)
+		)
+
+	def save(self, path: str) -> None:
+		"""
+		Writes network to a .json file.
+
+		Parameters
+		----------
+		path: str
+			File to write to
+		"""
+		with open(path, "w") as f:
+			json.dump(self.toDict(), f)
+
+	@classmethod
+	def load(cls, path: str) -> FFNN:
+		"""
+		Reads network from a .json file written by save.
+
+		Parameters
+		----------
+		path: str
+			File to read from
+
+		Returns
+		-------
+		FFNN: loaded network
+		"""
+		with open(path) as f:
+			return cls.fromDict(json.load(f))
+
 	@staticmethod
 	@jit(nopython=True)
 	def sigmoid(x: float) -> float:
@@ -94,4 +268,89 @@ class FFNN:
 	def linear(x: float) -> float:
 		"""Linear activation"""
 		return x
-	
+
+
+class FusedForward:
+	"""
+	Single input forward pass of one network as a single numba call, with the
+	weights packed in one vector and preallocated layer buffers, so a call
+	makes no temporary arrays and dispatches once instead of once per layer.
+
+	The returned array is reused by the next call, copy it to keep it.
+	"""
+	activationCodes = {"sigmoid": 0, "reLu": 1, "linear": 2, "softmax": 3}
+
+	def __init__(self, network: FFNN) -> None:
+		"""
+		Initializes.
+
+		Parameters
+		----------
+		network: FFNN
+			Network to compile, its weights are copied
+		"""
+		self.network = network
+		self.params = network.getFlatParams()
+		self.layerSizes = np.array(network.layerSizes, dtype=np.int64)
+		self.hidden = self.activationCodes[network.activationName]
+		self.output = self.activationCodes[network.outputActivationName]
+		width = int(self.layerSizes.max())
+		self.a = np.empty(width, dtype=network.dtype)
+		self.b = np.empty(width, dtype=network.dtype)
+		self.out = np.empty(self.layerSizes[-1], dtype=network.dtype)
+
+	def __call__(self, a: np.ndarray) -> np.ndarray:
+		"""
+		Feeds one input through the network, batches fall back to FFNN.feedForward.
+
+		Parameters
+		----------
+		a: np.ndarray
+			(layerSizes[0],) input
+
+		Returns
+		-------
+		np.ndarray: output, overwritten by the next call
+		"""
+		a = np.asarray(a)
+		if a.ndim != 1:
+			return FFNN.feedForward(self.network, a)
+		_fusedForward(a, self.params, self.layerSizes, self.hidden, self.output, self.a, self.b, self.out)
+		return self.out
+
+
+@jit(nopython=True)
+def _fusedForward(x, params, layerSizes, hidden, output, a, b, out):
+	"""Forward pass over parameters packed by getFlatParams, ping-ponging between a and b."""
+	layers = layerSizes.shape[0] - 1
+	for i in range(layerSizes[0]):
+		a[i] = x[i]
+	src, dst = a, b
+	offset = 0
+	for layer in range(layers):
+		inputs, outputs = layerSizes[layer], layerSizes[layer + 1]
+		last = layer == layers - 1
+		if last:
+			dst = out
+		activation = output if last else hidden
+		bias = offset + inputs * outputs
+		for j in range(outputs):
+			z = params[bias + j]
+			row = offset + j * inputs
+			for i in range(inputs):
+				z += params[row + i] * src[i]
+			if activation == 0:
+				z = 1 / (1 + np.exp(-z))
+			elif activation == 1:
+				z = max(z, 0)
+			dst[j] = z
+		if activation == 3:
+			total = 0.
+			for j in range(outputs):
+				dst[j] = np.exp(dst[j])
+				total += dst[j]
+			for j in range(outputs):
+				dst[j] /= total
+		offset = bias + outputs
+		src, dst = dst, src
+
@@ -0,0 +1,78 @@
+"""
+Validation of the float32 numeric path against float64.
+
+Races the same networks on the same seeded track once with every array in
+float64 and once in float32, stepping both fleets in lockstep, and reports how
+far the float32 trajectories drift.
+"""
+
+import numpy as np
+
+from core.game_components.track import Track
+from core.game_components.environment import Environment
+from core.game_components.vec_env import VecRacingEnv
+from core.training.neural_net import FFNN
+from core.settings import TRACK_TYPE, MAX_STEPS
+
+
+def compareDtypes(networks: list, seed: int = 0, maxSteps: int = MAX_STEPS, trackType: str = TRACK_TYPE) -> dict:
+	"""
+	Races networks in float64 and float32 and measures the drift between the two.
+
+	Parameters
+	----------
+	networks: list
+		FFNNs to race, converted to each dtype
+	seed: int, default=0
+		Track seed
+	maxSteps: int, default=MAX_STEPS
+		Tick limit
+	trackType: str, default=TRACK_TYPE
+		Type of track
+
+	Returns
+	-------
+	dict: largest and mean position drift in pixels, progress drift in radians,
+	      ticks until the first car's fate differs, and how many cars ended differently
+	"""
+	runs = {}
+	for dtype in ("float64", "float32"):
+		environment = Environment(Track(type=trackType, seed=seed, dtype=dtype))
+		cast = [FFNN.fromFlat(network.getFlatParams(), network.layerSizes, network.activationName, network.outputActivationName, dtype=dtype) for network in networks]
+		runs[dtype] = (VecRacingEnv(environment, num_rays=networks[0].layerSizes[0], max_steps=maxSteps), cast)
+
+	observations = {dtype: env.reset(len(networks)) for dtype, (env, _) in runs.items()}
+	positionDrift, divergedAt = [], None
+	for tick in range(maxSteps):
+		infos = {}
+		for dtype, (env, cast) in runs.items():
+			actions = np.array([network.feedForward(obs) for network, obs in zip(cast, observations[dtype])])
+			observations[dtype], _, done, infos[dtype] = env.step(actions)
+
+		both = runs["float64"][0].state.alive & runs["float32"][0].state.alive
+		drift = np.hypot(*(runs["float64"][0].positions[both] - runs["float32"][0].positions[both]).T)
+		positionDrift.append(drift)
+		if divergedAt is None and (infos["float64"]["alive"] != infos["float32"]["alive"]).any():
+			divergedAt = tick
+		if runs["float64"][0].done.all() and runs["float32"][0].done.all():
+			break
+
+	drift = np.concatenate(positionDrift) if positionDrift else np.zeros(0)
+	progress = np.abs(infos["float64"]["progress"] - infos["float32"]["progress"])
+	return {
+		"cars": len(networks),
+		"ticks": tick + 1,
+		"maxPositionDrift": float(drift.max()) if drift.size else 0.,
+		"meanPositionDrift": float(drift.mean()) if drift.size else 0.,
+		"maxProgressDrift": float(progress.max()),
+		"meanProgressDrift": float(progress.mean()),
+		"firstDivergence": divergedAt,
+		"carsEndedDifferently": int((infos["float64"]["alive"] != infos["float32"]["alive"]).sum()),
+	}
+
+
+if __name__ == "__main__":
+	np.random.seed(0)
+	report = compareDtypes([FFNN((8, 6, 2), outputActivation="linear", dtype="float64") for _ in range(100)])
+	for key, value in report.items():
+		print(f"{key:>22}: {value}")
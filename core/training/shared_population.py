@@ -0,0 +1,207 @@
+"""
+Population buffers living in shared memory.
+
+Parameters, fitness and the final fleet state of a population are kept in
+multiprocessing.shared_memory blocks that pool workers attach to once. Both
+generation buffers of GeneticOperators are shared blocks, so breeding writes
+straight into the memory workers read. A generation is dispatched by sending
+each worker the current buffer, a slice of the population and a track seed,
+and workers write fitness and fleet state back in place, so the cost of a
+dispatch depends on the number of workers, not the population size.
+"""
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core.game_components.track import Track
+from core.game_components.environment import Environment
+from core.training.neural_net import FFNN
+from core.settings import DTYPE
+from core.training.simulation import evaluate, makeCars
+
+FLEET_FIELDS = ("x", "y", "vx", "vy", "heading", "progress", "steps", "alive")
+
+
+class SharedPopulation:
+	"""
+	Parameter matrix, fitness vector and fleet state of a population in shared memory.
+
+	Attributes
+	----------
+	params: np.ndarray
+		(2, size, paramCount) parameter vector of every network in both generation buffers
+	fitness: np.ndarray
+		(size,) fitness of every network
+	fleet: np.ndarray
+		(size, len(FLEET_FIELDS)) final state of every car
+	"""
+	def __init__(self, size: int, architecture: tuple, names: dict = None, dtype: str = DTYPE) -> None:
+		"""
+		Creates new blocks, or attaches to existing ones when names is given.
+
+		Parameters
+		----------
+		size: int
+			Number of networks
+		architecture: tuple
+			Layer sizes of every network
+		names: dict, optional
+			Block names of an existing SharedPopulation, see spec
+		dtype: str, default=DTYPE
+			Float type of the parameters
+		"""
+		self.size = size
+		self.architecture = tuple(architecture)
+		self.dtype = np.dtype(dtype)
+		self.owner = names is None
+		layouts = {
+			"params": ((2, size, FFNN.paramCount(architecture)), self.dtype),
+			"fitness": ((size,), np.dtype(np.float64)),
+			"fleet": ((size, len(FLEET_FIELDS)), np.dtype(np.float64)),
+		}
+		self.blocks = {}
+		for key, (shape, dtype) in layouts.items():
+			if self.owner:
+				block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+			else:
+				block = shared_memory.SharedMemory(name=names[key])
+			self.blocks[key] = block
+			setattr(self, key, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+	def spec(self) -> dict:
+		"""Block names and shapes, all a worker needs to attach."""
+		return {
+			"size": self.size,
+			"architecture": self.architecture,
+			"dtype": self.dtype.str,
+			"names": {key: block.name for key, block in self.blocks.items()},
+		}
+
+	@classmethod
+	def attach(cls, spec: dict) -> "SharedPopulation":
+		"""Attaches to the blocks described by spec."""
+		return cls(spec["size"], spec["architecture"], names=spec["names"], dtype=spec["dtype"])
+
+	def network(self, i: int, buffer: int = 0) -> FFNN:
+		"""Builds the i-th network from its parameter vector in a generation buffer."""
+		return FFNN.fromFlat(self.params[buffer, i], self.architecture, outputActivation="linear")
+
+	def close(self) -> None:
+		"""Detaches, and frees the blocks if this process created them."""
+		for key in self.blocks:
+			setattr(self, key, None)  # views must go before the buffers can be released
+		for block in self.blocks.values():
+			block.close()
+			if self.owner:
+				block.unlink()
+		self.blocks = {}
+
+
+_population = None  # SharedPopulation attached by each pool worker
+
+
+def _attach(spec: dict) -> None:
+	"""Pool initializer."""
+	global _population
+	_population = SharedPopulation.attach(spec)
+
+
+def _evaluateSlice(task: tuple) -> dict:
+	"""
+	Evaluates the rows (a slice or index array) of a generation buffer on the
+	track generated from seed, writing fitness and fleet state straight into shared memory.
+	"""
+	buffer, rows, trackType, seed, maxSteps, policies, car = task
+	environment = Environment(Track(type=trackType, seed=seed))
+	indices = np.arange(_population.size)[rows]
+	cars = makeCars(environment, [_population.network(i, buffer) for i in indices], car)
+	fitness, stats = evaluate(environment, cars, maxSteps, policies)
+
+	_population.fitness[rows] = fitness
+	for i, car in zip(indices, cars):
+		_population.fleet[i] = (*car.p, *car.v, car.heading, car.progress, car.steps, car.alive)
+	return stats
+
+
+class SharedEvaluator:
+	"""
+	Process pool evaluating a SharedPopulation in slices.
+
+	Public Methods
+	--------------
+	evaluate(buffer, rows, trackType, seed, maxSteps, policies, car) -> tuple:
+		Evaluates networks of a shared generation buffer across the pool, nothing is copied.
+	close() -> None:
+		Stops the pool and frees shared memory.
+	"""
+	def __init__(self, workers: int, size: int, architecture: tuple, dtype: str = DTYPE) -> None:
+		self.population = SharedPopulation(size, architecture, dtype=dtype)
+		self.workers = workers
+		self.pool = mp.Pool(workers, initializer=_attach, initargs=(self.population.spec(),))
+
+	def evaluate(self, buffer: int, rows: np.ndarray, trackType: str, seed: int, maxSteps: int, policies: list = None, car: dict = None) -> tuple:
+		"""
+		Evaluates networks of a generation buffer on the track generated from seed.
+		GeneticOperators breeds straight into population.params, so the networks
+		are already in shared memory.
+
+		Parameters
+		----------
+		buffer: int
+			Generation buffer of population.params holding the networks
+		rows: np.ndarray
+			Rows to evaluate, None evaluates every network
+		trackType: str
+			Type of track
+		seed: int
+			Track seed, every worker generates the same track from it
+		maxSteps: int
+			Tick limit
+		policies: list, optional
+			Early termination policies
+		car: dict, optional
+			Racecar settings, see simulation.makeCars
+
+		Returns
+		-------
+		np.ndarray: fitness of each network
+		dict: evaluation stats merged across workers
+		"""
+		if rows is None:  # contiguous slices keep the dispatch independent of the population size
+			chunks = [slice(chunk[0], chunk[-1] + 1) for chunk in np.array_split(np.arange(self.population.size), self.workers) if chunk.size]
+			rows = slice(None)
+		else:
+			chunks = [chunk for chunk in np.array_split(np.asarray(rows), self.workers) if chunk.size]
+		tasks = [(buffer, chunk, trackType, seed, maxSteps, policies, car) for chunk in chunks]
+		results = self.pool.map(_evaluateSlice, tasks)
+		return self.population.fitness[rows].copy(), mergeStats(results, maxSteps)
+
+	def close(self) -> None:
+		"""Stops the pool and frees shared memory."""
+		self.pool.close()
+		self.pool.join()
+		self.population.close()
+
+
+def mergeStats(results: list, maxSteps: int) -> dict:
+	"""Combines the evaluation stats of several slices raced on the same track."""
+	ticks = max((stats["ticks"] for stats in results), default=0)
+	terminations = {}
+	for stats in results:
+		for cause, count in stats["terminations"].items():
+			terminations[cause] = terminations.get(cause, 0) + count
+	alive = [0] * ticks
+	for stats in results:
+		for tick, count in enumerate(stats["alive"]):
+			alive[tick] += count
+	return {
+		"ticks": ticks,
+		"ticksSaved": maxSteps - ticks,
+		"carTicks": sum(stats["carTicks"] for stats in results),
+		"carTicksSaved": sum(stats["carTicksSaved"] for stats in results),
+		"substeps": sum(stats["substeps"] for stats in results),
+		"terminations": terminations,
+		"alive": alive,
+	}
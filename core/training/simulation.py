@@ -0,0 +1,211 @@
+"""
+Headless race simulation used to score networks.
+"""
+
+import numpy as np
+
+from core.game_components.environment import Environment
+from core.game_components.racecar import Racecar
+from core.game_components.integrator import AdaptiveIntegrator
+from core.training.termination import FleetState, applyPolicies
+from core.settings import MAX_STEPS, SWEPT_COLLISION, ADAPTIVE_SUBSTEPS
+
+
+def makeCars(environment: Environment, networks: list, car: dict = None) -> list:
+	"""
+	Places a car driven by each network on the environment's starting line.
+
+	Parameters
+	----------
+	environment: Environment
+		Environment the cars will race in
+	networks: list
+		FFNN for each car
+	car: dict, optional
+		Racecar settings such as max_turning_rate, max_acceleration and max_speed
+
+	Returns
+	-------
+	list: Racecar for each network
+	"""
+	return [
+		Racecar(
+			id=str(i),
+			initial_pos=np.array(environment.starting_point),
+			initial_heading=environment.starting_heading,
+			network=network,
+			dtype=environment.dtype,
+			**(car or {})
+		)
+		for i, network in enumerate(networks)
+	]
+
+
+def evaluate(environment: Environment, cars: list, maxSteps: int = MAX_STEPS, policies: list = None, observer: callable = None, swept: bool = SWEPT_COLLISION, integrator: AdaptiveIntegrator = None) -> tuple:
+	"""
+	Races cars until every car has crashed or been terminated, or maxSteps ticks have passed.
+
+	Parameters
+	----------
+	environment: Environment
+		Environment to race in
+	cars: list
+		Racecars to race, reset before the race starts
+	maxSteps: int, default=MAX_STEPS
+		Tick limit
+	policies: list, optional
+		Early termination policies, see core.training.termination
+	observer: callable, optional
+		Called with the FleetState and cars after every tick
+	swept: bool, default=SWEPT_COLLISION
+		Also crashes cars whose motion crosses a track edge, stopping them at the
+		point of impact, so fast cars can't skip through walls
+	integrator: AdaptiveIntegrator, optional
+		Moves the cars in substeps instead of Racecar.step, one is made for
+		the environment when ADAPTIVE_SUBSTEPS is set
+
+	Returns
+	-------
+	np.ndarray: radians of track covered by each car, used as fitness
+	dict: ticks simulated and saved, physics substeps, cars killed by each cause and cars alive after every tick
+	"""
+	policies = policies if policies is not None else []
+	if integrator is None and ADAPTIVE_SUBSTEPS:
+		integrator = AdaptiveIntegrator(environment)
+	substeps = 0
+	state = FleetState(len(cars))
+	terminations = {"crash": 0}
+	aliveCurve = []
+	for car in cars:
+		car.reset()
+
+	for _ in range(maxSteps):
+		alive = np.flatnonzero(state.alive)
+		if alive.size == 0:
+			break
+
+		positions = np.array([cars[i].p for i in alive])
+		headings = np.array([cars[i].heading for i in alive])
+		rays = environment.castRays(positions, headings, cars[alive[0]].network.layerSizes[0])
+
+		if integrator is None:
+			for i, rayLengths in zip(alive, rays):
+				cars[i].autostep(rayLengths)
+			substeps += alive.size
+		else:
+			substeps += _integrate(integrator, [cars[i] for i in alive], positions, headings, rays)
+
+		moved = np.array([cars[i].p for i in alive])
+		crashed = np.zeros(len(cars), dtype=bool)
+		crashed[alive] = ~environment.trackContainsMany(moved)
+		if swept:
+			impact = environment.timeOfImpact(positions, moved)
+			for j in np.flatnonzero(impact <= 1):
+				moved[j] = positions[j] + impact[j] * (moved[j] - positions[j])
+				cars[alive[j]].p = moved[j].copy()
+				crashed[alive[j]] = True
+
+		delta = np.zeros(len(cars))
+		speed = np.zeros(len(cars))
+		delta[alive] = environment.progress(positions, moved)
+		speed[alive] = [np.hypot(*cars[i].v) for i in alive]
+		state.update(delta, speed)
+
+		terminations["crash"] += int(crashed.sum())
+		state.alive &= ~crashed
+		kill = crashed | applyPolicies(policies, state, terminations)
+		for i in np.flatnonzero(kill):
+			cars[i].kill()
+		state.alive &= ~kill
+		aliveCurve.append(int(state.alive.sum()))
+
+		if observer is not None:
+			observer(state, cars)
+
+	for car, progress in zip(cars, state.progress):
+		car.progress = progress
+
+	carTicks = sum(car.steps for car in cars)
+	stats = {
+		"ticks": state.tick,
+		"ticksSaved": maxSteps - state.tick,
+		"carTicks": carTicks,
+		"carTicksSaved": maxSteps * len(cars) - carTicks,
+		"substeps": substeps,
+		"terminations": terminations,
+		"alive": aliveCurve,
+	}
+	return state.progress.copy(), stats
+
+
+def _integrate(integrator: AdaptiveIntegrator, cars: list, positions: np.ndarray, headings: np.ndarray, rays: np.ndarray) -> int:
+	"""Steps living cars together through the integrator and returns the substeps taken."""
+	controls = np.array([car.get_optimal_controls(rayLengths) for car, rayLengths in zip(cars, rays)])
+	steering = np.clip(controls[:, 0], [-car.max_turning_rate for car in cars], [car.max_turning_rate for car in cars])
+	throttle = np.clip(controls[:, 1], [-car.max_acceleration for car in cars], [car.max_acceleration for car in cars])
+	positions, headings = positions.copy(), headings.copy()
+	velocities = np.array([car.v for car in cars])
+	counts = integrator.step(positions, velocities, headings, steering, throttle, np.array([car.max_speed for car in cars]))
+	for car, p, v, heading, a in zip(cars, positions, velocities, headings, throttle):
+		car.p, car.v, car.heading = p, v, heading
+		car.a = a * np.array([np.cos(heading), np.sin(heading)], dtype=car.dtype)
+		car.steps += 1
+	return int(counts.sum())
+
+
+def record(environment: Environment, networks: list, maxSteps: int = MAX_STEPS, policies: list = None) -> dict:
+	"""
+	Races networks and records where every car was after every tick, for replaying races.
+
+	Parameters
+	----------
+	environment: Environment
+		Environment to race in
+	networks: list
+		FFNN for each car
+	maxSteps: int, default=MAX_STEPS
+		Tick limit
+	policies: list, optional
+		Early termination policies
+
+	Returns
+	-------
+	dict: (T + 1, N, 2) positions and (T + 1, N) alive masks, starting with the grid,
+	      the headings in the same layout and each car's fitness
+	"""
+	cars = makeCars(environment, networks)
+	frames = {"positions": [], "headings": [], "alive": []}
+
+	def observer(state, cars: list) -> None:
+		frames["positions"].append([car.p.copy() for car in cars])
+		frames["headings"].append([car.heading for car in cars])
+		frames["alive"].append(state.alive.copy())
+
+	for car in cars:
+		car.reset()
+	start = {"positions": [car.p.copy() for car in cars], "headings": [car.heading for car in cars], "alive": np.ones(len(cars), dtype=bool)}
+	fitness, _ = evaluate(environment, cars, maxSteps, policies, observer)
+	return {
+		**{key: np.array([start[key]] + frames[key]) for key in frames},
+		"fitness": fitness,
+	}
+
+
+def race(environment: Environment, networks: list, maxSteps: int = MAX_STEPS) -> np.ndarray:
+	"""
+	Convenience wrapper building cars for networks and evaluating them.
+
+	Parameters
+	----------
+	environment: Environment
+		Environment to race in
+	networks: list
+		FFNN for each car
+	maxSteps: int, default=MAX_STEPS
+		Tick limit
+
+	Returns
+	-------
+	np.ndarray: fitness of each network
+	"""
+	return evaluate(environment, makeCars(environment, networks), maxSteps)[0]
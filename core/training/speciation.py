@@ -0,0 +1,246 @@
+"""
+NEAT style speciation for fixed topology networks.
+
+Every network shares one topology, so there are no disjoint or excess genes and
+the compatibility distance reduces to NEAT's weight difference term, taken here
+as the root mean square difference of two parameter rows. Each generation every
+network is compared against one representative per species, an (N, species)
+distance matrix computed in blocks of rows, rather than against every other
+network. Networks no species accepts found new ones, up to a maximum after which
+they join the nearest species, so a random initial population, where every pair
+is far apart, costs O(N * maxSpecies) rather than O(N^2). Fitness is shared by
+dividing it by the size of a network's species so that no single strategy can
+take over the population.
+"""
+
+import numpy as np
+
+from core.settings import COMPATIBILITY_THRESHOLD, TARGET_SPECIES, MAX_SPECIES, THRESHOLD_STEP, DISTANCE_BLOCK_SIZE
+
+
+def distances(a: np.ndarray, b: np.ndarray, blockSize: int = DISTANCE_BLOCK_SIZE) -> np.ndarray:
+	"""
+	Pairwise compatibility distances, the root mean square difference of parameters,
+	from ||x||^2 + ||y||^2 - 2 x.y so each block is a single matrix product.
+
+	Parameters
+	----------
+	a: np.ndarray
+		(n, paramCount) parameter rows
+	b: np.ndarray
+		(m, paramCount) parameter rows
+	blockSize: int, default=DISTANCE_BLOCK_SIZE
+		Rows of a compared at a time, bounds scratch memory to blockSize * m
+
+	Returns
+	-------
+	np.ndarray: (n, m) distances
+	"""
+	out = np.empty((len(a), len(b)))
+	bNorms = np.einsum("ij,ij->i", b, b)
+	for start in range(0, len(a), blockSize):
+		block = a[start:start + blockSize]
+		d = out[start:start + len(block)]
+		d[...] = block @ b.T
+		d *= -2
+		d += np.einsum("ij,ij->i", block, block)[:, None]
+		d += bNorms
+		np.maximum(d, 0, out=d)  # rounding can push identical rows slightly negative
+		d /= a.shape[1]
+		np.sqrt(d, out=d)
+	return out
+
+
+class Speciation:
+	"""
+	Assigns networks to species against last generation's representatives and
+	shares fitness within species.
+
+	Attributes
+	----------
+	threshold: float
+		Compatibility distance within which a network joins a species
+	ids: list
+		Stable id of every current species
+	labels: np.ndarray
+		(populationSize,) index into ids of every network's species
+
+	Public Methods
+	--------------
+	speciate(population) -> np.ndarray:
+		Assigns every network to a species and returns the labels.
+	share(fitness) -> np.ndarray:
+		Fitness divided by the size of each network's species.
+	elites(fitness, n) -> np.ndarray:
+		Rows of the best network of every species, then the next best overall.
+	stats(fitness) -> dict:
+		Species count, threshold, turnover and per species size and best fitness.
+	"""
+	def __init__(
+			self,
+			threshold: float = COMPATIBILITY_THRESHOLD,
+			targetSpecies: int = TARGET_SPECIES,
+			maxSpecies: int = MAX_SPECIES,
+			thresholdStep: float = THRESHOLD_STEP,
+			blockSize: int = DISTANCE_BLOCK_SIZE,
+			seed: int = None
+			) -> None:
+		"""
+		Initializes without species, the first call to speciate founds them.
+
+		Parameters
+		----------
+		threshold: float, default=COMPATIBILITY_THRESHOLD
+			Initial compatibility threshold
+		targetSpecies: int, default=TARGET_SPECIES
+			Species count the threshold is nudged towards, None keeps it fixed
+		maxSpecies: int, default=MAX_SPECIES
+			Species count past which no more are founded
+		thresholdStep: float, default=THRESHOLD_STEP
+			Relative change of the threshold per generation
+		blockSize: int, default=DISTANCE_BLOCK_SIZE
+			Rows per block of the distance matrix
+		seed: int, optional
+			Seeds the choice of representatives
+		"""
+		self.threshold = threshold
+		self.targetSpecies = targetSpecies
+		self.maxSpecies = maxSpecies
+		self.thresholdStep = thresholdStep
+		self.blockSize = blockSize
+		self.rng = np.random.default_rng(seed)
+		self.representatives = None
+		self.ids = []
+		self.nextId = 0
+		self.labels = None
+		self.created = 0
+		self.extinct = 0
+
+	def speciate(self, population: np.ndarray) -> np.ndarray:
+		"""
+		Assigns every network to the nearest species within the threshold, founds
+		species for the rest until there are maxSpecies, after which the rest join
+		their nearest species, drops species left empty, picks a random member of
+		each as its next representative and adjusts the threshold.
+
+		Parameters
+		----------
+		population: np.ndarray
+			(populationSize, paramCount) parameter rows
+
+		Returns
+		-------
+		np.ndarray: (populationSize,) index into ids of every network's species
+		"""
+		labels = np.full(len(population), -1, dtype=np.intp)
+		count = 0
+		if self.representatives is not None:
+			d = distances(population, self.representatives, self.blockSize)
+			nearest = np.argmin(d, axis=1)
+			joined = d[np.arange(len(population)), nearest] < self.threshold
+			labels[joined] = nearest[joined]
+			count = len(self.representatives)
+
+		# founders are compared against the remaining networks only
+		unassigned = np.flatnonzero(labels < 0)
+		founders = []
+		while unassigned.size and count + len(founders) < self.maxSpecies:
+			d = distances(population[unassigned], population[unassigned[:1]], self.blockSize)[:, 0]
+			d[0] = 0
+			members = d < self.threshold
+			labels[unassigned[members]] = count + len(founders)
+			founders.append(unassigned[0])
+			unassigned = unassigned[~members]
+		founded = len(founders)
+		if unassigned.size:
+			representatives = population[founders]
+			if self.representatives is not None:
+				representatives = np.concatenate((self.representatives, representatives))
+			labels[unassigned] = np.argmin(distances(population[unassigned], representatives, self.blockSize), axis=1)
+
+		ids = self.ids + list(range(self.nextId, self.nextId + founded))
+		self.nextId += founded
+		used, labels = np.unique(labels, return_inverse=True)
+		self.ids = [ids[i] for i in used]
+		self.created = founded
+		self.extinct = count - int(np.count_nonzero(used < count))
+		self.labels = labels
+
+		# a random member of every species represents it next generation
+		order = self.rng.permutation(len(population))
+		_, first = np.unique(labels[order], return_index=True)
+		self.representatives = population[order[first]].copy()
+
+		# a higher threshold only founds fewer species, it can't merge existing ones
+		if self.targetSpecies is not None:
+			if len(self.ids) < self.targetSpecies:
+				self.threshold *= 1 - self.thresholdStep
+			elif len(self.ids) > self.targetSpecies and founded:
+				self.threshold *= 1 + self.thresholdStep
+		return labels
+
+	def share(self, fitness: np.ndarray) -> np.ndarray:
+		"""
+		Fitness divided by the size of each network's species, shifted so the
+		worst network has 0 first since fitness can be negative.
+
+		Parameters
+		----------
+		fitness: np.ndarray
+			(populationSize,) fitness of the speciated population
+
+		Returns
+		-------
+		np.ndarray: (populationSize,) shared fitness
+		"""
+		sizes = np.bincount(self.labels)
+		return (fitness - fitness.min()) / sizes[self.labels]
+
+	def elites(self, fitness: np.ndarray, n: int) -> np.ndarray:
+		"""
+		Rows to carry over unchanged, ranked by raw fitness: the best network of
+		every species first, then the best of the rest, so the overall best is
+		always row 0 however large its species.
+
+		Parameters
+		----------
+		fitness: np.ndarray
+			(populationSize,) raw fitness of the speciated population
+		n: int
+			Number of rows
+
+		Returns
+		-------
+		np.ndarray: (n,) row indices, best first
+		"""
+		order = np.argsort(-fitness, kind="stable")
+		_, first = np.unique(self.labels[order], return_index=True)
+		champions = np.zeros(len(fitness), dtype=bool)
+		champions[order[first]] = True
+		return np.concatenate((order[champions[order]], order[~champions[order]]))[:n]
+
+	def stats(self, fitness: np.ndarray) -> dict:
+		"""
+		Species count, threshold used for the next generation, species founded and
+		gone extinct this generation, and per species id, size and best fitness.
+
+		Parameters
+		----------
+		fitness: np.ndarray
+			(populationSize,) fitness of the speciated population
+
+		Returns
+		-------
+		dict: species stats
+		"""
+		best = np.full(len(self.ids), -np.inf)
+		np.maximum.at(best, self.labels, fitness)
+		return {
+			"count": len(self.ids),
+			"threshold": self.threshold,
+			"created": self.created,
+			"extinct": self.extinct,
+			"ids": list(self.ids),
+			"sizes": np.bincount(self.labels).tolist(),
+			"best": best.tolist(),
+		}
@@ -0,0 +1,106 @@
+"""
+Live snapshots of an evolution running in a worker process.
+
+The simulation publishes decimated snapshots of its best cars into a small
+queue without ever waiting on it. When the queue is full the snapshot is
+dropped, so a slow renderer can't slow evolution down.
+"""
+
+import time
+import queue
+import traceback
+
+import numpy as np
+
+from core.training.evolution import Evolution, formatStats
+from core.settings import SPECTATOR_TOP_K, SPECTATOR_FPS
+
+
+class SnapshotPublisher:
+	"""
+	Observer for evaluate() publishing the top k cars and the champion at a capped rate.
+
+	The champion is the previous generation's best network, which breeding
+	keeps at the front of the population.
+	"""
+	def __init__(self, snapshots, topK: int = SPECTATOR_TOP_K, fps: float = SPECTATOR_FPS) -> None:
+		"""
+		Initializes.
+
+		Parameters
+		----------
+		snapshots: multiprocessing.Queue
+			Bounded queue read by the renderer
+		topK: int, default=SPECTATOR_TOP_K
+			Number of leading cars in each snapshot
+		fps: float, default=SPECTATOR_FPS
+			Maximum snapshots published per second
+		"""
+		self.snapshots = snapshots
+		self.topK = topK
+		self.interval = 1 / fps
+		self.lastPublished = 0.
+		self.published = 0
+		self.dropped = 0
+
+	def __call__(self, generation: int, trackSeed: int, state, cars: list) -> None:
+		now = time.perf_counter()
+		if now - self.lastPublished < self.interval:
+			return
+		self.lastPublished = now
+
+		leaders = np.argsort(-np.where(state.alive, state.progress, -np.inf), kind="stable")[:self.topK]
+		shown = np.concatenate([[0], leaders[leaders != 0]])
+		snapshot = {
+			"generation": generation,
+			"trackSeed": trackSeed,
+			"tick": state.tick,
+			"positions": np.array([cars[i].p for i in shown]),
+			"headings": np.array([cars[i].heading for i in shown]),
+			"alive": state.alive[shown].copy(),
+			"progress": state.progress[shown].copy(),
+		}
+		try:
+			self.snapshots.put_nowait(snapshot)
+			self.published += 1
+		except queue.Full:
+			self.dropped += 1
+
+
+def latest(snapshots) -> tuple:
+	"""
+	Drains the queue without blocking.
+
+	Returns
+	-------
+	dict: newest snapshot, or None if the queue was empty
+	int: older snapshots skipped as stale
+	"""
+	snapshot, skipped = None, -1
+	while True:
+		try:
+			snapshot = snapshots.get_nowait()
+			skipped += 1
+		except queue.Empty:
+			return snapshot, max(skipped, 0)
+
+
+def evolve(generations: int, populationSize: int, publisher: SnapshotPublisher, results) -> None:
+	"""
+	Worker process running evolution at full speed, publishing snapshots as it goes.
+	Puts (champion description, snapshots dropped, None) on results when done, or
+	(None, snapshots dropped, traceback) if evolution raised, so the renderer never
+	waits on a result that isn't coming.
+	The fitness cache is off so that the champion races, and shows up, every generation.
+	"""
+	publisher.snapshots.cancel_join_thread()  # never wait on undelivered snapshots when exiting
+	try:
+		evolution = Evolution(populationSize=populationSize, observer=publisher, cacheSize=0)
+		try:
+			champion = evolution.run(generations, callback=lambda stats: print(formatStats(stats)))
+		finally:
+			evolution.close()
+	except BaseException:
+		results.put((None, publisher.dropped, traceback.format_exc()))
+		raise
+	results.put((champion.toDict(), publisher.dropped, None))
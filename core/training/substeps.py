@@ -0,0 +1,105 @@
+"""
+Accuracy and cost of adaptive sub-stepping.
+
+Records the states and controls of a fleet racing with single step ticks,
+then replays every recorded tick with each integrator and compares where the
+cars end up against a reference taking 4 * MAX_SUBSTEPS substeps every tick.
+Replaying recorded ticks measures the integration error of one tick, which
+whole races can't: any difference in a crash changes the rest of the race.
+"""
+
+import numpy as np
+
+from core.game_components.track import Track
+from core.game_components.environment import Environment
+from core.game_components.vec_env import VecRacingEnv
+from core.game_components.integrator import AdaptiveIntegrator
+from core.training.neural_net import FFNN
+from core.settings import MAX_STEPS, MAX_SUBSTEPS
+
+
+def recordTicks(environment: Environment, networks: list, maxSteps: int = MAX_STEPS) -> list:
+	"""
+	Races networks and records the fleet before every tick.
+
+	Returns
+	-------
+	list: (positions, velocities, headings, steering, throttle) of the living cars at every tick
+	"""
+	env = VecRacingEnv(environment, networks[0].layerSizes[0], maxSteps, integrator=AdaptiveIntegrator(environment, fixed=1))
+	obs = env.reset(len(networks))
+	ticks = []
+	for _ in range(maxSteps):
+		alive = env.state.alive.copy()
+		if not alive.any():
+			break
+		actions = np.array([network.feedForward(o) for network, o in zip(networks, obs)])
+		steering = np.clip(actions[:, 0], -env.max_turning_rate, env.max_turning_rate)
+		throttle = np.clip(actions[:, 1], -env.max_acceleration, env.max_acceleration)
+		ticks.append((env.positions[alive].copy(), env.velocities[alive].copy(), env.headings[alive].copy(), steering[alive], throttle[alive]))
+		obs, _, _, _ = env.step(actions)
+	return ticks
+
+
+def compareIntegrators(networks: list, seed: int = 0, maxSteps: int = MAX_STEPS, trackType: str = "perlin") -> dict:
+	"""
+	Replays the recorded ticks of networks with fixed and adaptive substeps.
+
+	Parameters
+	----------
+	networks: list
+		FFNNs to race
+	seed: int, default=0
+		Track seed
+	maxSteps: int, default=MAX_STEPS
+		Tick limit
+	trackType: str, default="perlin"
+		Type of track
+
+	Returns
+	-------
+	dict: for each integrator, substeps per tick and the mean and largest
+	      end of tick position error in pixels against the reference, and
+	      the fewest fixed substeps with a largest error no worse than adaptive
+	"""
+	environment = Environment(Track(type=trackType, seed=seed))
+	ticks = recordTicks(environment, networks, maxSteps)
+	integrators = {f"fixed {k}": AdaptiveIntegrator(environment, fixed=k) for k in range(1, MAX_SUBSTEPS + 1)}
+	integrators["adaptive"] = AdaptiveIntegrator(environment)
+	reference = AdaptiveIntegrator(environment, fixed=4 * MAX_SUBSTEPS)
+
+	errors = {name: [] for name in integrators}
+	for positions, velocities, headings, steering, throttle in ticks:
+		end = _replay(reference, positions, velocities, headings, steering, throttle)
+		for name, integrator in integrators.items():
+			errors[name].append(np.hypot(*(_replay(integrator, positions, velocities, headings, steering, throttle) - end).T))
+
+	report = {}
+	for name, integrator in integrators.items():
+		error = np.concatenate(errors[name])
+		report[name] = {
+			"substeps per tick": integrator.average_substeps,
+			"mean error": float(error.mean()),
+			"max error": float(error.max()),
+		}
+	adaptive = report["adaptive"]["max error"]
+	report["fixed substeps for the same max error"] = min(
+		(k for k in range(1, MAX_SUBSTEPS + 1) if report[f"fixed {k}"]["max error"] <= adaptive), default=None
+	)
+	return report
+
+
+def _replay(integrator: AdaptiveIntegrator, positions, velocities, headings, steering, throttle) -> np.ndarray:
+	positions = positions.copy()
+	integrator.step(positions, velocities.copy(), headings.copy(), steering, throttle)
+	return positions
+
+
+if __name__ == "__main__":
+	np.random.seed(0)
+	report = compareIntegrators([FFNN((8, 6, 2), outputActivation="linear") for _ in range(100)])
+	for name, row in report.items():
+		if isinstance(row, dict):
+			print(f"{name:>10}: " + "  ".join(f"{key} {value:.4g}" for key, value in row.items()))
+		else:
+			print(f"{name}: {row}")
@@ -0,0 +1,301 @@
+"""
+Hyperparameter sweeps over evolution and car settings.
+
+A search space is expanded into configurations, either every combination
+(grid) or seeded random draws, and every configuration is evolved from scratch
+on a process pool whose size caps how many runs go at once. Summary metrics of
+each finished run are written to a SQLite database as they complete, keyed by a
+hash of the configuration, generations and seed, so that restarting a sweep
+skips every configuration that already finished.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import sqlite3
+import hashlib
+import itertools
+import multiprocessing as mp
+from contextlib import contextmanager
+
+import numpy as np
+
+from core.training.evolution import Evolution
+from core.settings import SWEEP_GENERATIONS, SWEEP_SAMPLES
+
+carSettings = ("max_turning_rate", "max_acceleration", "max_speed")  # keys of a configuration passed to every Racecar
+
+
+def expandGrid(space: dict) -> list:
+	"""
+	Every combination of the choices in a search space.
+
+	Parameters
+	----------
+	space: dict
+		Setting -> list of choices
+
+	Returns
+	-------
+	list: configurations, dicts of setting -> value
+	"""
+	for name, choices in space.items():
+		if not isinstance(choices, list):
+			raise ValueError(f"Grid search needs a list of choices for {name}, got {choices!r}")
+	names = list(space)
+	return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def sampleRandom(space: dict, samples: int, seed: int = 0) -> list:
+	"""
+	Random draws from a search space. Lists are choices, (low, high) pairs are
+	uniform ranges, integer if both ends are integers, and (low, high, "log")
+	are log-uniform ranges.
+
+	Parameters
+	----------
+	space: dict
+		Setting -> choices or range
+	samples: int
+		Number of configurations
+	seed: int, default=0
+		Seeds the draws, the same seed draws the same configurations
+
+	Returns
+	-------
+	list: configurations, dicts of setting -> value, without duplicates
+	"""
+	rng = random.Random(seed)
+	configs, keys = [], set()
+	for _ in range(samples):
+		config = {name: _draw(rng, name, choices) for name, choices in space.items()}
+		key = json.dumps(config, sort_keys=True)
+		if key not in keys:
+			keys.add(key)
+			configs.append(config)
+	return configs
+
+
+def runKey(config: dict, generations: int, seed: int) -> str:
+	"""Hash identifying a run, equal configurations are equal however their space was written."""
+	description = json.dumps({"config": config, "generations": generations, "seed": seed}, sort_keys=True)
+	return hashlib.sha1(description.encode()).hexdigest()
+
+
+def runConfig(job: dict) -> dict:
+	"""
+	Evolves one configuration. Runs inside pool workers, so it only takes and returns plain data.
+
+	Parameters
+	----------
+	job: dict
+		"key", "config", "generations" and "seed"
+
+	Returns
+	-------
+	dict: key, summary metrics and champion description, or the error that stopped the run
+	"""
+	config = dict(job["config"])
+	car = {name: config.pop(name) for name in carSettings if name in config}
+	if "architecture" in config:
+		config["architecture"] = tuple(config["architecture"])
+
+	start = time.perf_counter()
+	history = []
+	try:
+		evolution = Evolution(seed=job["seed"], car=car or None, **config)
+		try:
+			champion = evolution.run(job["generations"], callback=history.append)
+		finally:
+			evolution.close()
+	except Exception as error:
+		return {"key": job["key"], "error": f"{type(error).__name__}: {error}"}
+
+	last = history[-1]
+	return {
+		"key": job["key"],
+		"metrics": {
+			"best": float(evolution.championFitness),
+			"finalBest": last["best"],
+			"finalMean": last["mean"],
+			"finalMedian": last["median"],
+			"finalDiversity": last["diversity"],
+			"meanOfMeans": float(np.mean([stats["mean"] for stats in history])),
+			"ticksPerSecond": float(np.mean([stats["ticksPerSecond"] for stats in history])),
+			"elapsed": time.perf_counter() - start,
+		},
+		"champion": champion.toDict(),
+	}
+
+
+class Sweep:
+	"""
+	Runs a search space of evolution configurations on a process pool and
+	stores their results in SQLite.
+
+	Public Methods
+	--------------
+	jobs() -> list:
+		Every run of the sweep, finished or not.
+	run(workers, callback) -> list:
+		Runs every configuration that hasn't finished yet and returns all results.
+	results() -> list:
+		Stored results, best first.
+	"""
+	def __init__(
+			self,
+			space: dict,
+			path: str,
+			search: str = "grid",
+			generations: int = SWEEP_GENERATIONS,
+			samples: int = SWEEP_SAMPLES,
+			seed: int = 0,
+			metric: str = "best"
+			) -> None:
+		"""
+		Initializes, creating the results database if it doesn't exist.
+
+		Parameters
+		----------
+		space: dict
+			Setting -> choices or range, Evolution keyword arguments or car settings
+			(max_turning_rate, max_acceleration, max_speed)
+		path: str
+			SQLite database results are stored in, shared by any number of sweeps
+		search: str, default="grid"
+			"grid" runs every combination, "random" draws samples configurations
+		generations: int, default=SWEEP_GENERATIONS
+			Generations evolved per configuration
+		samples: int, default=SWEEP_SAMPLES
+			Configurations drawn by a random search
+		seed: int, default=0
+			Seeds random search and every run, so runs of different configurations race the same tracks
+		metric: str, default="best"
+			Metric results are ranked by
+		"""
+		if search not in ("grid", "random"):
+			raise ValueError(f"Unknown search: {search}")
+		if "workers" in space or "seed" in space:
+			raise ValueError("workers and seed are set by the sweep, not the search space")
+		self.space = space
+		self.path = path
+		self.search = search
+		self.generations = generations
+		self.samples = samples
+		self.seed = seed
+		self.metric = metric
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+		with self._connect() as db:
+			db.execute(
+				"CREATE TABLE IF NOT EXISTS runs ("
+				"key TEXT PRIMARY KEY, config TEXT NOT NULL, generations INTEGER NOT NULL, seed INTEGER NOT NULL, "
+				"metrics TEXT, champion TEXT, error TEXT, finished REAL NOT NULL)"
+			)
+
+	def jobs(self) -> list:
+		"""
+		Every run of the sweep, finished or not.
+
+		Returns
+		-------
+		list: dicts of "key", "config", "generations" and "seed"
+		"""
+		configs = expandGrid(self.space) if self.search == "grid" else sampleRandom(self.space, self.samples, self.seed)
+		return [
+			{"key": runKey(config, self.generations, self.seed), "config": config, "generations": self.generations, "seed": self.seed}
+			for config in configs
+		]
+
+	def run(self, workers: int = None, callback: callable = None) -> list:
+		"""
+		Runs every configuration without a stored result, failed runs are retried.
+
+		Parameters
+		----------
+		workers: int, optional
+			Runs evolved at once, defaults to the number of cores
+		callback: callable, optional
+			Called with the config and result of every run as it finishes
+
+		Returns
+		-------
+		list: results of the whole sweep, see results
+		"""
+		jobs = self.jobs()
+		with self._connect() as db:
+			finished = {key for key, in db.execute("SELECT key FROM runs WHERE error IS NULL")}
+		pending = {job["key"]: job for job in jobs if job["key"] not in finished}
+
+		if pending:
+			with mp.Pool(min(workers or os.cpu_count(), len(pending))) as pool:
+				for result in pool.imap_unordered(runConfig, pending.values()):
+					job = pending[result["key"]]
+					self._store(job, result)
+					if callback is not None:
+						callback(job["config"], result)
+		return self.results(jobs)
+
+	def results(self, jobs: list = None) -> list:
+		"""
+		Stored results of the sweep's configurations, best first by metric, failed runs last.
+
+		Parameters
+		----------
+		jobs: list, optional
+			Runs to look up, defaults to jobs()
+
+		Returns
+		-------
+		list: dicts of "config", "metrics", "champion" and "error"
+		"""
+		keys = [job["key"] for job in (jobs if jobs is not None else self.jobs())]
+		rows = []
+		with self._connect() as db:
+			for start in range(0, len(keys), 500):  # stays under SQLite's bound parameter limit
+				chunk = keys[start:start + 500]
+				rows += db.execute(
+					f"SELECT config, metrics, champion, error FROM runs WHERE key IN ({','.join('?' * len(chunk))})", chunk
+				).fetchall()
+		results = [
+			{"config": json.loads(config), "metrics": json.loads(metrics) if metrics else None, "champion": json.loads(champion) if champion else None, "error": error}
+			for config, metrics, champion, error in rows
+		]
+		return sorted(results, key=lambda result: -result["metrics"][self.metric] if result["metrics"] else math.inf)
+
+	def _store(self, job: dict, result: dict) -> None:
+		with self._connect() as db:
+			db.execute(
+				"INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+				(
+					job["key"], json.dumps(job["config"], sort_keys=True), job["generations"], job["seed"],
+					json.dumps(result["metrics"]) if "metrics" in result else None,
+					json.dumps(result["champion"]) if "champion" in result else None,
+					result.get("error"), time.time(),
+				),
+			)
+
+	@contextmanager
+	def _connect(self):
+		"""Connection that commits if the block succeeds and is closed either way."""
+		db = sqlite3.connect(self.path)
+		try:
+			with db:
+				yield db
+		finally:
+			db.close()
+
+
+def _draw(rng: random.Random, name: str, choices):
+	"""One random value of a setting."""
+	if isinstance(choices, list):
+		return rng.choice(choices)
+	if isinstance(choices, tuple) and len(choices) == 2:
+		low, high = choices
+		if isinstance(low, int) and isinstance(high, int):
+			return rng.randint(low, high)
+		return rng.uniform(low, high)
+	if isinstance(choices, tuple) and len(choices) == 3 and choices[2] == "log":
+		return math.exp(rng.uniform(math.log(choices[0]), math.log(choices[1])))
+	raise ValueError(f"Can't sample {name} from {choices!r}")
@@ -0,0 +1,229 @@
+"""
+Non-blocking telemetry for training runs.
+
+record() drops metric records into a bounded queue without ever waiting; a
+background thread drains it and appends to a JSONL or CSV file in batches,
+flushing after each one so `tail -f` and follow() see complete lines as soon
+as they are written. When the queue is full, records are dropped and counted,
+and records that can't be written are counted as errors rather than stopping
+the writer.
+"""
+
+import os
+import csv
+import json
+import time
+import queue
+import threading
+
+import numpy as np
+
+from core.settings import TELEMETRY_QUEUE_SIZE, TELEMETRY_BATCH_SIZE, TELEMETRY_FLUSH_INTERVAL
+
+
+class Telemetry:
+	"""
+	Bounded queue of metric records drained to a file by a writer thread.
+	Instances are callable, so they can be passed as a run() callback.
+
+	Attributes
+	----------
+	dropped: int
+		Records discarded because the queue was full
+	written: int
+		Records written so far
+	errors: int
+		Records that failed to write
+	lastError: Exception
+		Most recent write failure, None if there was none
+
+	Public Methods
+	--------------
+	record(metrics) -> bool:
+		Queues a record, returns False if it was dropped.
+	close() -> None:
+		Writes everything still queued and stops the writer.
+	"""
+	_stop = object()
+
+	def __init__(
+			self,
+			path: str,
+			format: str = None,
+			queueSize: int = TELEMETRY_QUEUE_SIZE,
+			batchSize: int = TELEMETRY_BATCH_SIZE,
+			flushInterval: float = TELEMETRY_FLUSH_INTERVAL
+			) -> None:
+		"""
+		Opens path for appending and starts the writer.
+
+		Parameters
+		----------
+		path: str
+			Output file, its folder is created if needed
+		format: str, optional
+			"jsonl" or "csv", taken from the extension of path by default
+		queueSize: int, default=TELEMETRY_QUEUE_SIZE
+			Records that may wait for the writer
+		batchSize: int, default=TELEMETRY_BATCH_SIZE
+			Records written per flush
+		flushInterval: float, default=TELEMETRY_FLUSH_INTERVAL
+			Seconds a partial batch may wait before being written
+		"""
+		self.path = path
+		self.format = format or ("csv" if path.endswith(".csv") else "jsonl")
+		if self.format not in ("jsonl", "csv"):
+			raise ValueError(f"unknown telemetry format {self.format!r}")
+		self.batchSize = batchSize
+		self.flushInterval = flushInterval
+		self.dropped = 0
+		self.written = 0
+		self.errors = 0
+		self.lastError = None
+
+		folder = os.path.dirname(path)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+		self.file = open(path, "a", newline="")
+		self.columns = None
+		if self.format == "csv" and self.file.tell() > 0:
+			with open(path, newline="") as existing:
+				self.columns = next(csv.reader(existing), None)
+
+		self.queue = queue.Queue(maxsize=queueSize)
+		self.thread = threading.Thread(target=self._write, name="telemetry", daemon=True)
+		self.thread.start()
+
+	def record(self, metrics: dict) -> bool:
+		"""
+		Queues a record without blocking.
+
+		Parameters
+		----------
+		metrics: dict
+			Metric names and values, nested dicts and lists are allowed
+
+		Returns
+		-------
+		bool: False if the queue was full and the record was dropped
+		"""
+		try:
+			self.queue.put_nowait(metrics)
+			return True
+		except queue.Full:
+			self.dropped += 1
+			return False
+
+	__call__ = record
+
+	def close(self) -> None:
+		"""Writes everything still queued, stops the writer and closes the file."""
+		if self.thread is None:
+			return
+		# a writer that died can't make room in a full queue, so never wait on it for long
+		while self.thread.is_alive():
+			try:
+				self.queue.put(self._stop, timeout=0.1)
+				break
+			except queue.Full:
+				continue
+		self.thread.join()
+		self.thread = None
+		self.file.close()
+
+	def __enter__(self) -> "Telemetry":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+	def _write(self) -> None:
+		"""Writer thread, drains the queue in batches until close()."""
+		stopping = False
+		while not stopping:
+			batch = []
+			deadline = time.monotonic() + self.flushInterval
+			while len(batch) < self.batchSize:
+				try:
+					item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+				except queue.Empty:
+					break
+				if item is self._stop:
+					stopping = True
+					break
+				batch.append(item)
+			if batch:
+				try:
+					self._writeBatch(batch)
+				except Exception:
+					# retry one by one so a single bad record doesn't cost the whole batch
+					for record in batch:
+						try:
+							self._writeBatch([record])
+						except Exception as error:
+							self.errors += 1
+							self.lastError = error
+
+	def _writeBatch(self, batch: list) -> None:
+		if self.format == "jsonl":
+			self.file.write("".join(json.dumps(record, default=_jsonValue) + "\n" for record in batch))
+		else:
+			rows = [_flatten(record) for record in batch]
+			if self.columns is None:
+				self.columns = list(rows[0])
+				csv.writer(self.file).writerow(self.columns)
+			writer = csv.DictWriter(self.file, self.columns, extrasaction="ignore")
+			writer.writerows(rows)
+		self.file.flush()
+		self.written += len(batch)
+
+
+def follow(path: str, poll: float = 0.5, stop: threading.Event = None):
+	"""
+	Yields records appended to a JSONL telemetry file, like `tail -f`.
+	Starts from the beginning of the file and waits for new lines at the end.
+
+	Parameters
+	----------
+	path: str
+		JSONL file written by Telemetry
+	poll: float, default=0.5
+		Seconds between checks for new lines
+	stop: threading.Event, optional
+		Ends the generator once set and the file has been read to its end
+	"""
+	with open(path) as file:
+		partial = ""
+		while True:
+			line = file.readline()
+			if line.endswith("\n"):
+				yield json.loads(partial + line)
+				partial = ""
+			elif line:
+				partial += line
+			elif stop is not None and stop.is_set():
+				return
+			else:
+				time.sleep(poll)
+
+
+def _flatten(record: dict, prefix: str = "") -> dict:
+	"""One level dict for CSV, nested keys are joined with dots and lists are JSON encoded."""
+	flat = {}
+	for key, value in record.items():
+		if isinstance(value, dict):
+			flat.update(_flatten(value, f"{prefix}{key}."))
+		elif isinstance(value, (list, tuple, np.ndarray)):
+			flat[prefix + key] = json.dumps(value, default=_jsonValue)
+		else:
+			flat[prefix + key] = value.item() if isinstance(value, np.generic) else value
+	return flat
+
+
+def _jsonValue(value):
+	"""json default converting numpy scalars and arrays."""
+	if isinstance(value, np.ndarray):
+		return value.tolist()
+	if isinstance(value, np.generic):
+		return value.item()
+	raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,143 @@
+"""
+Early termination policies for fitness evaluation.
+
+Each policy looks at the state of the whole fleet and returns a boolean mask
+of cars that should be killed this tick, so that cars that are parked,
+crawling, spinning or driving the wrong way stop costing simulation time.
+"""
+
+import numpy as np
+
+from core.settings import STALL_TICKS, MIN_SPEED, SPEED_GRACE_TICKS, REVERSE_TOLERANCE
+
+
+class FleetState:
+	"""
+	Per car arrays describing a fleet mid evaluation.
+
+	Attributes
+	----------
+	tick: int
+		Ticks simulated so far
+	alive: np.ndarray
+		(N,) bool, cars still racing
+	progress: np.ndarray
+		(N,) radians of track covered
+	bestProgress: np.ndarray
+		(N,) furthest each car has got
+	lastImprovement: np.ndarray
+		(N,) tick each car last beat its best progress
+	speed: np.ndarray
+		(N,) current speed of each car
+	"""
+	def __init__(self, n: int) -> None:
+		self.tick = 0
+		self.alive = np.ones(n, dtype=bool)
+		self.progress = np.zeros(n)
+		self.bestProgress = np.zeros(n)
+		self.lastImprovement = np.zeros(n, dtype=int)
+		self.speed = np.zeros(n)
+
+	def update(self, delta: np.ndarray, speed: np.ndarray) -> None:
+		"""
+		Advances the state by one tick.
+
+		Parameters
+		----------
+		delta: np.ndarray
+			(N,) progress made this tick, 0 for dead cars
+		speed: np.ndarray
+			(N,) speed after this tick
+		"""
+		self.tick += 1
+		self.progress += delta
+		improved = self.progress > self.bestProgress
+		self.bestProgress[improved] = self.progress[improved]
+		self.lastImprovement[improved] = self.tick
+		self.speed = speed
+
+
+class NoProgress:
+	"""Kills cars that haven't beaten their best progress in the last ticks."""
+	name = "no progress"
+
+	def __init__(self, ticks: int = STALL_TICKS) -> None:
+		self.ticks = ticks
+
+	def __call__(self, state: FleetState) -> np.ndarray:
+		return state.tick - state.lastImprovement >= self.ticks
+
+
+class MinSpeed:
+	"""Kills cars slower than threshold once they've had graceTicks to get going."""
+	name = "min speed"
+
+	def __init__(self, threshold: float = MIN_SPEED, graceTicks: int = SPEED_GRACE_TICKS) -> None:
+		self.threshold = threshold
+		self.graceTicks = graceTicks
+
+	def __call__(self, state: FleetState) -> np.ndarray:
+		if state.tick < self.graceTicks:
+			return np.zeros_like(state.alive)
+		return state.speed < self.threshold
+
+
+class Reversing:
+	"""Kills cars that have driven tolerance radians back from their best progress."""
+	name = "reversing"
+
+	def __init__(self, tolerance: float = REVERSE_TOLERANCE) -> None:
+		self.tolerance = tolerance
+
+	def __call__(self, state: FleetState) -> np.ndarray:
+		return state.progress < state.bestProgress - self.tolerance
+
+
+class Extinction:
+	"""
+	Ends the evaluation for everyone once no more than survivors cars are left.
+	Not a default policy since it cuts the best cars short, and survivors must
+	be at least 1 since the evaluation already ends once every car is dead.
+	"""
+	name = "extinction"
+
+	def __init__(self, survivors: int) -> None:
+		if survivors < 1:
+			raise ValueError(f"Extinction needs at least 1 survivor to ever fire, got {survivors}")
+		self.survivors = survivors
+
+	def __call__(self, state: FleetState) -> np.ndarray:
+		if state.alive.sum() <= self.survivors:
+			return np.ones_like(state.alive)
+		return np.zeros_like(state.alive)
+
+
+def defaultPolicies() -> list:
+	"""Policies used during evolution."""
+	return [NoProgress(), MinSpeed(), Reversing()]
+
+
+def applyPolicies(policies: list, state: FleetState, counts: dict) -> np.ndarray:
+	"""
+	Combines the masks of every policy.
+
+	Parameters
+	----------
+	policies: list
+		Termination policies
+	state: FleetState
+		Current fleet state, cars that crashed this tick already marked dead so
+		they aren't counted twice
+	counts: dict
+		policy name -> cars killed so far, updated in place
+
+	Returns
+	-------
+	np.ndarray: (N,) bool, living cars that should be killed
+	"""
+	kill = np.zeros_like(state.alive)
+	for policy in policies:
+		mask = policy(state) & state.alive & ~kill
+		counts[policy.name] = counts.get(policy.name, 0) + int(mask.sum())
+		kill |= mask
+	return kill
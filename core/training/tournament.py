@@ -0,0 +1,347 @@
+"""
+Headless AI Battle tournaments between saved champion networks.
+
+Heats of several champions race on a seeded track, heats are spread across a
+process pool and the finishing order of every heat feeds an Elo rating table.
+Finished heats are appended to a results file as they complete so that an
+interrupted tournament picks up where it left off.
+"""
+
+import os
+import json
+import math
+import random
+import itertools
+import multiprocessing as mp
+
+import numpy as np
+
+from core.game_components.track import Track
+from core.game_components.environment import Environment
+from core.training.neural_net import FFNN
+from core.training.simulation import race
+from core.settings import TRACK_TYPE, MAX_STEPS, HEAT_SIZE, ELO_K
+
+
+def loadChampions(folder: str) -> dict:
+	"""
+	Reads every saved network in a folder.
+
+	Parameters
+	----------
+	folder: str
+		Folder containing .json files written by FFNN.save
+
+	Returns
+	-------
+	dict: champion name (file name without extension) -> network description
+	"""
+	champions = {}
+	for name in sorted(os.listdir(folder)):
+		if name.endswith(".json"):
+			with open(os.path.join(folder, name)) as f:
+				champions[name[:-len(".json")]] = json.load(f)
+	return champions
+
+
+def runHeat(heat: dict) -> dict:
+	"""
+	Races one heat. Runs inside pool workers, so it only takes and returns plain data.
+
+	Parameters
+	----------
+	heat: dict
+		Heat description with "id", "seed", "entrants" (names) and "networks" (descriptions)
+
+	Returns
+	-------
+	dict: heat id, entrants, seed, fitness of each entrant and entrants in finishing order
+	"""
+	environment = Environment(Track(type=TRACK_TYPE, seed=heat["seed"]))
+	networks = [FFNN.fromDict(network) for network in heat["networks"]]
+	fitness = race(environment, networks, heat["maxSteps"])
+	order = np.argsort(-fitness, kind="stable")
+	return {
+		"id": heat["id"],
+		"entrants": heat["entrants"],
+		"seed": heat["seed"],
+		"fitness": fitness.tolist(),
+		"placings": [heat["entrants"][i] for i in order],
+	}
+
+
+def updateRatings(ratings: dict, result: dict, k: float = ELO_K) -> None:
+	"""
+	Multiplayer Elo update. A heat counts as a game between every pair of
+	entrants, with k split across the K - 1 games each entrant played.
+
+	Parameters
+	----------
+	ratings: dict
+		name -> rating, updated in place
+	result: dict
+		Output of runHeat
+	k: float, default=ELO_K
+		Elo K-factor
+	"""
+	fitness = dict(zip(result["entrants"], result["fitness"]))
+	entrants = result["entrants"]
+	scale = k / max(len(entrants) - 1, 1)
+	deltas = dict.fromkeys(entrants, 0.)
+	for a, b in itertools.combinations(entrants, 2):
+		score = 0.5 if fitness[a] == fitness[b] else float(fitness[a] > fitness[b])
+		expected = 1 / (1 + 10 ** ((ratings[b] - ratings[a]) / 400))
+		deltas[a] += scale * (score - expected)
+		deltas[b] -= scale * (score - expected)
+	for name, delta in deltas.items():
+		ratings[name] += delta
+
+
+class Tournament:
+	"""
+	Schedules heats between champions and keeps an Elo rating table.
+
+	Public Methods
+	--------------
+	run(workers) -> list:
+		Runs every heat that hasn't been raced yet and returns the standings.
+	standings() -> list:
+		(name, rating, heats raced) sorted from best to worst.
+	"""
+	def __init__(
+			self,
+			champions: dict,
+			path: str,
+			heatSize: int = HEAT_SIZE,
+			format: str = "swiss",
+			rounds: int = 5,
+			meetings: int = 1,
+			seed: int = 0,
+			maxSteps: int = MAX_STEPS,
+			initialRating: float = 1500
+			) -> None:
+		"""
+		Initializes, loading any heats already stored at path.
+
+		Parameters
+		----------
+		champions: dict
+			name -> network description, see loadChampions
+		path: str
+			.jsonl file finished heats are stored in
+		heatSize: int, default=HEAT_SIZE
+			Number of champions racing in each heat
+		format: str, default="swiss"
+			"round robin" races rounds of heats until every pair of champions has
+			met a number of times, "swiss" groups champions of similar rating for
+			a number of rounds
+		rounds: int, default=5
+			Number of swiss rounds, ignored for round robin
+		meetings: int, default=1
+			Times every pair of champions meets in a round robin, ignored for swiss
+		seed: int, default=0
+			Base seed heat tracks are derived from
+		maxSteps: int, default=MAX_STEPS
+			Tick limit of each heat
+		initialRating: float, default=1500
+			Rating every champion starts with
+		"""
+		if format not in ("round robin", "swiss"):
+			raise ValueError(f"Unknown tournament format: {format}")
+		if len(champions) < 2 or heatSize < 2:
+			raise ValueError("A tournament needs at least 2 champions and heats of at least 2")
+		self.champions = champions
+		self.path = path
+		self.heatSize = min(heatSize, len(champions))
+		self.format = format
+		self.rounds = rounds
+		self.meetings = meetings
+		self.seed = seed
+		self.maxSteps = maxSteps
+		self.initialRating = initialRating
+		self.results = {}
+		self._load()
+
+	def config(self) -> dict:
+		"""Settings that must match for stored heats to be reused."""
+		return {
+			"champions": sorted(self.champions),
+			"heatSize": self.heatSize,
+			"format": self.format,
+			"rounds": self.rounds,
+			"meetings": self.meetings,
+			"seed": self.seed,
+			"maxSteps": self.maxSteps,
+		}
+
+	def run(self, workers: int = None) -> list:
+		"""
+		Runs every heat that hasn't been raced yet.
+
+		Parameters
+		----------
+		workers: int, optional
+			Size of the process pool, defaults to the number of cores
+
+		Returns
+		-------
+		list: final standings
+		"""
+		with mp.Pool(workers) as pool:
+			if self.format == "round robin":
+				self._runHeats(pool, self._roundRobinHeats())
+			else:
+				for round in range(self.rounds):
+					self._runHeats(pool, self._swissHeats(round))
+		return self.standings()
+
+	def ratings(self) -> dict:
+		"""
+		Replays stored heats in schedule order.
+
+		Returns
+		-------
+		dict: name -> Elo rating
+		"""
+		ratings = dict.fromkeys(self.champions, self.initialRating)
+		for id in sorted(self.results, key=_scheduleOrder):
+			updateRatings(ratings, self.results[id])
+		return ratings
+
+	def standings(self) -> list:
+		"""
+		Returns
+		-------
+		list: (name, rating, heats raced) sorted from best to worst
+		"""
+		ratings = self.ratings()
+		raced = dict.fromkeys(self.champions, 0)
+		for result in self.results.values():
+			for name in result["entrants"]:
+				raced[name] += 1
+		return sorted(((name, ratings[name], raced[name]) for name in ratings), key=lambda row: -row[1])
+
+	def _roundRobinHeats(self) -> list:
+		"""
+		Rounds in which every champion races once, but for the odd one out of
+		heats of 2 who sits the round out, each heat greedily filled with
+		the champions that still have to meet its members most, until every pair
+		has met self.meetings times. Heats cover K(K-1)/2 pairs each, so this takes
+		about meetings * N^2 / K^2 heats rather than every one of the C(N, K)
+		combinations, which are only raced when there are fewer of them.
+		"""
+		names = sorted(self.champions)
+		rng = np.random.default_rng(self.seed)
+		owed = np.full((len(names), len(names)), self.meetings)  # meetings still owed by every pair
+		np.fill_diagonal(owed, 0)
+		heats = []
+		round = 0
+		while owed.any():
+			free = np.ones(len(names), dtype=bool)
+			for i, size in enumerate(_heatSizes(len(names), self.heatSize)):
+				# random noise below 1 only breaks ties between equal counts
+				candidates = np.flatnonzero(free)
+				score = np.count_nonzero(owed[candidates], axis=1) + rng.random(len(candidates))
+				heat = [candidates[np.argmax(score)]]
+				free[heat[0]] = False
+				while len(heat) < size:
+					candidates = np.flatnonzero(free)
+					score = np.count_nonzero(owed[np.ix_(candidates, heat)], axis=1) + rng.random(len(candidates))
+					pick = candidates[np.argmax(score)]
+					heat.append(pick)
+					free[pick] = False
+				members = np.array(heat)
+				block = owed[np.ix_(members, members)]
+				np.maximum(block - 1, 0, out=block)
+				owed[np.ix_(members, members)] = block
+				heats.append(self._heat(f"rr-{round}-{i}", [names[j] for j in sorted(heat)]))
+			round += 1
+
+		# few champions can race every combination in fewer heats
+		if math.comb(len(names), self.heatSize) * self.meetings <= len(heats):
+			combinations = list(itertools.combinations(names, self.heatSize))
+			heats = [
+				self._heat(f"rr-{round}-{i}", list(entrants))
+				for round in range(self.meetings) for i, entrants in enumerate(combinations)
+			]
+		return heats
+
+	def _swissHeats(self, round: int) -> list:
+		"""Pairs champions with similar ratings, depends on every earlier round being finished."""
+		ratings = self.ratings()
+		names = sorted(self.champions)
+		random.Random(f"{self.seed}-{round}").shuffle(names)  # break ties between equal ratings
+		names.sort(key=lambda name: -ratings[name])
+		sizes = _heatSizes(len(names), self.heatSize)
+		if sum(sizes) < len(names):
+			# the bye goes to the lowest rated champion that hasn't had one yet
+			byes = {name for earlier in range(round) for name in self._byes(earlier)}
+			names.remove(next((name for name in reversed(names) if name not in byes), names[-1]))
+		heats, start = [], 0
+		for i, size in enumerate(sizes):
+			heats.append(self._heat(f"swiss-{round}-{i}", names[start:start + size]))
+			start += size
+		return heats
+
+	def _byes(self, round: int) -> set:
+		"""Champions that sat out a finished swiss round."""
+		seated = {name for id, result in self.results.items() if id.startswith(f"swiss-{round}-") for name in result["entrants"]}
+		return set(self.champions) - seated
+
+	def _heat(self, id: str, entrants: list) -> dict:
+		return {
+			"id": id,
+			"seed": random.Random(f"{self.seed}-{id}").randint(1, 10**9),
+			"entrants": entrants,
+			"networks": [self.champions[name] for name in entrants],
+			"maxSteps": self.maxSteps,
+		}
+
+	def _runHeats(self, pool: mp.Pool, heats: list) -> None:
+		pending = [heat for heat in heats if heat["id"] not in self.results]
+		with open(self.path, "a") as f:
+			for result in pool.imap_unordered(runHeat, pending):
+				self.results[result["id"]] = result
+				f.write(json.dumps(result) + "\n")
+				f.flush()
+
+	def _load(self) -> None:
+		"""Reads finished heats, or starts a new results file headed by the config."""
+		if not os.path.exists(self.path):
+			os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+			with open(self.path, "w") as f:
+				f.write(json.dumps({"config": self.config()}) + "\n")
+			return
+
+		with open(self.path) as f:
+			header = json.loads(f.readline())
+			if header.get("config") != self.config():
+				raise ValueError(f"{self.path} belongs to a tournament with different settings")
+			lines = f.readlines()
+
+		for line in lines:
+			try:
+				result = json.loads(line)
+			except json.JSONDecodeError:  # last line of an interrupted write
+				continue
+			self.results[result["id"]] = result
+
+		if lines and not lines[-1].endswith("\n"):
+			with open(self.path, "a") as f:
+				f.write("\n")  # keep new heats off the truncated line
+
+
+def _heatSizes(count: int, heatSize: int) -> list:
+	"""
+	Sizes of the fewest heats of at most heatSize that seat count champions, as
+	even as possible. A heat of 1 has nobody to be rated against, so with heats
+	of 2 and an odd count the last champion gets a bye and isn't seated.
+	"""
+	heats = -(-count // heatSize)
+	sizes = [count // heats + (i < count % heats) for i in range(heats)]
+	return [size for size in sizes if size > 1]
+
+
+def _scheduleOrder(id: str) -> tuple:
+	"""Sort key putting heat ids back into the order they were scheduled."""
+	return tuple(int(part) for part in id.split("-")[1:])
@@ -0,0 +1,167 @@
+"""
+Image asset pipeline.
+Classes
+-------
+AssetManager
+    Decodes images once, converts them to the display's pixel format and caches
+    tiled and scaled variants, optionally keeping decoded pixels on disk.
+"""
+
+from __future__ import annotations
+import os
+import struct
+import tempfile
+import pygame
+from core.ui.cache import SurfaceCache
+
+
+class AssetManager:
+    """
+    Decodes images once, converts them to the display's pixel format and caches
+    tiled and scaled variants in memory keyed by (asset, size, format).
+    Attributes
+    ----------
+    imageFolder: str
+        Folder assets are loaded from
+    cacheFolder: str
+        Folder decoded pixel buffers are kept in, None disables the disk cache
+    cache: SurfaceCache
+        (asset, size, format) -> converted pygame.Surface, size None is the original image
+    Public Methods
+    --------------
+    image(name: str, alpha: bool = True) -> pygame.Surface:
+        Converted image.
+    tiled(name: str, size: tuple, alpha: bool = True, pin: bool = False, scale: float = 1.0) -> pygame.Surface:
+        Image tiled across an area.
+    scaled(name: str, size: tuple, alpha: bool = True) -> pygame.Surface:
+        Image scaled to a size.
+    """
+    def __init__(self, imageFolder: str, cacheFolder: str = None, budget: int = None) -> None:
+        """
+        Initializes asset manager. Converting needs a display mode to be set,
+        so assets should be requested from the main thread after pygame.display.set_mode.
+        Parameters
+        ----------
+        imageFolder: str
+            Folder assets are loaded from
+        cacheFolder: str, optional
+            Folder decoded pixel buffers are kept in between launches
+        budget: int, optional
+            Bytes of converted surfaces kept in memory before the least recently used are dropped
+        """
+        self.imageFolder = imageFolder
+        self.cacheFolder = cacheFolder
+        self.cache = SurfaceCache(budget)
+
+    def image(self, name: str, alpha: bool = True) -> pygame.Surface:
+        """
+        Converted image.
+        Parameters
+        ----------
+        name: str
+            File name inside the image folder
+        alpha: bool, default=True
+            Whether to keep per-pixel alpha
+        Returns
+        -------
+        pygame.Surface: image in the display's pixel format, shared, don't draw on it
+        """
+        key = (name, None, AssetManager._format(alpha))
+        surface = self.cache.get(key)
+        if surface is None:
+            surface = self._decode(name)
+            surface = surface.convert_alpha() if alpha else surface.convert()
+            self.cache.put(key, surface)
+        return surface
+
+    def tiled(self, name: str, size: tuple, alpha: bool = True, pin: bool = False, scale: float = 1.0) -> pygame.Surface:
+        """
+        Image tiled across an area.
+        Parameters
+        ----------
+        name: str
+            File name inside the image folder
+        size: tuple
+            (width, height) of the area
+        alpha: bool, default=True
+            Whether to keep per-pixel alpha
+        pin: bool, default=False
+            Whether to keep the tiled image cached for good, e.g. so threads that can't convert can use it
+        scale: float, default=1.0
+            Factor the image is scaled by before tiling, e.g. to draw at a lower render resolution
+        Returns
+        -------
+        pygame.Surface: tiled image, shared, copy it before drawing on it
+        """
+        size = (int(size[0]), int(size[1]))
+        key = (name, ("tiled", size, scale), AssetManager._format(alpha))
+        surface = self.cache.get(key)
+        if surface is None:
+            tile = self.image(name, alpha)
+            if scale != 1:
+                tile = self.scaled(name, (max(1, round(tile.get_width() * scale)), max(1, round(tile.get_height() * scale))), alpha)
+            surface = pygame.Surface(size, pygame.SRCALPHA) if alpha else pygame.Surface(size)
+            surface = surface.convert_alpha() if alpha else surface.convert()
+            surface.blits([(tile, (x, y)) for x in range(0, size[0], tile.get_width())
+                                          for y in range(0, size[1], tile.get_height())], doreturn=False)
+            self.cache.put(key, surface, pin=pin)
+        elif pin:
+            self.cache.pin(key)
+        return surface
+
+    def scaled(self, name: str, size: tuple, alpha: bool = True) -> pygame.Surface:
+        """
+        Image scaled to a size.
+        Parameters
+        ----------
+        name: str
+            File name inside the image folder
+        size: tuple
+            (width, height) to scale to
+        alpha: bool, default=True
+            Whether to keep per-pixel alpha
+        Returns
+        -------
+        pygame.Surface: scaled image, shared, copy it before drawing on it
+        """
+        size = (int(size[0]), int(size[1]))
+        key = (name, ("scaled", size), AssetManager._format(alpha))
+        surface = self.cache.get(key)
+        if surface is None:
+            surface = pygame.transform.smoothscale(self.image(name, alpha), size)
+            self.cache.put(key, surface)
+        return surface
+
+    def _decode(self, name: str) -> pygame.Surface:
+        """Decodes an image, reading and writing raw pixels from the disk cache if there is one."""
+        path = os.path.join(self.imageFolder, name)
+        if self.cacheFolder is None:
+            return pygame.image.load(path)
+
+        stat = os.stat(path)
+        cachePath = os.path.join(self.cacheFolder, f"{os.path.basename(name)}-{stat.st_mtime_ns}-{stat.st_size}.rgba")
+        if os.path.exists(cachePath):
+            try:
+                with open(cachePath, "rb") as f:
+                    width, height = struct.unpack("<II", f.read(8))
+                    return pygame.image.frombytes(f.read(), (width, height), "RGBA")
+            except (OSError, struct.error, ValueError):
+                pass # unreadable or truncated, decode the image and rewrite it
+
+        surface = pygame.image.load(path)
+        os.makedirs(self.cacheFolder, exist_ok=True)
+        # other processes may be decoding the same image, so they must only ever see a complete file
+        fd, tempPath = tempfile.mkstemp(dir=self.cacheFolder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(struct.pack("<II", *surface.get_size()))
+                f.write(pygame.image.tobytes(surface, "RGBA"))
+            os.replace(tempPath, cachePath)
+        except OSError:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+        return surface
+
+    @staticmethod
+    def _format(alpha: bool) -> str:
+        return "alpha" if alpha else "opaque"
@@ -0,0 +1,127 @@
+"""
+Procedural backgrounds generated as NumPy pixel arrays.
+Functions
+---------
+checkerboard
+    Checkered pixels with an optional border.
+tiled
+    Pixels of an image tiled across an area.
+solid
+    Pixels of a single color.
+write
+    Writes pixels into a surface in one pass.
+"""
+
+from __future__ import annotations
+import math
+import numpy as np
+import pygame
+from core.ui.cache import SurfaceCache
+
+cache = SurfaceCache(64 * 2**20)  # (kind, size, grid, colors, pixel format) -> read only pixels, shared by every engine in the process
+
+
+def checkerboard(target: pygame.Surface, numGrids: tuple, cellSize: tuple, colors: tuple, border: bool = True) -> np.ndarray:
+    """
+    Checkered pixels with an optional border. Cells whose row and column sum to
+    an even number take the second color.
+    x x x x x . . .
+    x o x o x
+    x x o x o
+    .        . . .
+    Parameters
+    ----------
+    target: pygame.Surface
+        Surface the pixels are for, gives their size and pixel format
+    numGrids: tuple
+        Number of cells across and down
+    cellSize: tuple
+        (width, height) of a cell in pixels, may be fractional, pixels past the last cell belong to it
+    colors: tuple
+        RGB colors in form (checker color 1, checker color 2, border color)
+    border: bool, default=True
+        Whether the outer cells take the border color
+    Returns
+    -------
+    np.ndarray: read only (height, width) mapped pixels, shared
+    """
+    size = target.get_size()
+    key = ("checkered", size, tuple(numGrids), tuple(cellSize), tuple(map(tuple, colors)), border, _format(target))
+    pixels = cache.get(key)
+    if pixels is None:
+        # colors are decided per cell, then each pixel row gathers its cells' colors
+        board = (np.add.outer(np.arange(numGrids[1]), np.arange(numGrids[0])) % 2 == 0).astype(np.intp)
+        if border:
+            board[[0, -1], :] = 2
+            board[:, [0, -1]] = 2
+        palette = np.array([target.map_rgb(color) for color in colors], dtype=np.uint32)
+        columns = np.minimum(np.arange(size[0]) // cellSize[0], numGrids[0] - 1).astype(np.intp)
+        rows = np.minimum(np.arange(size[1]) // cellSize[1], numGrids[1] - 1).astype(np.intp)
+        pixels = palette[board][rows][:, columns]
+        pixels.flags.writeable = False
+        cache.put(key, pixels)
+    return pixels
+
+
+def tiled(target: pygame.Surface, name: str, tile: pygame.Surface) -> np.ndarray:
+    """
+    Pixels of an image tiled across an area.
+    Parameters
+    ----------
+    target: pygame.Surface
+        Surface the pixels are for, gives their size and pixel format
+    name: str
+        Name the image is cached under, together with the tile's size
+    tile: pygame.Surface
+        Image to tile, only read on a cache miss
+    Returns
+    -------
+    np.ndarray: read only (height, width) mapped pixels, shared
+    """
+    size = target.get_size()
+    key = ("tiled", name, tile.get_size(), size, _format(target))
+    pixels = cache.get(key)
+    if pixels is None:
+        tilePixels = pygame.surfarray.array2d(tile.convert(target)).T
+        repeats = (math.ceil(size[1] / tilePixels.shape[0]), math.ceil(size[0] / tilePixels.shape[1]))
+        pixels = np.tile(tilePixels, repeats)[:size[1], :size[0]]
+        pixels.flags.writeable = False
+        cache.put(key, pixels)
+    return pixels
+
+
+def solid(target: pygame.Surface, color: tuple) -> np.ndarray:
+    """
+    Pixels of a single color, a broadcast view so nothing is cached.
+    Parameters
+    ----------
+    target: pygame.Surface
+        Surface the pixels are for, gives their size and pixel format
+    color: tuple
+        RGB color
+    Returns
+    -------
+    np.ndarray: read only (height, width) mapped pixels
+    """
+    width, height = target.get_size()
+    return np.broadcast_to(np.uint32(target.map_rgb(color)), (height, width))
+
+
+def write(target: pygame.Surface, pixels: np.ndarray) -> None:
+    """
+    Writes pixels into a surface through a surfarray view in one pass.
+    Parameters
+    ----------
+    target: pygame.Surface
+        32 bit surface the pixels were made for
+    pixels: np.ndarray
+        (height, width) pixels mapped to the target's format
+    """
+    view = pygame.surfarray.pixels2d(target)
+    view[...] = pixels.T  # both walk memory row by row
+    del view  # unlocks the surface
+
+
+def _format(target: pygame.Surface) -> tuple:
+    """Bits per pixel and channel masks, pixels mapped for one surface fit any other with the same."""
+    return target.get_bitsize(), target.get_masks()
@@ -0,0 +1,202 @@
+"""
+Byte-budgeted least recently used cache for surfaces.
+Classes
+-------
+SurfaceCache
+    Mapping that evicts its least recently used, unpinned entries once the
+    estimated size of its contents passes a byte budget.
+"""
+
+from __future__ import annotations
+import sys
+import threading
+from collections import OrderedDict
+
+
+class SurfaceCache:
+    """
+    Mapping that evicts its least recently used, unpinned entries once the
+    estimated size of its contents passes a byte budget. Surfaces are sized
+    from their width, height and bytes per pixel, anything else by sys.getsizeof.
+    Safe to share with a background thread, e.g. a track prefetcher.
+    Attributes
+    ----------
+    budget: int
+        Bytes of unpinned entries the cache may hold before evicting, None never evicts
+    bytes: int
+        Estimated bytes held
+    hits: int
+        Lookups that found their key
+    misses: int
+        Lookups that didn't
+    evictions: int
+        Entries dropped to stay within budget
+    Public Methods
+    --------------
+    get(key, default=None) -> object:
+        Cached value, marking it most recently used, or default.
+    pin(key) -> None:
+        Keeps an entry from being evicted.
+    unpin(key) -> None:
+        Lets a pinned entry be evicted again.
+    stats() -> dict:
+        Hits, misses, evictions, entries, pinned entries, bytes and budget.
+    """
+    def __init__(self, budget: int = None) -> None:
+        """
+        Initializes an empty cache.
+        Parameters
+        ----------
+        budget: int, optional
+            Bytes of unpinned entries the cache may hold before evicting, unbounded if None
+        """
+        self.budget = budget
+        self.entries = OrderedDict()  # key -> (value, bytes), least recently used first
+        self.pinned = set()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """
+        Cached value, marking it most recently used, or default.
+        Parameters
+        ----------
+        key
+            Cache key
+        default: optional
+            Returned when key isn't cached
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, pin: bool = False) -> None:
+        """
+        Caches a value as the most recently used entry, then evicts least
+        recently used entries until the cache fits its budget again. The new
+        entry itself is never evicted by its own insertion, and pinned entries
+        don't count towards the budget.
+        Parameters
+        ----------
+        key
+            Cache key
+        value
+            Value to cache
+        pin: bool, default=False
+            Whether to keep the entry from ever being evicted
+        """
+        size = SurfaceCache.estimate(value)
+        with self.lock:
+            self.pop(key, None)
+            self.entries[key] = (value, size)
+            self.bytes += size
+            if pin:
+                self.pinned.add(key)
+            self._evict(keep=key)
+
+    def pin(self, key) -> None:
+        """Keeps an entry from being evicted."""
+        with self.lock:
+            if key not in self.entries:
+                raise KeyError(key)
+            self.pinned.add(key)
+
+    def unpin(self, key) -> None:
+        """Lets a pinned entry be evicted again."""
+        with self.lock:
+            self.pinned.discard(key)
+            self._evict()
+
+    def pop(self, key, *default):
+        """Removes an entry and returns its value."""
+        with self.lock:
+            if key not in self.entries:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            value, size = self.entries.pop(key)
+            self.bytes -= size
+            self.pinned.discard(key)
+            return value
+
+    def clear(self) -> None:
+        """Removes every entry, pinned ones included."""
+        with self.lock:
+            self.entries.clear()
+            self.pinned.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        """Hits, misses, evictions, entries, pinned entries, bytes and budget."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "pinned": len(self.pinned),
+            "bytes": self.bytes,
+            "budget": self.budget,
+        }
+
+    @staticmethod
+    def estimate(value) -> int:
+        """Estimated bytes held by a value, width * height * bytes per pixel for surfaces."""
+        surface = getattr(value, "surface", value)  # Engine.Surface wraps a pygame surface
+        if hasattr(surface, "get_bytesize") and hasattr(surface, "get_size"):
+            width, height = surface.get_size()
+            return width * height * surface.get_bytesize()
+        return sys.getsizeof(value)
+
+    def _evict(self, keep=None) -> None:
+        """Drops least recently used unpinned entries until the cache fits its budget."""
+        if self.budget is None:
+            return
+        unpinned = self.bytes - sum(self.entries[key][1] for key in self.pinned)
+        for key in list(self.entries):
+            if unpinned <= self.budget:
+                break
+            if key in self.pinned or key == keep:
+                continue
+            size = self.entries.pop(key)[1]
+            self.bytes -= size
+            unpinned -= size
+            self.evictions += 1
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        self.put(key, value)
+
+    def __delitem__(self, key) -> None:
+        self.pop(key)
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def values(self):
+        return [value for value, _ in self.entries.values()]
+
+    def items(self):
+        return [(key, value) for key, (value, _) in self.entries.items()]
@@ -8,8 +8,12 @@ Engine
 
 from __future__ import annotations
 import os
+import math
 import pygame
 from copy import deepcopy
+from core.ui import backgrounds
+from core.ui.assets import AssetManager
+from core.ui.cache import SurfaceCache
 
 __author__ = "Grant Holmes"
 __email__ = "g.holmes429@gmail.com"
@@ -30,16 +34,26 @@ class Engine:
         Delta time, measurement of latency between frames, used to achieve frame rate motion independence
     running: bool
         Whether engine is running
-    fontCache: dict
-        Caches rendered fonts, improves performance
-    surfaceCache: dict
-        Caches rendered surfaces, improves performance
+    fontCache: SurfaceCache
+        Caches fonts by size, improves performance
+    surfaceCache: SurfaceCache
+        Byte-budgeted LRU cache of scratch surfaces keyed by shape and quantized size, the background is pinned
+    assets: AssetManager
+        Loads, converts and caches images from the image folder
+    imageCache: SurfaceCache
+        Byte-budgeted LRU cache of converted, tiled and scaled images, shared with assets
     background: pygame.Surface
-        Background for active window
+        Background for active window, at the render resolution
+    window: pygame.Surface
+        Display surface of the entire window
     screen: pygame.Surface
-        Background for entire screen
+        Surface the scene is drawn on, the window itself or a canvas at the render resolution scaled to it every frame
     screenSize: tuple
-        (width, height) of the screen
+        (width, height) of the window, every position, size and point passed to the engine is in this space
+    renderScale: float
+        Fraction of screenSize the scene is drawn at
+    resolution: tuple
+        (width, height) the scene is drawn at
     offset: tuple
         (x, y) offset for position of active window relative to screen
     Public Methods
@@ -54,6 +68,8 @@ class Engine:
         Has engine exit.
     scaleUp(coord: tuple) -> tuple:
         Scales (x, y) coords to fit resolution of screen.
+    toInternal(coord: tuple) -> tuple:
+        Maps (x, y) window coords to the render resolution.
     renderScene(func: callable, *args) -> None:
         Renders custom scene defined outside of this class in the form of customScene(engine: graphics.Engine...
     printToScreen(text: str, pos: tuple, fontSize: int, textColor: tuple, backgroundColor: tuple = None) -> None:
@@ -64,6 +80,8 @@ class Engine:
         Blits circle to screen.
     renderLine(start: tuple, end: tuple, width: int, fillColor: tuple) -> None:
         Blits line to screen.
+    cacheStats() -> dict:
+        Hit, miss, eviction and size stats of every cache.
     """
     colors = {
         "green"            : (0, 255, 0),
@@ -91,7 +109,12 @@ class Engine:
                  targetFPS: int = 60,
                  title: str = "Untitled Game",
                  fontStyle: str = "impact",
-                 imageFolder: str = "images"
+                 imageFolder: str = "images",
+                 assetCache: str = None,
+                 surfaceCacheBudget: int = 64 * 2**20,
+                 imageCacheBudget: int = 256 * 2**20,
+                 renderScale: float = 1.0,
+                 smoothUpscale: bool = False
                  ) -> None:
         """
         Initializes engine, calculates aspect ratio and fits active window to screen.
@@ -101,8 +124,10 @@ class Engine:
             Resolution of GUI window
         numGrids: tuple
             Number of grid for active game window
-        checkered: bool
-            If active game window should have checkered background
+        backgroundType: str, default='checkered'
+            'checkered', 'image' tiled from backgroundPath or 'solid' in the first grid color
+        backgroundPath: str, optional
+            Image inside the image folder tiled as the background
         targetFPS: int
             Target frames per second
         title: str
@@ -111,6 +136,18 @@ class Engine:
             Font style
         gridColors: tuple
             Colors of grid if checkered in form (checker color 1, checker color 2, border color)
+        imageFolder: str
+            Folder images are loaded from
+        assetCache: str, optional
+            Folder decoded images are kept in so later launches skip decoding
+        surfaceCacheBudget: int, default=64 MiB
+            Bytes of scratch surfaces kept before the least recently used are dropped, None never drops any
+        imageCacheBudget: int, default=256 MiB
+            Bytes of converted images kept before the least recently used are dropped, None never drops any
+        renderScale: float, default=1.0
+            Fraction of screenSize the scene is drawn at, anything else draws to an offscreen canvas scaled to the window once per frame
+        smoothUpscale: bool, default=False
+            Whether to scale the canvas up bilinearly instead of by nearest neighbour
         """
         self.targetFPS = targetFPS
         self.fontStyle = fontStyle
@@ -124,11 +161,12 @@ class Engine:
         self.running = True
         pygame.display.set_caption(title)
 
-        self.fontCache = {}
-        self.surfaceCache = {}
-        self.imageCache = {}
+        self.fontCache = SurfaceCache()
+        self.surfaceCache = SurfaceCache(surfaceCacheBudget)
         
         self.imageFolder = os.path.join(os.getcwd(), imageFolder)
+        self.assets = AssetManager(self.imageFolder, assetCache, imageCacheBudget)
+        self.imageCache = self.assets.cache
 
         # aspect ratios
         screenAR, gridsAR = screenSize[0]/screenSize[1], numGrids[0]/numGrids[1]
@@ -147,10 +185,17 @@ class Engine:
             self.offset = (0.5 * (screenSize[0] - backgroundSize[0]), 0)
 
         self.screenSize = screenSize
-        self.screen = pygame.display.set_mode(screenSize)
+        self.renderScale = renderScale
+        self.smoothUpscale = smoothUpscale
+        self.resolution = (max(1, round(screenSize[0] * renderScale)), max(1, round(screenSize[1] * renderScale)))
+        self.window = pygame.display.set_mode(screenSize)
+        if self.resolution == tuple(screenSize):
+            self.screen = self.window
+        else:
+            self.screen = pygame.Surface(self.resolution).convert()
         #self.surfaceCache[backgroundSize] = pygame.Surface(backgroundSize)
-        self.surfaceCache[backgroundSize] = Engine.Surface(backgroundSize, flag="srcalpha")
-        self.background = self.surfaceCache[backgroundSize]
+        self.background = Engine.Surface(self._toPixels(backgroundSize), depth=32)
+        self.surfaceCache.put(("background", self.background.get_size()), self.background, pin=True)
 
         self.gridSize = tuple([int(backgroundSize[0] / numGrids[0]), int(backgroundSize[1] / numGrids[1])])
         self.paddedGridSize = (self.gridSize[0] + 1, self.gridSize[1] + 1)
@@ -158,17 +203,17 @@ class Engine:
         # calculate clipping due to discrepancy of integer rounding
         clipping = (0.5*(backgroundSize[0] % numGrids[0]), 0.5 * (backgroundSize[1] % numGrids[1]))
         self.offset = (self.offset[0]+clipping[0], self.offset[1]+clipping[1])
-        self.screen.set_clip(pygame.Rect(*self.offset, backgroundSize[0]-clipping[0]*2, backgroundSize[1]-clipping[1]*2))
+        self.screen.set_clip(pygame.Rect(*self._toPixels(self.offset), *self._toPixels((backgroundSize[0]-clipping[0]*2, backgroundSize[1]-clipping[1]*2))))
 
-        # create checkered background
+        # generate the background pixels, shared with any engine of the same size, grid and colors
         if backgroundType == 'checkered':
-            for coord, val in Engine.checkerboard(numGrids).items():
-                #rect = pygame.Surface(self.gridSize)
-                rect = Engine.Surface(self.gridSize, flag='srcalpha')
-                rect.fill(Engine.colors[gridColors[val]])
-                self.background.blit(rect, (coord[0] * self.gridSize[0], coord[1] * self.gridSize[1]))
+            cellSize = (self.gridSize[0] * self.renderScale, self.gridSize[1] * self.renderScale)
+            colors = tuple(Engine.colors[color] for color in gridColors)
+            backgrounds.write(self.background.surface, backgrounds.checkerboard(self.background.surface, numGrids, cellSize, colors))
         elif backgroundType == 'image':
             self.tileImageAsBackground(backgroundPath)
+        elif backgroundType == 'solid':
+            backgrounds.write(self.background.surface, backgrounds.solid(self.background.surface, Engine.colors[gridColors[0]]))
 
 
     def shouldRun(self) -> bool:
@@ -186,10 +231,15 @@ class Engine:
 
     def clearScreen(self) -> None:
         """Removes everything blitted on screen by covering everything with background."""
-        self.screen.blit(self.background.surface, self.offset)
+        self.screen.blit(self.background.surface, self.toInternal(self.offset))
 
     def updateScreen(self) -> None:
-        """Renders necessary components to screen."""
+        """Renders necessary components to screen, scaling the canvas up to the window first if drawing below its resolution."""
+        if self.screen is not self.window:
+            if self.smoothUpscale:
+                pygame.transform.smoothscale(self.screen, self.screenSize, self.window)
+            else:
+                pygame.transform.scale(self.screen, self.screenSize, self.window)
         pygame.display.flip()
 
     def getBackgroundType(self) -> str:
@@ -213,6 +263,29 @@ class Engine:
         """
         return coord[0] * self.gridSize[0] + self.offset[0], coord[1] * self.gridSize[1] + self.offset[1]
 
+    def toInternal(self, coord: tuple) -> tuple:
+        """
+        Maps (x, y) window coords, e.g. from scaleUp, to the render resolution.
+        Parameters
+        ----------
+        coord: tuple
+            (x, y) coord in the window
+        Returns
+        -------
+        tuple: coord on screen
+        """
+        if self.renderScale == 1:
+            return coord
+        return coord[0] * self.renderScale, coord[1] * self.renderScale
+
+    def _toPixels(self, size: tuple) -> tuple:
+        """Maps a window (width, height) or corner to whole pixels at the render resolution."""
+        return round(size[0] * self.renderScale), round(size[1] * self.renderScale)
+
+    def _toLength(self, length: float) -> float:
+        """Maps a window length to the render resolution."""
+        return length * self.renderScale
+
     def renderScene(self, func: callable, *args) -> None:
         """
         Renders custom scene defined outside of this class in the form of customScene(engine: graphics.Engine...
@@ -241,10 +314,11 @@ class Engine:
         backgroundColor: tuple, optional
             RGB color value for rect behind text
         """
-        if fontSize not in self.fontCache:
-            self.fontCache[fontSize] = pygame.font.SysFont(self.fontStyle, fontSize)
-
-        font = self.fontCache[fontSize]
+        fontSize = max(1, round(self._toLength(fontSize)))
+        font = self.fontCache.get(fontSize)
+        if font is None:
+            font = pygame.font.SysFont(self.fontStyle, fontSize)
+            self.fontCache.put(fontSize, font)
         paddedOutput = " " + text + " "
 
         if backgroundColor is not None:
@@ -253,7 +327,7 @@ class Engine:
             text = font.render(paddedOutput, True, textColor)
 
         textRect = text.get_rect()
-        textRect.center = pos
+        textRect.center = self.toInternal(pos)
         self.screen.blit(text, textRect)
 
     def renderRect(self, pos: tuple, size: tuple, fillColor: tuple, alpha: int = 255) -> None:
@@ -270,14 +344,17 @@ class Engine:
         alpha: int, default=255
             Transparency value (0-255) of rect
         """
-        if size not in self.surfaceCache:
-            #self.surfaceCache[size] = pygame.Surface(size)
-            self.surfaceCache[size] = Engine.Surface(size, flag="srcalpha")
+        size = self.toInternal(size)
+        key = ("rect", (math.ceil(size[0]), math.ceil(size[1]))) # pygame truncates sizes anyway
+        surface = self.surfaceCache.get(key)
+        if surface is None:
+            #surface = pygame.Surface(size)
+            surface = Engine.Surface(key[1], flag="srcalpha")
+            self.surfaceCache.put(key, surface)
 
-        surface = self.surfaceCache[size]
         surface.set_alpha(alpha)
         surface.fill(fillColor)
-        self.screen.blit(surface.surface, pos)
+        self.screen.blit(surface.surface, self.toInternal(pos))
 
     def renderCircle(self, pos: tuple, radius: float, fillColor: tuple, alpha: int = 255) -> None:
         """
@@ -293,21 +370,24 @@ class Engine:
         alpha: int, default=255
             Transparency value (0-255) of rect
         """
-        frameSize = (radius * 2, radius * 2)
+        radius = self._toLength(radius)
+        frameSize = math.ceil(radius * 2) # every radius rounding up to the same whole pixel frame shares a surface
         rel_x = radius
         rel_y = radius
 
-        if frameSize not in self.surfaceCache:
-            #self.surfaceCache[frameSize] = pygame.Surface(frameSize)
-            self.surfaceCache[frameSize] = Engine.Surface(frameSize, flag="srcalpha")
+        key = ("circle", frameSize)
+        surface = self.surfaceCache.get(key)
+        if surface is None:
+            #surface = pygame.Surface((frameSize, frameSize))
+            surface = Engine.Surface((frameSize, frameSize), flag="srcalpha")
+            self.surfaceCache.put(key, surface)
 
-        surface = self.surfaceCache[frameSize]
         surface.fill(Engine.colors["white"])
         surface.set_colorkey(Engine.colors["white"])
         surface.set_alpha(alpha)
 
         pygame.draw.circle(surface.surface, fillColor, (rel_x, rel_y), radius)
-        self.screen.blit(surface.surface, pos)
+        self.screen.blit(surface.surface, self.toInternal(pos))
 
     def renderLine(self, start: tuple, end: tuple, width: int, fillColor: tuple) -> None:
         """
@@ -323,7 +403,7 @@ class Engine:
         fillColor: tuple
             RGB values for color of rect
         """
-        pygame.draw.line(self.screen, fillColor, start, end, width)
+        pygame.draw.line(self.screen, fillColor, self.toInternal(start), self.toInternal(end), max(1, round(self._toLength(width))))
 
     def renderPolygon(self, color: tuple, points: list, surface: Engine.Surface = None, width: int = 0) -> None:
         """
@@ -332,15 +412,18 @@ class Engine:
         Parameters
         ----------
         surface
-            Surface to draw on (defaults to engine.screen)
+            Surface to draw on (defaults to engine.screen), at the render resolution
         points: list
-            list of (x, y) pairs of points to connect
+            list of (x, y) pairs of points to connect, in window coords
         color: tuple
             color to fill polygon
         width: int
             width of poylgon edges
         
         """
+        if self.renderScale != 1:
+            points = [self.toInternal(point) for point in points]
+            width = width and max(1, round(self._toLength(width)))
         if surface is None:
             pygame.draw.polygon(self.screen, color, points, width)
         else:
@@ -354,25 +437,38 @@ class Engine:
         Parameters
         ----------
         source: Engine.Surface
-            the surface to be drawn to the screen
+            the surface to be drawn to the screen, at the render resolution
         dest: tuple
-            the (x, y) coordinates of the upper left corner of the 
+            the (x, y) window coordinates of the upper left corner of the 
             drawing area
         area: Rect
-            an optional area rectangle that can be used to limit
+            an optional area rectangle of the source that can be used to limit
             the area of the drawing
         flag: str
             optional flag for additional instruction
 
         """
-        self.screen.blit(source.surface, dest, area=area, special_flags=flag)
+        self.screen.blit(source.surface, self.toInternal(dest), area=area, special_flags=flag)
 
 
     #def applyTexture(self, texture_path: str, surface: Engine.Surface = self.screen) -> Engine.Surface:
     #    texture = pygame.image.load(texture_path, )
 
-    def cacheSurface(self, name, surface):
-        self.surfaceCache[name] = surface
+    def cacheSurface(self, name, surface, pin: bool = False):
+        self.surfaceCache.put(name, surface, pin=pin)
+
+    def cacheStats(self) -> dict:
+        """
+        Hit, miss, eviction and size stats of every cache.
+        Returns
+        -------
+        dict: cache name -> SurfaceCache.stats()
+        """
+        return {
+            "surfaceCache": self.surfaceCache.stats(),
+            "fontCache": self.fontCache.stats(),
+            "imageCache": self.imageCache.stats(),
+        }
 
     def _handleEvents(self) -> None:
         """Handles events from Pygame's event queue. pygame.QUIT occurs when "X" on top right corner is clicked."""
@@ -381,57 +477,43 @@ class Engine:
                 self.running = False
                 pygame.quit()
 
-    @staticmethod
-    def checkerboard(n: tuple, border: bool = True) -> dict:
+    def load_image(self, filename: str) -> Engine.Surface:
         """
-        Creates checkerboard representation.
-        x x x x x . . .
-        x o x o x
-        x x o x o
-        .        . . .
-        .        .
-        .        .
+        Returns a surface containing the image 
+        corresponding to the given file, converted
+        to the display's pixel format. The file
+        must be contained within the engine's image
+        folder. The surface is shared, copy it before
+        drawing on it.
+
         Parameters
         ----------
-        n: tuple
-            Size of checkerboard
-        border: bool
-            Whether border should be included on edges
-        Returns
-        -------
-        dict: Keys are (x, y) coords, values are 0, 1, or 2
-        """
-        board = {}
-        edges = ({0, n[0] - 1}, {0, n[1] - 1})
-        for i in range(n[0]):
-            for j in range(n[1]):
-                if border and any([(i, j)[k] in edges[k] for k in range(2)]):
-                    board[(i, j)] = 2
-                elif (i + j) % 2 == 0:
-                    board[(i, j)] = 1
-                else:
-                    board[(i, j)] = 0
-        return board
+        filename: str
+            The name of the file inside the image folder
 
+        """
+        return Engine.Surface.wrap(self.assets.image(filename))
 
-    def load_image(self, filename: str) -> Engine.Surface:
+    def tiledImage(self, filename: str, size: tuple = None, pin: bool = False) -> Engine.Surface:
         """
-        Returns a surface containing the image 
-        corresponding to the given file. The file
-        must be contained within the engine's image
-        folder.
+        Returns the image corresponding to the given file
+        tiled across a given area at the render resolution,
+        the image scaled by the same factor. Tiled images are cached,
+        so the surface is shared, copy it before drawing on it.
 
         Parameters
         ----------
         filename: str
             The name of the file inside the image folder
+        size: tuple 
+            (x, y) The width (x) and height (y) of the area to tile across, in window pixels
+        pin: bool
+            Keeps the tiled image cached for good, so background threads can always use it
 
         """
-        image_file = os.path.join(self.imageFolder, filename)
-        img = pygame.image.load(image_file)
-        img_surface = Engine.Surface((img.get_width(), img.get_height()), flag="srcalpha")
-        img_surface.surface = img
-        return img_surface
+        if size is None:
+            size = self.screenSize
+        return Engine.Surface.wrap(self.assets.tiled(filename, self._toPixels(size), pin=pin, scale=self.renderScale))
 
     def tile_surface(self, surface: Engine.Surface, size: tuple = None) -> Engine.Surface:
         """
@@ -442,23 +524,22 @@ class Engine:
         surface: Engine.Surface
             the surface that will be tiled
         size: tuple 
-            (x, y) The width (x) and height (y) of the area to tile across
+            (x, y) The width (x) and height (y) of the area to tile across, defaults to the render resolution
 
         """
         if size is None:
-            size = self.screenSize
-        img = surface#.surface
+            size = self.resolution
+        img = surface.surface
         result = Engine.Surface(size, flag="srcalpha", depth=32)
-        for x in range(0, size[0], img.surface.get_width()):
-            for y in range(0, size[1], img.surface.get_height()):
-                result.blit(img, (x, y))
+        result.surface.blits([(img, (x, y)) for x in range(0, size[0], img.get_width())
+                                            for y in range(0, size[1], img.get_height())], doreturn=False)
         return result
 
     def tileImageAsBackground(self, img_name: str):
         """ 
         Opens the image with the given file name 
-        and tiles it across the screen size to be
-        used as a background.
+        and tiles it across the background, scaled
+        to the render resolution.
 
         Parameters
         ----------
@@ -466,13 +547,10 @@ class Engine:
             the file name of the image to use as the background
 
         """
-        if img_name not in self.imageCache:
-            #self.imageCache[img_name] = pygame.image.load(os.path.join(self.imageFolder, img_name))
-            self.imageCache[img_name] = self.load_image(os.path.join(self.imageFolder, img_name))
-        img = self.imageCache[img_name]
-        for x in range(0, self.screenSize[0], img.get_width()):
-            for y in range(0, self.screenSize[1], img.get_height()):
-                self.background.blit(img, (x, y))
+        tile = self.assets.image(img_name)
+        if self.renderScale != 1:
+            tile = self.assets.scaled(img_name, self._toPixels(tile.get_size()))
+        backgrounds.write(self.background.surface, backgrounds.tiled(self.background.surface, img_name, tile))
 
 
     class Surface:
@@ -487,6 +565,17 @@ class Engine:
             else:
                 self.surface = pygame.Surface(size, depth=depth)
 
+        @staticmethod
+        def wrap(surface: pygame.Surface) -> Engine.Surface:
+            """ Wraps an existing pygame surface without copying it """
+            wrapped = Engine.Surface((0, 0), flag="srcalpha")
+            wrapped.surface = surface
+            return wrapped
+
+        def copy(self) -> Engine.Surface:
+            """ Returns an independent copy of this surface """
+            return Engine.Surface.wrap(self.surface.copy())
+
         def blit(self, source: Engine.Surface, dest: tuple, area=None, flag: str = 0) -> None:
             """ 
             Draws a source surface onto this surface
@@ -520,12 +609,13 @@ class Engine:
 
         def convert_alpha(self) -> None:
             """ 
-            Changes the pixel format of the surface to 
-            include per-pixel alpha value
+            Changes the pixel format of the surface to the display's
+            format with per-pixel alpha value. Needs the display, so
+            only call this from the main thread
             
             """
         
-            self.surface.convert_alpha()
+            self.surface = self.surface.convert_alpha()
 
         def set_alpha(self, alpha: int = None) -> None:
             """ sets the alpha value for pixels contained in the surface """
@@ -600,7 +690,8 @@ class Engine:
             across the area of the original surface
             
             """
-            texture.convert_alpha()
+            if not texture.surface.get_flags() & pygame.SRCALPHA:
+                texture.convert_alpha()
             target = pygame.surfarray.pixels_alpha(texture.surface)
             target[:] = pygame.surfarray.array2d(self.surface)
 
@@ -1,7 +1,19 @@
+import os
 import sys
+import time
 from core.ui import ui
 from core import settings
 from core import game
+from core.training.tournament import Tournament, loadChampions
+from core.training.evolution import Evolution, formatStats
+from core.training.islands import IslandModel
+from core.training.sweep import Sweep
+from core.training.telemetry import Telemetry
+from core.training.memory import formatMemory
+from core.training.neural_net import FFNN
+from core.training.simulation import record
+from core.game_components.track import Track
+from core.game_components.environment import Environment
 #from core.track import Track
 #from core.engine import Engine
 
@@ -22,6 +34,8 @@ class Driver():
                 ("Player vs AI", self._playerVsAI),
                 ("AI Battle", self._playAI),
                 ("Evolve AI", self._evolveAI),
+                ("Export race video", self._exportRace),
+                ("Hyperparameter sweep", self._sweep),
                 ("Exit", lambda: sys.exit())
         ]
 
@@ -31,12 +45,108 @@ class Driver():
         game.PvAI()
 
     def _playAI(self) -> None:
-        print("Not implemented!")
-        sys.exit()
+        champions = loadChampions(settings.CHAMPION_FOLDER) if os.path.isdir(settings.CHAMPION_FOLDER) else {}
+        if len(champions) < 2:
+            print("Save at least two champions to " + settings.CHAMPION_FOLDER + " first")
+            return
+
+        _, format = ui.getSelection("swiss", "round robin", msg="Tournament format:")
+        rounds = ui.getValidInput("Rounds?", dtype=int, lower=1) if format == "swiss" else 0
+        heatSize = ui.getValidInput("Champions per heat?", dtype=int, lower=2, upper=len(champions))
+        name = ui.getValidInput("Tournament name? (an unfinished tournament with this name is resumed)")
+
+        path = os.path.join(settings.TOURNAMENT_FOLDER, name + ".jsonl")
+        tournament = Tournament(champions, path, heatSize=heatSize, format=format, rounds=rounds)
+        standings = tournament.run()
+
+        print()
+        for place, (champion, rating, heats) in enumerate(standings, 1):
+            print(f"{place:>4}) {champion:<24} {rating:>7.1f}  ({heats} heats)")
 
     def _evolveAI(self) -> None:
-        print("not implemented")
-        sys.exit()
+        generations = ui.getValidInput("Generations?", dtype=int, lower=1)
+        islands = ui.getValidInput("Islands? (1 evolves a single population)", dtype=int, lower=1, upper=os.cpu_count())
+        populationSize = ui.getValidInput("Population size" + (" per island?" if islands > 1 else "?"), dtype=int, lower=2)
+
+        watch = islands == 1 and ui.getSelection("Yes", "No", msg="Watch evolution?")[0] == 0
+
+        if watch:
+            champion = game.spectateEvolution(generations, populationSize)
+        else:
+            path = os.path.join(settings.TELEMETRY_FOLDER, time.strftime("evolution-%Y%m%d-%H%M%S.jsonl"))
+            with Telemetry(path) as telemetry:
+                def report(stats: dict) -> None:
+                    print(formatStats(stats))
+                    if "memory" in stats:
+                        print(formatMemory(stats["memory"]))
+                    telemetry.record(stats)
+
+                if islands > 1:
+                    evolution = IslandModel(islands=islands, populationSize=populationSize)
+                    champion = evolution.run(generations, callback=report)
+                else:
+                    evolution = Evolution(populationSize=populationSize, workers=os.cpu_count())
+                    try:
+                        champion = evolution.run(generations, callback=report)
+                    finally:
+                        evolution.close()
+            print("Telemetry written to " + path + (f" ({telemetry.dropped} records dropped)" if telemetry.dropped else ""))
+            if telemetry.errors:
+                print(f"{telemetry.errors} telemetry records failed to write: {telemetry.lastError}")
+
+        print()
+        ui.checkSave(champion, self._saveChampion, msg="Save champion?")
+
+    def _exportRace(self) -> None:
+        champions = loadChampions(settings.CHAMPION_FOLDER) if os.path.isdir(settings.CHAMPION_FOLDER) else {}
+        if not champions:
+            print("Save a champion to " + settings.CHAMPION_FOLDER + " first")
+            return
+
+        names = list(champions)
+        for i, name in enumerate(names, 1):
+            print(f"{i:>4}) {name}")
+        picks = ui.getValidInput("Champions to race? (numbers separated by spaces, the first is highlighted)", isValid=lambda choice: bool(choice.split()) and all(
+            pick.isdigit() and 1 <= int(pick) <= len(names) for pick in choice.split()))
+        entrants = [names[int(pick) - 1] for pick in picks.split()]
+        seed = ui.getValidInput("Track seed?", dtype=int, lower=0)
+        _, format = ui.getSelection("png", "rgb", msg="Frame format:")
+
+        environment = Environment(Track(type=settings.TRACK_TYPE, seed=seed))
+        recording = record(environment, [FFNN.fromDict(champions[name]) for name in entrants], settings.MAX_STEPS)
+        folder = os.path.join(settings.EXPORT_FOLDER, time.strftime("race-%Y%m%d-%H%M%S"))
+        start = time.perf_counter()
+        export = game.exportRace(recording, folder, seed, settings.TRACK_TYPE, format, names=entrants)
+        elapsed = time.perf_counter() - start
+
+        print(f"Wrote {export['frames']} frames to {folder} in {elapsed:.1f}s ({export['frames'] / settings.EXPORT_FPS / elapsed:.1f}x real time)")
+        print("Encode with: " + export["ffmpeg"])
+
+    def _sweep(self) -> None:
+        _, search = ui.getSelection("grid", "random", msg="Search over settings.SWEEP_SPACE:")
+        samples = ui.getValidInput("Configurations to draw?", dtype=int, lower=1) if search == "random" else settings.SWEEP_SAMPLES
+        generations = ui.getValidInput("Generations per configuration?", dtype=int, lower=1)
+        workers = ui.getValidInput("Runs at once?", dtype=int, lower=1, upper=os.cpu_count())
+        name = ui.getValidInput("Sweep name? (finished configurations stored under this name are skipped)")
+
+        sweep = Sweep(settings.SWEEP_SPACE, os.path.join(settings.SWEEP_FOLDER, name + ".sqlite"), search=search, generations=generations, samples=samples)
+        def report(config: dict, result: dict) -> None:
+            outcome = f"best {result['metrics']['best']:7.3f}  {result['metrics']['elapsed']:6.1f}s" if "metrics" in result else result["error"]
+            print(f"{outcome}  {config}")
+
+        results = sweep.run(workers, callback=report)
+        print()
+        for place, result in enumerate(results[:10], 1):
+            outcome = f"{result['metrics']['best']:7.3f}" if result["metrics"] else "failed"
+            print(f"{place:>4}) {outcome}  {result['config']}")
+
+        if results and results[0]["champion"] is not None:
+            print()
+            ui.checkSave(FFNN.fromDict(results[0]["champion"]), self._saveChampion, msg="Save best champion?")
+
+    def _saveChampion(self, network, name: str) -> None:
+        os.makedirs(settings.CHAMPION_FOLDER, exist_ok=True)
+        network.save(os.path.join(settings.CHAMPION_FOLDER, name + ".json"))
 
     # def run(self) -> None:
     #     while True: